@@ -0,0 +1,85 @@
+"""base schema (tables created before Alembic)
+
+Revision ID: 000_base
+Revises: 
+Create Date: 2025-02-01 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '000_base'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Раньше эти таблицы создавал Base.metadata.create_all() при старте бота.
+    # На существующих БД ничего не делаем, на новых — создаём исходную схему,
+    # чтобы вся цепочка миграций применялась к пустой базе.
+    inspector = sa.inspect(op.get_bind())
+
+    if not inspector.has_table('users'):
+        op.create_table('users',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('telegram_id', sa.BigInteger(), nullable=False),
+            sa.Column('username', sa.String(length=255), nullable=True),
+            sa.Column('full_name', sa.String(length=255), nullable=True),
+            sa.Column('age', sa.Integer(), nullable=True),
+            sa.Column('weight', sa.Float(), nullable=True),
+            sa.Column('height', sa.Integer(), nullable=True),
+            sa.Column('gender', sa.String(length=10), nullable=True),
+            sa.Column('activity_level', sa.String(length=50), nullable=True),
+            sa.Column('goal', sa.String(length=50), nullable=True),
+            sa.Column('daily_calorie_target', sa.Integer(), nullable=True),
+            sa.Column('current_day_start', sa.DateTime(), nullable=True),
+            sa.Column('last_active_at', sa.DateTime(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+            sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('telegram_id')
+        )
+
+    if not inspector.has_table('calorie_entries'):
+        op.create_table('calorie_entries',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.BigInteger(), nullable=False),
+            sa.Column('food_name', sa.String(length=255), nullable=False),
+            sa.Column('calories', sa.Integer(), nullable=False),
+            sa.Column('protein', sa.Float(), nullable=True),
+            sa.Column('carbs', sa.Float(), nullable=True),
+            sa.Column('fats', sa.Float(), nullable=True),
+            sa.Column('meal_type', sa.String(length=50), nullable=True),
+            sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+    if not inspector.has_table('workout_entries'):
+        op.create_table('workout_entries',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.BigInteger(), nullable=False),
+            sa.Column('workout_type', sa.String(length=100), nullable=False),
+            sa.Column('duration', sa.Integer(), nullable=False),
+            sa.Column('calories_burned', sa.Integer(), nullable=True),
+            sa.Column('notes', sa.String(length=500), nullable=True),
+            sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+    if not inspector.has_table('weight_logs'):
+        op.create_table('weight_logs',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.BigInteger(), nullable=False),
+            sa.Column('weight', sa.Float(), nullable=False),
+            sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+
+def downgrade() -> None:
+    op.drop_table('weight_logs')
+    op.drop_table('workout_entries')
+    op.drop_table('calorie_entries')
+    op.drop_table('users')
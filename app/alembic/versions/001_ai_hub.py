@@ -1,7 +1,7 @@
 """add ai hub features
 
 Revision ID: 001_ai_hub
-Revises: 
+Revises: 000_base
 Create Date: 2025-02-10 10:00:00.000000
 
 """
@@ -11,7 +11,7 @@ from sqlalchemy.dialects import postgresql
 
 # revision identifiers, used by Alembic.
 revision = '001_ai_hub'
-down_revision = None
+down_revision = '000_base'
 branch_labels = None
 depends_on = None
 
@@ -0,0 +1,54 @@
+"""composite indexes for hot per-user queries
+
+Revision ID: 002_hot_indexes
+Revises: 001_ai_hub
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '002_hot_indexes'
+down_revision = '001_ai_hub'
+branch_labels = None
+depends_on = None
+
+
+# (имя, таблица, колонки, доп. параметры)
+# Все горячие запросы хэндлеров фильтруют по user_id + created_at >= <начало окна>
+INDEXES = [
+    # Сумма калорий за сегодня (stats, confirm_food, process_meal_type)
+    ('idx_calorie_entries_user_created', 'calorie_entries', ['user_id', 'created_at'],
+     {'postgresql_include': ['calories']}),
+    # Вода за сегодня (record_water, show_statistics, confirm_food)
+    ('idx_calorie_entries_user_water', 'calorie_entries', ['user_id', 'created_at'],
+     {'postgresql_where': sa.text("meal_type = 'water'")}),
+    # Приёмы пищи без воды за неделю (show_statistics)
+    ('idx_calorie_entries_user_meals', 'calorie_entries', ['user_id', 'created_at'],
+     {'postgresql_where': sa.text("meal_type <> 'water'"), 'postgresql_include': ['calories']}),
+    # Тренировки за неделю/месяц (show_statistics, confirm_workout, process_notes)
+    ('idx_workout_entries_user_created', 'workout_entries', ['user_id', 'created_at'],
+     {'postgresql_include': ['duration', 'calories_burned']}),
+    # Последние записи веса (show_statistics, process_weight)
+    ('idx_weight_logs_user_created', 'weight_logs', ['user_id', 'created_at'], {}),
+    # Запросов за сегодня/неделю (/balance)
+    ('idx_ai_interactions_created', 'ai_interactions', ['created_at'], {}),
+    # Активные за неделю (/users)
+    ('idx_users_last_active', 'users', ['last_active_at'], {}),
+]
+
+
+def upgrade() -> None:
+    # CONCURRENTLY не блокирует запись в таблицы, но не работает внутри транзакции
+    with op.get_context().autocommit_block():
+        for name, table, columns, kwargs in INDEXES:
+            op.create_index(name, table, columns, unique=False,
+                            postgresql_concurrently=True, if_not_exists=True, **kwargs)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table,
+                          postgresql_concurrently=True, if_exists=True)
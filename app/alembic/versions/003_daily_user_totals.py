@@ -0,0 +1,69 @@
+"""daily_user_totals rollup table
+
+Revision ID: 003_daily_user_totals
+Revises: 002_hot_indexes
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '003_daily_user_totals'
+down_revision = '002_hot_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('daily_user_totals',
+        sa.Column('user_id', sa.BigInteger(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('calories', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('protein', sa.Float(), server_default='0', nullable=False),
+        sa.Column('fats', sa.Float(), server_default='0', nullable=False),
+        sa.Column('carbs', sa.Float(), server_default='0', nullable=False),
+        sa.Column('water_ml', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('meal_count', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('workout_count', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('workout_minutes', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('burned_calories', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('user_id', 'day')
+    )
+
+    # Заполнение по существующей истории
+    op.execute(r"""
+        INSERT INTO daily_user_totals (
+            user_id, day, calories, protein, fats, carbs, water_ml,
+            meal_count, workout_count, workout_minutes, burned_calories
+        )
+        SELECT user_id, day,
+               SUM(calories), SUM(protein), SUM(fats), SUM(carbs), SUM(water_ml),
+               SUM(meal_count), SUM(workout_count), SUM(workout_minutes), SUM(burned_calories)
+        FROM (
+            SELECT user_id, created_at::date AS day,
+                   calories,
+                   COALESCE(protein, 0) AS protein,
+                   COALESCE(fats, 0) AS fats,
+                   COALESCE(carbs, 0) AS carbs,
+                   CASE WHEN meal_type = 'water'
+                        THEN COALESCE(substring(food_name from '(\d+)\s*мл')::int, 250)
+                        ELSE 0 END AS water_ml,
+                   CASE WHEN meal_type = 'water' THEN 0 ELSE 1 END AS meal_count,
+                   0 AS workout_count, 0 AS workout_minutes, 0 AS burned_calories
+            FROM calorie_entries
+            WHERE created_at IS NOT NULL
+            UNION ALL
+            SELECT user_id, created_at::date,
+                   0, 0, 0, 0, 0, 0,
+                   1, duration, COALESCE(calories_burned, 0)
+            FROM workout_entries
+            WHERE created_at IS NOT NULL
+        ) src
+        GROUP BY user_id, day
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('daily_user_totals')
@@ -0,0 +1,59 @@
+"""numeric water_ml column for water entries
+
+Revision ID: 004_water_ml
+Revises: 003_daily_user_totals
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '004_water_ml'
+down_revision = '003_daily_user_totals'
+branch_labels = None
+depends_on = None
+
+# Сколько строк обновлять за один UPDATE при заполнении
+BATCH_SIZE = 10000
+
+
+def upgrade() -> None:
+    op.add_column('calorie_entries',
+        sa.Column('water_ml', sa.Integer(), nullable=True))
+
+    # Разово разбираем объём из подписи: "💧 Вода (1 ст. / 250 мл)" → 250,
+    # старые записи без мл считаем стаканом (как делал record_water)
+    with op.get_context().autocommit_block():
+        while True:
+            result = op.get_bind().execute(sa.text(r"""
+                UPDATE calorie_entries
+                SET water_ml = COALESCE(substring(food_name from '(\d+)\s*мл')::int, 250)
+                WHERE id IN (
+                    SELECT id FROM calorie_entries
+                    WHERE meal_type = 'water' AND water_ml IS NULL
+                    LIMIT :batch
+                )
+            """), {'batch': BATCH_SIZE})
+            if result.rowcount < BATCH_SIZE:
+                break
+
+        # Частичный индекс по воде теперь покрывает и объём (index-only SUM)
+        op.create_index('idx_calorie_entries_user_water_ml', 'calorie_entries',
+                        ['user_id', 'created_at'], unique=False,
+                        postgresql_where=sa.text("meal_type = 'water'"),
+                        postgresql_include=['water_ml'],
+                        postgresql_concurrently=True, if_not_exists=True)
+        op.drop_index('idx_calorie_entries_user_water', table_name='calorie_entries',
+                      postgresql_concurrently=True, if_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index('idx_calorie_entries_user_water', 'calorie_entries',
+                        ['user_id', 'created_at'], unique=False,
+                        postgresql_where=sa.text("meal_type = 'water'"),
+                        postgresql_concurrently=True, if_not_exists=True)
+        op.drop_index('idx_calorie_entries_user_water_ml', table_name='calorie_entries',
+                      postgresql_concurrently=True, if_exists=True)
+    op.drop_column('calorie_entries', 'water_ml')
@@ -0,0 +1,94 @@
+"""columns and plan tables previously created by init_db
+
+Revision ID: 005_startup_schema
+Revises: 004_water_ml
+Create Date: 2026-10-17 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '005_startup_schema'
+down_revision = '004_water_ml'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Раньше init_db() выполнял эти ALTER при каждом старте бота.
+    # IF NOT EXISTS — на большинстве БД колонки уже добавлены.
+    op.execute("ALTER TABLE users ADD COLUMN IF NOT EXISTS current_day_start TIMESTAMP")
+    op.execute("ALTER TABLE users ADD COLUMN IF NOT EXISTS last_active_at TIMESTAMP")
+    op.execute("ALTER TABLE ai_interactions ADD COLUMN IF NOT EXISTS prompt_tokens INTEGER")
+    op.execute("ALTER TABLE ai_interactions ADD COLUMN IF NOT EXISTS completion_tokens INTEGER")
+    op.execute("ALTER TABLE ai_interactions ADD COLUMN IF NOT EXISTS total_tokens INTEGER")
+
+    # Таблицы планов создавал create_all()
+    inspector = sa.inspect(op.get_bind())
+
+    if not inspector.has_table('meal_plans'):
+        op.create_table('meal_plans',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.BigInteger(), nullable=False),
+            sa.Column('week_start', sa.DateTime(), nullable=False),
+            sa.Column('is_active', sa.Boolean(), nullable=True),
+            sa.Column('ai_response', postgresql.JSON(astext_type=sa.Text()), nullable=True),
+            sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+    if not inspector.has_table('meal_plan_items'):
+        op.create_table('meal_plan_items',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('plan_id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.BigInteger(), nullable=False),
+            sa.Column('day_of_week', sa.Integer(), nullable=False),
+            sa.Column('meal_type', sa.String(length=20), nullable=False),
+            sa.Column('food_name', sa.String(length=500), nullable=False),
+            sa.Column('recipe', sa.Text(), nullable=True),
+            sa.Column('ingredients', sa.Text(), nullable=True),
+            sa.Column('calories', sa.Integer(), nullable=True),
+            sa.Column('protein', sa.Float(), nullable=True),
+            sa.Column('fats', sa.Float(), nullable=True),
+            sa.Column('carbs', sa.Float(), nullable=True),
+            sa.Column('is_completed', sa.Boolean(), nullable=True),
+            sa.Column('completed_at', sa.DateTime(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+    if not inspector.has_table('workout_plans'):
+        op.create_table('workout_plans',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.BigInteger(), nullable=False),
+            sa.Column('week_start', sa.DateTime(), nullable=False),
+            sa.Column('is_active', sa.Boolean(), nullable=True),
+            sa.Column('ai_response', postgresql.JSON(astext_type=sa.Text()), nullable=True),
+            sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+    if not inspector.has_table('workout_plan_items'):
+        op.create_table('workout_plan_items',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('plan_id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.BigInteger(), nullable=False),
+            sa.Column('day_of_week', sa.Integer(), nullable=False),
+            sa.Column('workout_type', sa.String(length=100), nullable=False),
+            sa.Column('exercises', postgresql.JSON(astext_type=sa.Text()), nullable=True),
+            sa.Column('duration', sa.Integer(), nullable=True),
+            sa.Column('calories_burned', sa.Integer(), nullable=True),
+            sa.Column('notes', sa.Text(), nullable=True),
+            sa.Column('is_rest_day', sa.Boolean(), nullable=True),
+            sa.Column('is_completed', sa.Boolean(), nullable=True),
+            sa.Column('completed_at', sa.DateTime(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+
+def downgrade() -> None:
+    # Колонки и таблицы использовались и до этой ревизии — не удаляем их
+    pass
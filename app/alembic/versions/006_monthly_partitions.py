@@ -0,0 +1,114 @@
+"""monthly range partitions for calorie_entries and ai_interactions
+
+Revision ID: 006_monthly_partitions
+Revises: 005_startup_schema
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from datetime import date
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '006_monthly_partitions'
+down_revision = '005_startup_schema'
+branch_labels = None
+depends_on = None
+
+# Сколько будущих месяцев создать сразу (дальше — python -m database.partitions maintain)
+MONTHS_AHEAD = 3
+
+# Индексы пересоздаются на родительской таблице и наследуются секциями
+INDEXES = {
+    'calorie_entries': [
+        "CREATE INDEX idx_calorie_entries_source ON calorie_entries (source_type)",
+        "CREATE INDEX idx_calorie_entries_user_created ON calorie_entries "
+        "(user_id, created_at) INCLUDE (calories)",
+        "CREATE INDEX idx_calorie_entries_user_water_ml ON calorie_entries "
+        "(user_id, created_at) INCLUDE (water_ml) WHERE meal_type = 'water'",
+        "CREATE INDEX idx_calorie_entries_user_meals ON calorie_entries "
+        "(user_id, created_at) INCLUDE (calories) WHERE meal_type <> 'water'",
+    ],
+    'ai_interactions': [
+        "CREATE INDEX idx_ai_interactions_user_id ON ai_interactions (user_id)",
+        "CREATE INDEX idx_ai_interactions_type ON ai_interactions (interaction_type)",
+        "CREATE INDEX idx_ai_interactions_created ON ai_interactions (created_at)",
+    ],
+}
+
+
+def _add_months(day: date, months: int) -> date:
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def _partition_table(table: str) -> None:
+    bind = op.get_bind()
+    legacy = f'{table}_legacy'
+
+    op.execute(f"UPDATE {table} SET created_at = now() WHERE created_at IS NULL")
+    op.execute(f"ALTER TABLE {table} RENAME TO {legacy}")
+    op.execute(f"ALTER TABLE {legacy} RENAME CONSTRAINT {table}_pkey TO {legacy}_pkey")
+
+    # Ключ секционирования обязан входить в первичный ключ
+    op.execute(f"""
+        CREATE TABLE {table} (
+            LIKE {legacy} INCLUDING DEFAULTS INCLUDING CONSTRAINTS,
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    """)
+    op.execute(f"ALTER TABLE {table} ALTER COLUMN created_at SET NOT NULL")
+    op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id")
+
+    oldest = bind.execute(sa.text(f"SELECT min(created_at) FROM {legacy}")).scalar()
+    current_month = date.today().replace(day=1)
+    month = (oldest.date() if oldest else current_month).replace(day=1)
+    last_month = _add_months(current_month, MONTHS_AHEAD)
+    while month <= last_month:
+        upper = _add_months(month, 1)
+        op.execute(
+            f"CREATE TABLE {table}_y{month.year}m{month.month:02d} PARTITION OF {table} "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{upper.isoformat()}')"
+        )
+        month = upper
+    # Страховка на случай, если maintain давно не запускали
+    op.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+
+    op.execute(f"INSERT INTO {table} SELECT * FROM {legacy}")
+    op.execute(f"DROP TABLE {legacy}")
+
+    for stmt in INDEXES[table]:
+        op.execute(stmt)
+    op.execute(f"ANALYZE {table}")
+
+
+def _unpartition_table(table: str) -> None:
+    partitioned = f'{table}_partitioned'
+
+    op.execute(f"ALTER TABLE {table} RENAME TO {partitioned}")
+    op.execute(f"ALTER TABLE {partitioned} RENAME CONSTRAINT {table}_pkey TO {partitioned}_pkey")
+    op.execute(f"""
+        CREATE TABLE {table} (
+            LIKE {partitioned} INCLUDING DEFAULTS INCLUDING CONSTRAINTS,
+            PRIMARY KEY (id)
+        )
+    """)
+    op.execute(f"ALTER TABLE {table} ALTER COLUMN created_at DROP NOT NULL")
+    op.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id")
+    op.execute(f"INSERT INTO {table} SELECT * FROM {partitioned}")
+    op.execute(f"DROP TABLE {partitioned} CASCADE")
+
+    for stmt in INDEXES[table]:
+        op.execute(stmt)
+
+
+def upgrade() -> None:
+    # Таблицы переписываются целиком — запускать в окно обслуживания
+    for table in ('calorie_entries', 'ai_interactions'):
+        _partition_table(table)
+
+
+def downgrade() -> None:
+    for table in ('calorie_entries', 'ai_interactions'):
+        _unpartition_table(table)
@@ -0,0 +1,54 @@
+"""ai_interactions archive markers
+
+Revision ID: 007_ai_archive
+Revises: 006_monthly_partitions
+Create Date: 2026-10-17 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '007_ai_archive'
+down_revision = '006_monthly_partitions'
+branch_labels = None
+depends_on = None
+
+
+INDEX = 'idx_ai_interactions_unarchived'
+
+
+def _partitions() -> list:
+    return [name for (name,) in op.get_bind().execute(sa.text("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        WHERE p.relname = 'ai_interactions'
+    """))]
+
+
+def upgrade() -> None:
+    # Колонки без DEFAULT — добавление не переписывает секции
+    op.add_column('ai_interactions', sa.Column('archived_at', sa.DateTime(), nullable=True))
+    op.add_column('ai_interactions', sa.Column('archive_segment', sa.String(length=255), nullable=True))
+
+    # Кандидаты в архив (database.archive): без условия на archived_at каждый запуск
+    # перечитывал бы уже заархивированное начало таблицы.
+    # На секционированной таблице CREATE INDEX CONCURRENTLY недоступен, поэтому индекс
+    # родителя создаётся ON ONLY (невалидным), по секциям — CONCURRENTLY и подключается
+    # к родителю; когда подключены все секции, индекс родителя становится валидным.
+    # Новые секции (database.partitions) получают его автоматически.
+    with op.get_context().autocommit_block():
+        op.execute(f"CREATE INDEX IF NOT EXISTS {INDEX} ON ONLY ai_interactions (created_at) "
+                   f"WHERE archived_at IS NULL")
+        for partition in _partitions():
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {partition}_unarchived_idx "
+                       f"ON {partition} (created_at) WHERE archived_at IS NULL")
+            op.execute(f"ALTER INDEX {INDEX} ATTACH PARTITION {partition}_unarchived_idx")
+
+
+def downgrade() -> None:
+    op.execute(f"DROP INDEX IF EXISTS {INDEX}")
+    op.drop_column('ai_interactions', 'archive_segment')
+    op.drop_column('ai_interactions', 'archived_at')
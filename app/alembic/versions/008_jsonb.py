@@ -0,0 +1,53 @@
+"""JSONB for source_data / ai_response with lookup indexes
+
+Revision ID: 008_jsonb
+Revises: 007_ai_archive
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '008_jsonb'
+down_revision = '007_ai_archive'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Смена типа переписывает секции — запускать в окно обслуживания.
+    # На секционированных таблицах CREATE INDEX CONCURRENTLY недоступен.
+    op.execute("ALTER TABLE calorie_entries ALTER COLUMN source_data TYPE JSONB USING source_data::jsonb")
+    op.execute("ALTER TABLE ai_interactions ALTER COLUMN ai_response TYPE JSONB USING ai_response::jsonb")
+
+    # Тот же ключ, что и database.queries.normalize_food_text(): нижний регистр, одиночные пробелы
+    op.execute(r"""
+        UPDATE calorie_entries
+        SET source_data = source_data || jsonb_build_object(
+            'normalized_text',
+            lower(btrim(regexp_replace(source_data->>'original_text', '\s+', ' ', 'g')))
+        )
+        WHERE coalesce(source_data->>'original_text', '') <> ''
+    """)
+
+    # Прошлые анализы того же текста (find_entries_by_text)
+    op.create_index('idx_calorie_entries_normalized_text', 'calorie_entries',
+                    [sa.text("(source_data ->> 'normalized_text')")],
+                    postgresql_where=sa.text("(source_data ->> 'normalized_text') IS NOT NULL"))
+    # Поиск по содержимому ответа AI (find_interactions_by_response, оператор @>)
+    op.create_index('idx_ai_interactions_response', 'ai_interactions', ['ai_response'],
+                    postgresql_using='gin', postgresql_ops={'ai_response': 'jsonb_path_ops'})
+    # Анализы с низкой уверенностью (get_low_confidence_analyses); порог совпадает с LOW_CONFIDENCE
+    op.create_index('idx_ai_interactions_low_confidence', 'ai_interactions', ['created_at'],
+                    postgresql_where=sa.text("ai_confidence < 0.5"))
+    op.execute("ANALYZE calorie_entries")
+    op.execute("ANALYZE ai_interactions")
+
+
+def downgrade() -> None:
+    op.drop_index('idx_ai_interactions_low_confidence', table_name='ai_interactions')
+    op.drop_index('idx_ai_interactions_response', table_name='ai_interactions')
+    op.drop_index('idx_calorie_entries_normalized_text', table_name='calorie_entries')
+    op.execute("ALTER TABLE ai_interactions ALTER COLUMN ai_response TYPE JSON USING ai_response::json")
+    op.execute("ALTER TABLE calorie_entries ALTER COLUMN source_data TYPE JSON USING source_data::json")
@@ -0,0 +1,88 @@
+"""foreign keys to users.telegram_id with ON DELETE CASCADE
+
+Revision ID: 009_user_foreign_keys
+Revises: 008_jsonb
+Create Date: 2026-10-17 17:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '009_user_foreign_keys'
+down_revision = '008_jsonb'
+branch_labels = None
+depends_on = None
+
+
+# Таблицы с user_id -> users.telegram_id
+USER_TABLES = [
+    'calorie_entries', 'workout_entries', 'weight_logs', 'daily_user_totals', 'health_data',
+    'ai_interactions', 'meal_plans', 'meal_plan_items', 'workout_plans', 'workout_plan_items',
+]
+# На секционированных таблицах NOT VALID не поддерживается — ключ проверяется сразу
+PARTITIONED_TABLES = {'calorie_entries', 'ai_interactions'}
+
+# (таблица, родительская таблица) для plan_id
+PLAN_ITEM_TABLES = [
+    ('meal_plan_items', 'meal_plans'),
+    ('workout_plan_items', 'workout_plans'),
+]
+
+# Индексы под каскадное удаление и поиск по пользователю (остальные таблицы уже покрыты)
+INDEXES = [
+    ('idx_meal_plans_user_id', 'meal_plans', ['user_id']),
+    ('idx_meal_plan_items_user_id', 'meal_plan_items', ['user_id']),
+    ('idx_meal_plan_items_plan_id', 'meal_plan_items', ['plan_id']),
+    ('idx_workout_plans_user_id', 'workout_plans', ['user_id']),
+    ('idx_workout_plan_items_user_id', 'workout_plan_items', ['user_id']),
+    ('idx_workout_plan_items_plan_id', 'workout_plan_items', ['plan_id']),
+]
+
+
+def _add_foreign_key(name: str, table: str, column: str, referred: str, validate_later: bool):
+    op.execute(
+        f"ALTER TABLE {table} ADD CONSTRAINT {name} FOREIGN KEY ({column}) "
+        f"REFERENCES {referred} ON DELETE CASCADE" + (" NOT VALID" if validate_later else "")
+    )
+    if validate_later:
+        # Отдельная транзакция: VALIDATE не блокирует запись в таблицу
+        op.execute(f"ALTER TABLE {table} VALIDATE CONSTRAINT {name}")
+
+
+def upgrade() -> None:
+    # Каждый оператор — своя транзакция, чтобы не держать блокировки на всех таблицах разом
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, unique=False,
+                            postgresql_concurrently=True, if_not_exists=True)
+
+        # Строки удалённых раньше пользователей не дадут проверить ключ
+        for table, plans in PLAN_ITEM_TABLES:
+            op.execute(
+                f"DELETE FROM {table} i WHERE NOT EXISTS "
+                f"(SELECT 1 FROM {plans} p WHERE p.id = i.plan_id)"
+            )
+        for table in USER_TABLES:
+            op.execute(
+                f"DELETE FROM {table} t WHERE NOT EXISTS "
+                f"(SELECT 1 FROM users u WHERE u.telegram_id = t.user_id)"
+            )
+
+        for table in USER_TABLES:
+            _add_foreign_key(f'fk_{table}_user_id', table, 'user_id', 'users (telegram_id)',
+                             validate_later=table not in PARTITIONED_TABLES)
+        for table, plans in PLAN_ITEM_TABLES:
+            _add_foreign_key(f'fk_{table}_plan_id', table, 'plan_id', f'{plans} (id)',
+                             validate_later=True)
+
+
+def downgrade() -> None:
+    for table, _ in PLAN_ITEM_TABLES:
+        op.drop_constraint(f'fk_{table}_plan_id', table, type_='foreignkey')
+    for table in USER_TABLES:
+        op.drop_constraint(f'fk_{table}_user_id', table, type_='foreignkey')
+
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table,
+                          postgresql_concurrently=True, if_exists=True)
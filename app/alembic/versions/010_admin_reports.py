@@ -0,0 +1,63 @@
+"""ai_usage_daily summary table and user_daily_stats materialized view
+
+Revision ID: 010_admin_reports
+Revises: 009_user_foreign_keys
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '010_admin_reports'
+down_revision = '009_user_foreign_keys'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('ai_usage_daily',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('ai_model', sa.String(length=50), nullable=False),
+        sa.Column('interaction_type', sa.String(length=50), nullable=False),
+        sa.Column('requests', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('prompt_tokens', sa.BigInteger(), server_default='0', nullable=False),
+        sa.Column('completion_tokens', sa.BigInteger(), server_default='0', nullable=False),
+        sa.Column('total_tokens', sa.BigInteger(), server_default='0', nullable=False),
+        sa.PrimaryKeyConstraint('day', 'ai_model', 'interaction_type')
+    )
+    # История до появления таблицы; дальше её пополняет журнал AI (database.ai_log)
+    op.execute("""
+        INSERT INTO ai_usage_daily (day, ai_model, interaction_type, requests,
+                                    prompt_tokens, completion_tokens, total_tokens)
+        SELECT created_at::date, COALESCE(ai_model, '?'), interaction_type, count(*),
+               COALESCE(SUM(prompt_tokens), 0), COALESCE(SUM(completion_tokens), 0),
+               COALESCE(SUM(total_tokens), 0)
+        FROM ai_interactions
+        GROUP BY 1, 2, 3
+    """)
+
+    op.execute("""
+        CREATE MATERIALIZED VIEW user_daily_stats AS
+        SELECT day,
+               SUM(new_users)::int AS new_users,
+               SUM(with_profile)::int AS with_profile,
+               SUM(last_active)::int AS last_active
+        FROM (
+            SELECT created_at::date AS day, 1 AS new_users,
+                   (daily_calorie_target IS NOT NULL)::int AS with_profile, 0 AS last_active
+            FROM users
+            WHERE created_at IS NOT NULL
+            UNION ALL
+            SELECT last_active_at::date, 0, 0, 1
+            FROM users
+            WHERE last_active_at IS NOT NULL
+        ) s
+        GROUP BY day
+    """)
+    op.execute("CREATE UNIQUE INDEX idx_user_daily_stats_day ON user_daily_stats (day)")
+
+
+def downgrade() -> None:
+    op.execute("DROP MATERIALIZED VIEW IF EXISTS user_daily_stats")
+    op.drop_table('ai_usage_daily')
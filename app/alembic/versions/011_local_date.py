@@ -0,0 +1,105 @@
+"""per-user time zone and stored local_date for entries
+
+Revision ID: 011_local_date
+Revises: 010_admin_reports
+Create Date: 2026-10-17 19:00:00.000000
+
+"""
+import os
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '011_local_date'
+down_revision = '010_admin_reports'
+branch_labels = None
+depends_on = None
+
+# Сколько строк обновлять за один UPDATE при заполнении
+BATCH_SIZE = 10000
+
+# Старые записи относим к дню по часовому поясу по умолчанию
+DEFAULT_TIMEZONE = os.getenv('DEFAULT_TIMEZONE', 'Europe/Moscow')
+
+# Пересборка дневных итогов; {day} — выражение дня записи.
+# Намеренно замороженная копия database.rollups.REBUILD_SQL на момент этой ревизии:
+# миграция не должна меняться вместе с кодом приложения. Правки — только в rollups.
+REBUILD_SQL = """
+    INSERT INTO daily_user_totals (
+        user_id, day, calories, protein, fats, carbs, water_ml,
+        meal_count, workout_count, workout_minutes, burned_calories
+    )
+    SELECT user_id, day,
+           SUM(calories), SUM(protein), SUM(fats), SUM(carbs), SUM(water_ml),
+           SUM(meal_count), SUM(workout_count), SUM(workout_minutes), SUM(burned_calories)
+    FROM (
+        SELECT user_id, {day} AS day,
+               calories,
+               COALESCE(protein, 0) AS protein,
+               COALESCE(fats, 0) AS fats,
+               COALESCE(carbs, 0) AS carbs,
+               CASE WHEN meal_type = 'water' THEN COALESCE(water_ml, 0) ELSE 0 END AS water_ml,
+               CASE WHEN meal_type = 'water' THEN 0 ELSE 1 END AS meal_count,
+               0 AS workout_count, 0 AS workout_minutes, 0 AS burned_calories
+        FROM calorie_entries
+        WHERE created_at IS NOT NULL
+        UNION ALL
+        SELECT user_id, {day},
+               0, 0, 0, 0, 0, 0,
+               1, duration, COALESCE(calories_burned, 0)
+        FROM workout_entries
+        WHERE created_at IS NOT NULL
+    ) src
+    GROUP BY user_id, day
+"""
+
+
+def _backfill(table: str):
+    # created_at хранится в серверном времени без пояса
+    while True:
+        result = op.get_bind().execute(sa.text(f"""
+            UPDATE {table}
+            SET local_date = (created_at::timestamptz AT TIME ZONE :tz)::date
+            WHERE id IN (
+                SELECT id FROM {table}
+                WHERE local_date IS NULL AND created_at IS NOT NULL
+                LIMIT :batch
+            )
+        """), {'tz': DEFAULT_TIMEZONE, 'batch': BATCH_SIZE})
+        if result.rowcount < BATCH_SIZE:
+            break
+
+
+def _rebuild_daily_totals(day: str):
+    op.execute("DELETE FROM daily_user_totals")
+    op.execute(REBUILD_SQL.format(day=day))
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('timezone', sa.String(length=64), nullable=True))
+    op.add_column('calorie_entries', sa.Column('local_date', sa.Date(), nullable=True))
+    op.add_column('workout_entries', sa.Column('local_date', sa.Date(), nullable=True))
+
+    with op.get_context().autocommit_block():
+        _backfill('calorie_entries')
+        _backfill('workout_entries')
+
+        # calorie_entries секционирована — CONCURRENTLY для неё недоступен
+        op.create_index('idx_calorie_entries_user_local_date', 'calorie_entries',
+                        ['user_id', 'local_date'], unique=False, if_not_exists=True)
+        op.create_index('idx_workout_entries_user_local_date', 'workout_entries',
+                        ['user_id', 'local_date'], unique=False,
+                        postgresql_concurrently=True, if_not_exists=True)
+
+    # Дневные итоги теперь по местной дате пользователя
+    _rebuild_daily_totals("COALESCE(local_date, created_at::date)")
+
+
+def downgrade() -> None:
+    _rebuild_daily_totals("created_at::date")
+    op.drop_index('idx_workout_entries_user_local_date', table_name='workout_entries', if_exists=True)
+    op.drop_index('idx_calorie_entries_user_local_date', table_name='calorie_entries', if_exists=True)
+    op.drop_column('workout_entries', 'local_date')
+    op.drop_column('calorie_entries', 'local_date')
+    op.drop_column('users', 'timezone')
@@ -0,0 +1,36 @@
+"""food_analysis_cache table and ai_interactions.cache_source
+
+Revision ID: 012_food_cache
+Revises: 011_local_date
+Create Date: 2026-10-17 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '012_food_cache'
+down_revision = '011_local_date'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('food_analysis_cache',
+        sa.Column('cache_key', sa.String(length=300), nullable=False),
+        sa.Column('result', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('cache_key')
+    )
+    op.create_index('idx_food_analysis_cache_expires', 'food_analysis_cache', ['expires_at'], unique=False)
+
+    # Колонка без DEFAULT — добавление не переписывает секции
+    op.add_column('ai_interactions', sa.Column('cache_source', sa.String(length=10), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('ai_interactions', 'cache_source')
+    op.drop_index('idx_food_analysis_cache_expires', table_name='food_analysis_cache')
+    op.drop_table('food_analysis_cache')
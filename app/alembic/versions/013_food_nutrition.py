@@ -0,0 +1,43 @@
+"""food_nutrition reference table with trigram search
+
+Revision ID: 013_food_nutrition
+Revises: 012_food_cache
+Create Date: 2026-10-17 21:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '013_food_nutrition'
+down_revision = '012_food_cache'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    # Только схема: данные справочника загружает python -m database.nutrition load
+    # (docker-entrypoint.sh migrate делает это после upgrade). Чтение CSV здесь
+    # сделало бы результат старой ревизии зависимым от текущего файла.
+    op.create_table('food_nutrition',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('aliases', sa.String(length=500), nullable=True),
+        sa.Column('search_text', sa.Text(), nullable=False),
+        sa.Column('kcal', sa.Float(), nullable=False),
+        sa.Column('protein', sa.Float(), nullable=False),
+        sa.Column('fats', sa.Float(), nullable=False),
+        sa.Column('carbs', sa.Float(), nullable=False),
+        sa.Column('portion_g', sa.Integer(), nullable=False),
+        sa.Column('portion_name', sa.String(length=30), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('name')
+    )
+    op.create_index('idx_food_nutrition_search', 'food_nutrition', ['search_text'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'search_text': 'gin_trgm_ops'})
+
+
+def downgrade() -> None:
+    op.drop_index('idx_food_nutrition_search', table_name='food_nutrition')
+    op.drop_table('food_nutrition')
@@ -0,0 +1,27 @@
+"""users.deletion_requested_at marker for background account deletion
+
+Revision ID: 014_deletion_marker
+Revises: 013_food_nutrition
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '014_deletion_marker'
+down_revision = '013_food_nutrition'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('users', sa.Column('deletion_requested_at', sa.DateTime(), nullable=True))
+    # Частичный индекс почти пустой: по нему при старте ищем прерванные удаления
+    op.create_index('idx_users_deletion_requested', 'users', ['telegram_id'], unique=False,
+                    postgresql_where=sa.text('deletion_requested_at IS NOT NULL'))
+
+
+def downgrade() -> None:
+    op.drop_index('idx_users_deletion_requested', table_name='users')
+    op.drop_column('users', 'deletion_requested_at')
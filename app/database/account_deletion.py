@@ -0,0 +1,146 @@
+"""
+Фоновое удаление аккаунта.
+
+Хэндлер только ставит задачу (schedule_account_deletion) и сразу отвечает.
+Данные удаляются пачками по ACCOUNT_DELETE_CHUNK строк, каждая пачка — отдельная
+короткая транзакция, поэтому большие таблицы не блокируются надолго.
+Строку users удаляем последней: ON DELETE CASCADE подчистит то, что успело
+записаться во время удаления. По завершении вызывается on_done(user_id).
+
+Запрос сначала фиксируется в users.deletion_requested_at, и только потом
+запускается задача. Если бот перезапустили посреди удаления, при старте
+resume_account_deletions() продолжает всё помеченное. Пока пометка стоит,
+хэндлеры бота пользователю не отвечают (handlers.start.deletion_guard).
+"""
+import asyncio
+import logging
+import os
+from typing import Awaitable, Callable, Optional
+
+from sqlalchemy import select, delete, update, func
+
+from database.database import (
+    async_session, User, CalorieEntry, WorkoutEntry, WeightLog, DailyUserTotal,
+    HealthData, AIInteraction, MealPlan, MealPlanItem, WorkoutPlan, WorkoutPlanItem,
+)
+from database.stats_cache import invalidate_stats
+from database.user_cache import invalidate_user
+
+logger = logging.getLogger(__name__)
+
+ACCOUNT_DELETE_CHUNK = int(os.getenv('ACCOUNT_DELETE_CHUNK', '1000'))  # строк на транзакцию
+
+# Сначала дочерние таблицы планов, затем остальные; (модель, колонка для выборки пачки)
+_TABLES = [
+    (MealPlanItem, MealPlanItem.id),
+    (MealPlan, MealPlan.id),
+    (WorkoutPlanItem, WorkoutPlanItem.id),
+    (WorkoutPlan, WorkoutPlan.id),
+    (CalorieEntry, CalorieEntry.id),
+    (WorkoutEntry, WorkoutEntry.id),
+    (WeightLog, WeightLog.id),
+    (DailyUserTotal, DailyUserTotal.day),
+    (HealthData, HealthData.id),
+    (AIInteraction, AIInteraction.id),
+]
+
+_tasks: dict = {}  # telegram_id -> asyncio.Task
+# Помеченные в БД; сбрасывается только после удаления строки users
+_pending: set = set()
+
+
+async def _delete_in_chunks(model, key_column, user_id: int, chunk_size: int) -> int:
+    deleted = 0
+    while True:
+        async with async_session() as session:
+            chunk = (
+                select(key_column)
+                .where(model.user_id == user_id)
+                .limit(chunk_size)
+                .scalar_subquery()
+            )
+            result = await session.execute(
+                delete(model)
+                .where(model.user_id == user_id, key_column.in_(chunk))
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+        deleted += result.rowcount
+        if result.rowcount < chunk_size:
+            return deleted
+        # Отдаём управление остальным хэндлерам между пачками
+        await asyncio.sleep(0)
+
+
+async def delete_account(user_id: int, chunk_size: int = ACCOUNT_DELETE_CHUNK) -> int:
+    """Удалить все данные пользователя пачками, вернуть число удалённых строк"""
+    deleted = 0
+    for model, key_column in _TABLES:
+        deleted += await _delete_in_chunks(model, key_column, user_id, chunk_size)
+
+    async with async_session() as session:
+        result = await session.execute(delete(User).where(User.telegram_id == user_id))
+        await session.commit()
+    _pending.discard(user_id)
+    invalidate_user(user_id)
+    invalidate_stats(user_id)
+    return deleted + result.rowcount
+
+
+async def _run_deletion(user_id: int, on_done: Optional[Callable[[int], Awaitable]]):
+    try:
+        rows = await delete_account(user_id)
+        logger.info(f"Аккаунт {user_id} удалён, строк: {rows}")
+        if on_done is not None:
+            await on_done(user_id)
+    except Exception:
+        logger.exception(f"Ошибка удаления аккаунта {user_id}")
+    finally:
+        _tasks.pop(user_id, None)
+
+
+def _start_task(user_id: int, on_done: Optional[Callable[[int], Awaitable]]):
+    _pending.add(user_id)
+    invalidate_user(user_id)
+    _tasks[user_id] = asyncio.create_task(_run_deletion(user_id, on_done))
+
+
+async def schedule_account_deletion(user_id: int,
+                                    on_done: Optional[Callable[[int], Awaitable]] = None) -> bool:
+    """Пометить аккаунт к удалению и поставить удаление в фон; False — если удаление уже идёт"""
+    if user_id in _tasks:
+        return False
+    async with async_session() as session:
+        await session.execute(
+            update(User)
+            .where(User.telegram_id == user_id, User.deletion_requested_at.is_(None))
+            .values(deletion_requested_at=func.now())
+        )
+        await session.commit()
+    _start_task(user_id, on_done)
+    return True
+
+
+async def resume_account_deletions(on_done: Optional[Callable[[int], Awaitable]] = None) -> int:
+    """Продолжить удаления, прерванные перезапуском (вызывается при старте бота)"""
+    async with async_session() as session:
+        user_ids = (await session.execute(
+            select(User.telegram_id).where(User.deletion_requested_at.is_not(None))
+        )).scalars().all()
+    for user_id in user_ids:
+        if user_id not in _tasks:
+            _start_task(user_id, on_done)
+    if user_ids:
+        logger.info(f"Продолжаем удаление аккаунтов: {len(user_ids)}")
+    return len(user_ids)
+
+
+def is_deletion_pending(user_id: int) -> bool:
+    """Удаление запрошено и ещё не закончено (в том числе упало — повторится при рестарте)"""
+    return user_id in _pending
+
+
+async def wait_account_deletions(timeout: float = 30):
+    """Дождаться идущих удалений при остановке бота (недоделанные продолжатся при старте)"""
+    if _tasks:
+        await asyncio.wait(list(_tasks.values()), timeout=timeout)
@@ -0,0 +1,98 @@
+"""
+Отложенная запись users.last_active_at.
+
+Хэндлеры только отмечают активность в памяти (mark_active), а фоновая задача
+периодически сбрасывает накопленное одним UPDATE ... FROM (VALUES ...) на пачку.
+При остановке бота всё накопленное дописывается.
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime
+
+from sqlalchemy import update, values, column, BigInteger, DateTime
+
+from database.database import async_session, User
+
+logger = logging.getLogger(__name__)
+
+ACTIVITY_FLUSH_INTERVAL = float(os.getenv('ACTIVITY_FLUSH_INTERVAL', '30'))  # секунды
+ACTIVITY_FLUSH_BATCH = int(os.getenv('ACTIVITY_FLUSH_BATCH', '500'))  # строк на один UPDATE
+
+_pending: dict = {}  # telegram_id -> время последней активности
+_task: asyncio.Task = None
+_metrics = {'flushed': 0, 'flushes': 0, 'errors': 0}
+
+
+def mark_active(telegram_id: int):
+    """Отметить активность пользователя (без обращения к БД)"""
+    _pending[telegram_id] = datetime.now()
+
+
+async def flush_activity() -> int:
+    """Записать накопленную активность в БД пачками, вернуть число строк"""
+    flushed = 0
+    while _pending:
+        batch = []
+        for telegram_id in list(_pending)[:ACTIVITY_FLUSH_BATCH]:
+            batch.append((telegram_id, _pending.pop(telegram_id)))
+
+        v = values(
+            column('telegram_id', BigInteger), column('last_active_at', DateTime),
+            name='v',
+        ).data(batch)
+        try:
+            async with async_session() as session:
+                await session.execute(
+                    update(User)
+                    .where(User.telegram_id == v.c.telegram_id)
+                    .values(last_active_at=v.c.last_active_at)
+                )
+                await session.commit()
+        except Exception:
+            # Возвращаем пачку, не затирая более свежие отметки
+            for telegram_id, ts in batch:
+                _pending.setdefault(telegram_id, ts)
+            _metrics['errors'] += 1
+            raise
+
+        flushed += len(batch)
+        _metrics['flushed'] += len(batch)
+        _metrics['flushes'] += 1
+    return flushed
+
+
+async def _flush_loop():
+    while True:
+        await asyncio.sleep(ACTIVITY_FLUSH_INTERVAL)
+        try:
+            await flush_activity()
+        except Exception:
+            logger.exception("Ошибка записи last_active_at")
+
+
+def start_activity_writer():
+    """Запустить фоновую запись активности"""
+    global _task
+    if _task is None:
+        _task = asyncio.create_task(_flush_loop())
+
+
+async def stop_activity_writer():
+    """Остановить фоновую задачу и дописать накопленное"""
+    global _task
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
+    try:
+        await flush_activity()
+    except Exception:
+        logger.exception("Не удалось дописать last_active_at при остановке")
+
+
+def activity_stats() -> dict:
+    return {'pending': len(_pending), **_metrics}
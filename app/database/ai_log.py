@@ -0,0 +1,130 @@
+"""
+Отложенная запись журнала AI (ai_interactions).
+
+Хэндлеры кладут запись в ограниченную очередь (log_interaction) и не ждут БД.
+Фоновая задача собирает пачку до AI_LOG_BATCH записей или до AI_LOG_FLUSH_MS
+миллисекунд и пишет её одним многострочным INSERT вместе с дневной сводкой
+ai_usage_daily. Если очередь заполнена, log_interaction ждёт свободного места
+(backpressure). При остановке бота очередь дописывается до конца.
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from database.database import async_session, AIInteraction
+from database.reports import add_usage
+
+logger = logging.getLogger(__name__)
+
+AI_LOG_QUEUE_SIZE = int(os.getenv('AI_LOG_QUEUE_SIZE', '10000'))
+AI_LOG_BATCH = int(os.getenv('AI_LOG_BATCH', '200'))  # записей на один INSERT
+AI_LOG_FLUSH_MS = int(os.getenv('AI_LOG_FLUSH_MS', '500'))  # максимальная задержка записи
+
+_STOP = object()
+_queue: asyncio.Queue = None
+_task: asyncio.Task = None
+_metrics = {'written': 0, 'batches': 0, 'dropped': 0, 'backpressure': 0, 'errors': 0}
+
+
+async def _insert(records: list):
+    async with async_session() as session:
+        await session.execute(insert(AIInteraction), records)
+        await add_usage(session, records)
+        await session.commit()
+
+
+async def write_batch(records: list):
+    """Записать пачку; при ошибке — по одной, отбрасывая строки, которые не пишутся"""
+    try:
+        await _insert(records)
+    except Exception:
+        _metrics['errors'] += 1
+        logger.exception(f"Ошибка записи пачки ai_interactions ({len(records)} шт.), пишем по одной")
+        written = 0
+        for record in records:
+            try:
+                await _insert([record])
+                written += 1
+            except Exception:
+                # Например, пользователь уже удалён (внешний ключ на users)
+                _metrics['dropped'] += 1
+                logger.warning(f"Запись ai_interactions отброшена: user_id={record.get('user_id')}")
+    else:
+        written = len(records)
+    _metrics['written'] += written
+    _metrics['batches'] += 1
+
+
+async def log_interaction(**fields):
+    """Поставить запись ai_interactions в очередь на запись"""
+    fields.setdefault('created_at', datetime.now())
+    if _queue is None or _task is None:
+        # Писатель не запущен (скрипты, тесты) — пишем сразу
+        await write_batch([fields])
+        return
+    try:
+        _queue.put_nowait(fields)
+    except asyncio.QueueFull:
+        _metrics['backpressure'] += 1
+        await _queue.put(fields)
+
+
+async def _writer_loop():
+    loop = asyncio.get_running_loop()
+    stopping = False
+    while not stopping:
+        item = await _queue.get()
+        if item is _STOP:
+            break
+        batch = [item]
+        deadline = loop.time() + AI_LOG_FLUSH_MS / 1000
+        while len(batch) < AI_LOG_BATCH:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(_queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            if item is _STOP:
+                stopping = True
+                break
+            batch.append(item)
+        await write_batch(batch)
+
+
+def start_ai_log_writer():
+    """Запустить фоновую запись журнала AI"""
+    global _queue, _task
+    if _task is None:
+        _queue = asyncio.Queue(maxsize=AI_LOG_QUEUE_SIZE)
+        _task = asyncio.create_task(_writer_loop())
+
+
+async def stop_ai_log_writer():
+    """Дописать очередь и остановить фоновую задачу"""
+    global _task
+    if _task is None:
+        return
+    await _queue.put(_STOP)
+    try:
+        await _task
+    except Exception:
+        logger.exception("Фоновая запись ai_interactions завершилась с ошибкой")
+    _task = None
+
+    # То, что успели положить после _STOP
+    rest = []
+    while not _queue.empty():
+        item = _queue.get_nowait()
+        if item is not _STOP:
+            rest.append(item)
+    for start in range(0, len(rest), AI_LOG_BATCH):
+        await write_batch(rest[start:start + AI_LOG_BATCH])
+
+
+def ai_log_stats() -> dict:
+    return {'pending': _queue.qsize() if _queue is not None else 0, **_metrics}
@@ -0,0 +1,195 @@
+"""
+Холодный архив полезной нагрузки ai_interactions.
+
+Для /balance нужны только модель и токены, а полный ответ AI, текст запроса и путь
+к файлу через несколько недель нужны лишь для разборов. Задача archive переносит их
+в сжатые NDJSON-сегменты (AI_ARCHIVE_DIR), а в БД оставляет «тонкую» строку
+с archived_at и именем сегмента.
+
+Запускать по cron:
+    python -m database.archive run [--older-than-days 30] [--batch 1000]
+    python -m database.archive show SEGMENT [--user-id ID] [--id ID]
+    python -m database.archive restore SEGMENT [--user-id ID]
+    python -m database.archive list
+
+Сегмент — один файл на запуск, каждая пачка дописывается отдельным gzip-членом
+и синхронизируется на диск до UPDATE в БД. Если UPDATE не прошёл, строки
+попадут в архив повторно при следующем запуске; restore берёт последнюю копию.
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update, bindparam
+
+from database.database import async_session, engine, AIInteraction
+
+AI_ARCHIVE_DIR = os.getenv('AI_ARCHIVE_DIR', '/app/archive')
+AI_ARCHIVE_AFTER_DAYS = int(os.getenv('AI_ARCHIVE_AFTER_DAYS', '30'))
+AI_ARCHIVE_BATCH = int(os.getenv('AI_ARCHIVE_BATCH', '1000'))  # строк на одну транзакцию
+
+# Колонки, которые уходят в архив и обнуляются в БД
+PAYLOAD_COLUMNS = ('input_data', 'input_file_path', 'ai_response')
+
+_table = AIInteraction.__table__
+
+
+def _serialize(row) -> str:
+    record = {}
+    for key, value in row._mapping.items():
+        record[key] = value.isoformat() if isinstance(value, datetime) else value
+    return json.dumps(record, ensure_ascii=False, default=str)
+
+
+def _append_member(path: str, lines: list):
+    """Дописать пачку отдельным gzip-членом и сбросить на диск"""
+    data = gzip.compress(('\n'.join(lines) + '\n').encode('utf-8'))
+    with open(path, 'ab') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def segment_path(segment: str) -> str:
+    """Путь к сегменту по имени (или сам путь, если файл существует)"""
+    if os.path.exists(segment):
+        return segment
+    return os.path.join(AI_ARCHIVE_DIR, os.path.basename(segment))
+
+
+def read_segment(segment: str):
+    """Записи сегмента; дубликаты одного id — последняя копия"""
+    records = {}
+    with gzip.open(segment_path(segment), 'rt', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                records[record['id']] = record
+    return list(records.values())
+
+
+async def archive_interactions(older_than_days: int = AI_ARCHIVE_AFTER_DAYS,
+                               batch_size: int = AI_ARCHIVE_BATCH) -> tuple:
+    """Вынести в архив строки старше older_than_days, вернуть (сегмент, число строк)"""
+    os.makedirs(AI_ARCHIVE_DIR, exist_ok=True)
+    cutoff = datetime.now() - timedelta(days=older_than_days)
+    segment = f"ai_interactions_{datetime.now().strftime('%Y%m%d_%H%M%S')}.ndjson.gz"
+    path = os.path.join(AI_ARCHIVE_DIR, segment)
+    archived = 0
+
+    while True:
+        async with async_session() as session:
+            rows = (await session.execute(
+                select(_table)
+                .where(_table.c.archived_at.is_(None), _table.c.created_at < cutoff)
+                .order_by(_table.c.created_at, _table.c.id)
+                .limit(batch_size)
+                .with_for_update(skip_locked=True)
+            )).all()
+            if not rows:
+                break
+
+            _append_member(path, [_serialize(row) for row in rows])
+
+            await session.execute(
+                update(_table)
+                .where(
+                    _table.c.id.in_([row.id for row in rows]),
+                    _table.c.created_at < cutoff,
+                )
+                .values(
+                    archived_at=datetime.now(),
+                    archive_segment=segment,
+                    **{column: None for column in PAYLOAD_COLUMNS},
+                )
+            )
+            await session.commit()
+        archived += len(rows)
+
+    return (segment if archived else None), archived
+
+
+async def restore_segment(segment: str, user_id: int = None,
+                          batch_size: int = AI_ARCHIVE_BATCH) -> int:
+    """Вернуть полезную нагрузку из сегмента в БД (для разбора конкретного случая)"""
+    records = [r for r in read_segment(segment) if user_id is None or r['user_id'] == user_id]
+    stmt = (
+        update(_table)
+        .where(
+            _table.c.id == bindparam('_id'),
+            _table.c.created_at == bindparam('_created_at'),
+        )
+        .values(
+            archived_at=None,
+            archive_segment=None,
+            **{column: bindparam(column) for column in PAYLOAD_COLUMNS},
+        )
+    )
+    for start in range(0, len(records), batch_size):
+        params = [
+            {
+                '_id': r['id'],
+                '_created_at': datetime.fromisoformat(r['created_at']),
+                **{column: r.get(column) for column in PAYLOAD_COLUMNS},
+            }
+            for r in records[start:start + batch_size]
+        ]
+        async with async_session() as session:
+            await session.execute(stmt, params)
+            await session.commit()
+    return len(records)
+
+
+async def _run(args):
+    try:
+        if args.command == 'run':
+            segment, rows = await archive_interactions(args.older_than_days, args.batch)
+            print(f"✅ В архив вынесено строк: {rows}" + (f" ({segment})" if segment else ""))
+        elif args.command == 'restore':
+            rows = await restore_segment(args.segment, args.user_id)
+            print(f"✅ Восстановлено строк: {rows}")
+    finally:
+        await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Архив полезной нагрузки ai_interactions")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help="Вынести старые строки в новый сегмент")
+    run.add_argument('--older-than-days', type=int, default=AI_ARCHIVE_AFTER_DAYS)
+    run.add_argument('--batch', type=int, default=AI_ARCHIVE_BATCH)
+
+    show = commands.add_parser('show', help="Вывести записи сегмента (NDJSON) без изменения БД")
+    show.add_argument('segment')
+    show.add_argument('--user-id', type=int)
+    show.add_argument('--id', type=int)
+
+    restore = commands.add_parser('restore', help="Вернуть данные сегмента в БД")
+    restore.add_argument('segment')
+    restore.add_argument('--user-id', type=int)
+
+    commands.add_parser('list', help="Список сегментов")
+    args = parser.parse_args()
+
+    if args.command == 'list':
+        if os.path.isdir(AI_ARCHIVE_DIR):
+            for name in sorted(os.listdir(AI_ARCHIVE_DIR)):
+                size = os.path.getsize(os.path.join(AI_ARCHIVE_DIR, name))
+                print(f"{name}\t{size // 1024} КБ")
+    elif args.command == 'show':
+        for record in read_segment(args.segment):
+            if args.user_id is not None and record['user_id'] != args.user_id:
+                continue
+            if args.id is not None and record['id'] != args.id:
+                continue
+            print(json.dumps(record, ensure_ascii=False))
+    else:
+        asyncio.run(_run(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,17 +1,44 @@
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
-from sqlalchemy import Column, Integer, String, Float, DateTime, BigInteger, Boolean, Text, JSON, text, func
-from datetime import datetime
+from sqlalchemy import Column, Integer, String, Float, DateTime, BigInteger, Boolean, Text, JSON, Date, Index, ForeignKey, DDL, event, text, func
+from sqlalchemy.dialects.postgresql import JSONB
+from datetime import date, datetime
+from zoneinfo import ZoneInfo
 import os
 from dotenv import load_dotenv
 
+from database.pool import InstrumentedPool, instrument_engine
+
 load_dotenv()
 
+# Часовой пояс пользователей, не выбравших свой (/timezone)
+DEFAULT_TIMEZONE = os.getenv('DEFAULT_TIMEZONE', 'Europe/Moscow')
+
 # Формируем URL подключения к БД
 DATABASE_URL = f"postgresql+asyncpg://{os.getenv('DB_USER')}:{os.getenv('DB_PASSWORD')}@{os.getenv('DB_HOST')}:{os.getenv('DB_PORT')}/{os.getenv('DB_NAME')}"
 
+# Настройки пула соединений
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '10'))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '30'))  # секунды ожидания свободного соединения
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '1800'))  # секунды, -1 — не пересоздавать
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', '1').lower() in ('1', 'true', 'yes')
+# Подготовленные выражения asyncpg на одно соединение (0 — отключить, нужно за pgbouncer)
+DB_PREPARED_STATEMENT_CACHE_SIZE = int(os.getenv('DB_PREPARED_STATEMENT_CACHE_SIZE', '256'))
+
 # Создаем асинхронный движок
-engine = create_async_engine(DATABASE_URL, echo=False)
+engine = create_async_engine(
+    DATABASE_URL,
+    echo=False,
+    poolclass=InstrumentedPool,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=DB_POOL_PRE_PING,
+    connect_args={'prepared_statement_cache_size': DB_PREPARED_STATEMENT_CACHE_SIZE},
+)
+instrument_engine(engine)
 
 # Создаем фабрику сессий
 async_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
@@ -38,31 +65,54 @@ class User(Base):
     goal = Column(String(50))  # lose_weight, maintain, gain_weight
     daily_calorie_target = Column(Integer)
     current_day_start = Column(DateTime)  # /new_day override
+    timezone = Column(String(64))  # IANA, например Europe/Moscow; NULL — DEFAULT_TIMEZONE
     last_active_at = Column(DateTime)
+    deletion_requested_at = Column(DateTime)  # удаление аккаунта подтверждено (database.account_deletion)
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
 
+    __table_args__ = (
+        Index('idx_users_last_active', 'last_active_at'),
+        Index('idx_users_deletion_requested', 'telegram_id',
+              postgresql_where=text('deletion_requested_at IS NOT NULL')),
+    )
+
 
 class CalorieEntry(Base):
     """Модель записи о калориях"""
     __tablename__ = 'calorie_entries'
     
     id = Column(Integer, primary_key=True)
-    user_id = Column(BigInteger, nullable=False)
+    user_id = Column(BigInteger, ForeignKey('users.telegram_id', ondelete='CASCADE'), nullable=False)
     food_name = Column(String(255), nullable=False)
     calories = Column(Integer, nullable=False)
     protein = Column(Float, default=0)  # белки в граммах
     carbs = Column(Float, default=0)  # углеводы в граммах
     fats = Column(Float, default=0)  # жиры в граммах
-    meal_type = Column(String(50))  # breakfast, lunch, dinner, snack
+    meal_type = Column(String(50))  # breakfast, lunch, dinner, snack, water
+    water_ml = Column(Integer)  # объём воды в мл (только для meal_type='water')
+    local_date = Column(Date)  # день записи в часовом поясе пользователя
     
     # AI-Hub поля
     source_type = Column(String(20), default='manual')  # manual, voice, photo, text_ai
-    source_data = Column(JSON)  # Оригинальные данные (путь к фото, текст голоса и т.д.)
+    source_data = Column(JSONB)  # original_text, normalized_text, file_path
     ai_confidence = Column(Float)  # Уверенность AI в анализе (0-1)
     ai_notes = Column(Text)  # Заметки/рекомендации от AI
     
-    created_at = Column(DateTime, server_default=func.now())
+    created_at = Column(DateTime, server_default=func.now(), nullable=False)  # ключ помесячного секционирования
+
+    __table_args__ = (
+        Index('idx_calorie_entries_source', 'source_type'),
+        Index('idx_calorie_entries_user_local_date', 'user_id', 'local_date'),
+        Index('idx_calorie_entries_user_created', 'user_id', 'created_at',
+              postgresql_include=['calories']),
+        Index('idx_calorie_entries_user_water_ml', 'user_id', 'created_at',
+              postgresql_where=text("meal_type = 'water'"), postgresql_include=['water_ml']),
+        Index('idx_calorie_entries_user_meals', 'user_id', 'created_at',
+              postgresql_where=text("meal_type <> 'water'"), postgresql_include=['calories']),
+        Index('idx_calorie_entries_normalized_text', text("(source_data ->> 'normalized_text')"),
+              postgresql_where=text("(source_data ->> 'normalized_text') IS NOT NULL")),
+    )
 
 
 class WorkoutEntry(Base):
@@ -70,7 +120,7 @@ class WorkoutEntry(Base):
     __tablename__ = 'workout_entries'
     
     id = Column(Integer, primary_key=True)
-    user_id = Column(BigInteger, nullable=False)
+    user_id = Column(BigInteger, ForeignKey('users.telegram_id', ondelete='CASCADE'), nullable=False)
     workout_type = Column(String(100), nullable=False)  # running, gym, yoga, etc.
     duration = Column(Integer, nullable=False)  # продолжительность в минутах
     calories_burned = Column(Integer, default=0)
@@ -82,26 +132,55 @@ class WorkoutEntry(Base):
     distance = Column(Float)  # расстояние в км (если применимо)
     pace = Column(String(50))  # темп (если применимо)
     ai_confidence = Column(Float)
-    
+
+    local_date = Column(Date)  # день записи в часовом поясе пользователя
     created_at = Column(DateTime, server_default=func.now())
 
+    __table_args__ = (
+        Index('idx_workout_entries_user_created', 'user_id', 'created_at',
+              postgresql_include=['duration', 'calories_burned']),
+        Index('idx_workout_entries_user_local_date', 'user_id', 'local_date'),
+    )
+
 
 class WeightLog(Base):
     """Модель записи веса"""
     __tablename__ = 'weight_logs'
     
     id = Column(Integer, primary_key=True)
-    user_id = Column(BigInteger, nullable=False)
+    user_id = Column(BigInteger, ForeignKey('users.telegram_id', ondelete='CASCADE'), nullable=False)
     weight = Column(Float, nullable=False)
     created_at = Column(DateTime, server_default=func.now())
 
+    __table_args__ = (
+        Index('idx_weight_logs_user_created', 'user_id', 'created_at'),
+    )
+
+
+class DailyUserTotal(Base):
+    """Дневные итоги пользователя (обновляются вместе с записями еды/тренировок/воды)"""
+    __tablename__ = 'daily_user_totals'
+
+    user_id = Column(BigInteger, ForeignKey('users.telegram_id', ondelete='CASCADE'), primary_key=True)
+    day = Column(Date, primary_key=True)
+    calories = Column(Integer, nullable=False, default=0, server_default='0')
+    protein = Column(Float, nullable=False, default=0, server_default='0')
+    fats = Column(Float, nullable=False, default=0, server_default='0')
+    carbs = Column(Float, nullable=False, default=0, server_default='0')
+    water_ml = Column(Integer, nullable=False, default=0, server_default='0')
+    meal_count = Column(Integer, nullable=False, default=0, server_default='0')  # без воды
+    workout_count = Column(Integer, nullable=False, default=0, server_default='0')
+    workout_minutes = Column(Integer, nullable=False, default=0, server_default='0')
+    burned_calories = Column(Integer, nullable=False, default=0, server_default='0')
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
 
 class HealthData(Base):
     """Модель для хранения анализов и медицинских данных"""
     __tablename__ = 'health_data'
     
     id = Column(Integer, primary_key=True)
-    user_id = Column(BigInteger, nullable=False)
+    user_id = Column(BigInteger, ForeignKey('users.telegram_id', ondelete='CASCADE'), nullable=False)
     data_type = Column(String(50), nullable=False)  # blood_test, hormone, vitamin, etc.
     parameter_name = Column(String(100), nullable=False)  # ferritin, vitamin_d, hemoglobin, etc.
     value = Column(Float, nullable=False)
@@ -118,13 +197,18 @@ class HealthData(Base):
     test_date = Column(DateTime)  # дата сдачи анализа
     created_at = Column(DateTime, server_default=func.now())
 
+    __table_args__ = (
+        Index('idx_health_data_user_id', 'user_id'),
+        Index('idx_health_data_test_date', 'test_date'),
+    )
+
 
 class AIInteraction(Base):
     """Лог всех взаимодействий с AI для контекста и аналитики"""
     __tablename__ = 'ai_interactions'
     
     id = Column(Integer, primary_key=True)
-    user_id = Column(BigInteger, nullable=False)
+    user_id = Column(BigInteger, ForeignKey('users.telegram_id', ondelete='CASCADE'), nullable=False)
     interaction_type = Column(String(50), nullable=False)  # food_analysis, workout_analysis, recommendation, consultation
     
     # Входные данные
@@ -133,7 +217,7 @@ class AIInteraction(Base):
     input_file_path = Column(String(500))  # путь к медиа-файлу
     
     # Выходные данные AI
-    ai_response = Column(JSON)  # структурированный ответ AI
+    ai_response = Column(JSONB)  # структурированный ответ AI
     ai_model = Column(String(50))  # gpt-4o, gpt-4o-mini, whisper-1
     ai_confidence = Column(Float)
 
@@ -145,8 +229,110 @@ class AIInteraction(Base):
     # Связь с созданными записями
     created_entry_type = Column(String(50))  # calorie_entry, workout_entry, health_data
     created_entry_id = Column(Integer)  # ID созданной записи
+
+    # Архив: input_data / input_file_path / ai_response вынесены в NDJSON-сегмент
+    archived_at = Column(DateTime)
+    archive_segment = Column(String(255))  # имя файла сегмента (database.archive)
+
+    # Откуда взят результат: memory / db — кэш анализа еды, local — справочник
+    # продуктов (database.nutrition), shared — общий с одинаковым одновременным
+    # запросом (utils.openai_helper), history — прошлая запись пользователя, когда
+    # AI недоступен (handlers.ai_hub), NULL — отдельный запрос к AI
+    cache_source = Column(String(10))
     
-    created_at = Column(DateTime, server_default=func.now())
+    created_at = Column(DateTime, server_default=func.now(), nullable=False)  # ключ помесячного секционирования
+
+    __table_args__ = (
+        Index('idx_ai_interactions_user_id', 'user_id'),
+        Index('idx_ai_interactions_type', 'interaction_type'),
+        Index('idx_ai_interactions_created', 'created_at'),
+        Index('idx_ai_interactions_response', 'ai_response',
+              postgresql_using='gin', postgresql_ops={'ai_response': 'jsonb_path_ops'}),
+        Index('idx_ai_interactions_low_confidence', 'created_at',
+              postgresql_where=text("ai_confidence < 0.5")),
+        Index('idx_ai_interactions_unarchived', 'created_at',
+              postgresql_where=text("archived_at IS NULL")),
+    )
+
+
+class AIUsageDaily(Base):
+    """Расход AI по дням, моделям и типам запросов (для /balance, обновляется журналом AI)"""
+    __tablename__ = 'ai_usage_daily'
+
+    day = Column(Date, primary_key=True)
+    ai_model = Column(String(50), primary_key=True)  # '?' — модель не указана
+    interaction_type = Column(String(50), primary_key=True)
+    requests = Column(Integer, nullable=False, default=0, server_default='0')
+    prompt_tokens = Column(BigInteger, nullable=False, default=0, server_default='0')
+    completion_tokens = Column(BigInteger, nullable=False, default=0, server_default='0')
+    total_tokens = Column(BigInteger, nullable=False, default=0, server_default='0')
+
+
+class FoodAnalysisCache(Base):
+    """Кэш анализа еды по нормализованному тексту (database.food_cache)"""
+    __tablename__ = 'food_analysis_cache'
+
+    cache_key = Column(String(300), primary_key=True)  # цель|нормализованный текст
+    result = Column(JSONB, nullable=False)
+    created_at = Column(DateTime, server_default=func.now(), nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index('idx_food_analysis_cache_expires', 'expires_at'),
+    )
+
+
+class FoodNutrition(Base):
+    """Справочник блюд и продуктов: КБЖУ на 100 г и стандартная порция"""
+    __tablename__ = 'food_nutrition'
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(100), nullable=False, unique=True)
+    aliases = Column(String(500))  # другие названия через |
+    search_text = Column(Text, nullable=False)  # name и aliases в нижнем регистре для триграмм
+    kcal = Column(Float, nullable=False)
+    protein = Column(Float, nullable=False, default=0)
+    fats = Column(Float, nullable=False, default=0)
+    carbs = Column(Float, nullable=False, default=0)
+    portion_g = Column(Integer, nullable=False)  # граммов в стандартной порции
+    portion_name = Column(String(30))  # шт, тарелка, стакан...
+
+    __table_args__ = (
+        Index('idx_food_nutrition_search', 'search_text',
+              postgresql_using='gin', postgresql_ops={'search_text': 'gin_trgm_ops'}),
+    )
+
+
+# Пользователи по дням для /users: регистрации (по created_at) и последняя активность
+# (по last_active_at — каждый пользователь попадает в один день). Обновляется по расписанию.
+USER_DAILY_STATS_SQL = """
+CREATE MATERIALIZED VIEW IF NOT EXISTS user_daily_stats AS
+SELECT day,
+       SUM(new_users)::int AS new_users,
+       SUM(with_profile)::int AS with_profile,
+       SUM(last_active)::int AS last_active
+FROM (
+    SELECT created_at::date AS day, 1 AS new_users,
+           (daily_calorie_target IS NOT NULL)::int AS with_profile, 0 AS last_active
+    FROM users
+    WHERE created_at IS NOT NULL
+    UNION ALL
+    SELECT last_active_at::date, 0, 0, 1
+    FROM users
+    WHERE last_active_at IS NOT NULL
+) s
+GROUP BY day
+"""
+# Уникальный индекс нужен для REFRESH MATERIALIZED VIEW CONCURRENTLY
+USER_DAILY_STATS_INDEX_SQL = (
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_user_daily_stats_day ON user_daily_stats (day)"
+)
+
+# DB_STARTUP_MODE=create_all: представление создаётся вместе с таблицами
+event.listen(Base.metadata, 'after_create', DDL(USER_DAILY_STATS_SQL))
+event.listen(Base.metadata, 'after_create', DDL(USER_DAILY_STATS_INDEX_SQL))
+# Триграммный индекс справочника продуктов (FoodNutrition) требует pg_trgm
+event.listen(Base.metadata, 'before_create', DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
 
 
 class MealPlan(Base):
@@ -154,20 +340,24 @@ class MealPlan(Base):
     __tablename__ = 'meal_plans'
 
     id = Column(Integer, primary_key=True)
-    user_id = Column(BigInteger, nullable=False)
+    user_id = Column(BigInteger, ForeignKey('users.telegram_id', ondelete='CASCADE'), nullable=False)
     week_start = Column(DateTime, nullable=False)
     is_active = Column(Boolean, default=True)
     ai_response = Column(JSON)
     created_at = Column(DateTime, server_default=func.now())
 
+    __table_args__ = (
+        Index('idx_meal_plans_user_id', 'user_id'),
+    )
+
 
 class MealPlanItem(Base):
     """Элемент плана питания (одно блюдо)"""
     __tablename__ = 'meal_plan_items'
 
     id = Column(Integer, primary_key=True)
-    plan_id = Column(Integer, nullable=False)
-    user_id = Column(BigInteger, nullable=False)
+    plan_id = Column(Integer, ForeignKey('meal_plans.id', ondelete='CASCADE'), nullable=False)
+    user_id = Column(BigInteger, ForeignKey('users.telegram_id', ondelete='CASCADE'), nullable=False)
     day_of_week = Column(Integer, nullable=False)  # 0=Пн, 6=Вс
     meal_type = Column(String(20), nullable=False)  # breakfast, lunch, dinner, snack
     food_name = Column(String(500), nullable=False)
@@ -181,26 +371,35 @@ class MealPlanItem(Base):
     completed_at = Column(DateTime)
     created_at = Column(DateTime, server_default=func.now())
 
+    __table_args__ = (
+        Index('idx_meal_plan_items_user_id', 'user_id'),
+        Index('idx_meal_plan_items_plan_id', 'plan_id'),
+    )
+
 
 class WorkoutPlan(Base):
     """Недельный план тренировок"""
     __tablename__ = 'workout_plans'
 
     id = Column(Integer, primary_key=True)
-    user_id = Column(BigInteger, nullable=False)
+    user_id = Column(BigInteger, ForeignKey('users.telegram_id', ondelete='CASCADE'), nullable=False)
     week_start = Column(DateTime, nullable=False)
     is_active = Column(Boolean, default=True)
     ai_response = Column(JSON)
     created_at = Column(DateTime, server_default=func.now())
 
+    __table_args__ = (
+        Index('idx_workout_plans_user_id', 'user_id'),
+    )
+
 
 class WorkoutPlanItem(Base):
     """Элемент плана тренировок (одна тренировка на день)"""
     __tablename__ = 'workout_plan_items'
 
     id = Column(Integer, primary_key=True)
-    plan_id = Column(Integer, nullable=False)
-    user_id = Column(BigInteger, nullable=False)
+    plan_id = Column(Integer, ForeignKey('workout_plans.id', ondelete='CASCADE'), nullable=False)
+    user_id = Column(BigInteger, ForeignKey('users.telegram_id', ondelete='CASCADE'), nullable=False)
     day_of_week = Column(Integer, nullable=False)  # 0=Пн, 6=Вс
     workout_type = Column(String(100), nullable=False)
     exercises = Column(JSON)  # [{name, sets, reps, rest}, ...]
@@ -212,28 +411,84 @@ class WorkoutPlanItem(Base):
     completed_at = Column(DateTime)
     created_at = Column(DateTime, server_default=func.now())
 
+    __table_args__ = (
+        Index('idx_workout_plan_items_user_id', 'user_id'),
+        Index('idx_workout_plan_items_plan_id', 'plan_id'),
+    )
+
+
+def user_zone(tz_name: str = None) -> ZoneInfo:
+    """Часовой пояс пользователя (DEFAULT_TIMEZONE, если не задан)"""
+    return ZoneInfo(tz_name or DEFAULT_TIMEZONE)
+
+
+def local_today(tz_name: str = None) -> date:
+    """Сегодняшняя дата в часовом поясе пользователя"""
+    return datetime.now(user_zone(tz_name)).date()
 
-def calc_today_start(user_day_start=None):
-    """Начало текущего дня с учётом /new_day"""
-    midnight = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+def local_meal_type(tz_name: str = None) -> str:
+    """Приём пищи по текущему часу пользователя: breakfast / lunch / dinner / snack"""
+    hour = datetime.now(user_zone(tz_name)).hour
+    if 5 <= hour < 11:
+        return 'breakfast'
+    if 11 <= hour < 16:
+        return 'lunch'
+    if 16 <= hour < 22:
+        return 'dinner'
+    return 'snack'
+
+
+def calc_today_start(user_day_start=None, tz_name: str = None):
+    """Начало текущего дня пользователя с учётом /new_day.
+
+    Возвращается в серверном времени без tzinfo — так же, как хранится created_at.
+    """
+    local_midnight = datetime.now(user_zone(tz_name)).replace(hour=0, minute=0, second=0, microsecond=0)
+    midnight = local_midnight.astimezone().replace(tzinfo=None)
     if user_day_start and user_day_start > midnight:
         return user_day_start
     return midnight
 
 
+# Режим старта: verify — только проверить, что БД на head-ревизии Alembic
+# (миграции применяет docker-entrypoint.sh); create_all — создать таблицы
+# по моделям без Alembic (локальная разработка на пустой БД)
+DB_STARTUP_MODE = os.getenv('DB_STARTUP_MODE', 'verify')
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def get_alembic_head() -> str:
+    """Head-ревизия из alembic/versions (читается с диска, без обращения к БД)"""
+    from alembic.config import Config
+    from alembic.script import ScriptDirectory
+
+    config = Config(os.path.join(BASE_DIR, 'alembic.ini'))
+    config.set_main_option('script_location', os.path.join(BASE_DIR, 'alembic'))
+    return ScriptDirectory.from_config(config).get_current_head()
+
+
 async def init_db():
     """Инициализация базы данных"""
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-        # Добавляем новые колонки для существующих таблиц
-        for stmt in [
-            "ALTER TABLE users ADD COLUMN IF NOT EXISTS current_day_start TIMESTAMP",
-            "ALTER TABLE users ADD COLUMN IF NOT EXISTS last_active_at TIMESTAMP",
-            "ALTER TABLE ai_interactions ADD COLUMN IF NOT EXISTS prompt_tokens INTEGER",
-            "ALTER TABLE ai_interactions ADD COLUMN IF NOT EXISTS completion_tokens INTEGER",
-            "ALTER TABLE ai_interactions ADD COLUMN IF NOT EXISTS total_tokens INTEGER",
-        ]:
-            await conn.execute(text(stmt))
+    if DB_STARTUP_MODE == 'create_all':
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        return
+
+    expected = get_alembic_head()
+    async with engine.connect() as conn:
+        try:
+            result = await conn.execute(text("SELECT version_num FROM alembic_version"))
+            current = result.scalar_one_or_none()
+        except Exception as e:
+            raise RuntimeError(f"Не удалось прочитать версию схемы БД (alembic_version): {e}") from e
+
+    if current != expected:
+        raise RuntimeError(
+            f"Схема БД на ревизии {current}, код ожидает {expected}. "
+            "Примените миграции: alembic upgrade head"
+        )
 
 
 async def get_session() -> AsyncSession:
@@ -0,0 +1,110 @@
+"""
+Выгрузка истории пользователя (еда, вода, тренировки, вес) в сжатый CSV или NDJSON.
+
+Строки читаются серверным курсором (stream_scalars + yield_per) пачками по
+EXPORT_BATCH и сразу дописываются в gzip-файл, поэтому память не растёт
+с размером истории. Выгрузка идёт с реплики, если она настроена (read_session).
+"""
+import csv
+import gzip
+import json
+import os
+
+from sqlalchemy import select
+
+from database.database import CalorieEntry, WorkoutEntry, WeightLog
+from database.replica import read_session
+
+EXPORT_BATCH = int(os.getenv('EXPORT_BATCH', '500'))  # строк на одну выборку курсора
+EXPORT_FORMATS = ('csv', 'json')
+
+# Общий набор колонок для всех типов записей
+EXPORT_FIELDS = (
+    'type', 'date', 'time', 'name', 'meal_type', 'calories', 'protein', 'fats', 'carbs',
+    'water_ml', 'duration', 'calories_burned', 'intensity', 'distance', 'weight', 'notes',
+)
+
+
+def _calorie_row(entry: CalorieEntry) -> dict:
+    water = entry.meal_type == 'water'
+    return {
+        'type': 'water' if water else 'food',
+        'date': entry.local_date or entry.created_at.date(),
+        'time': entry.created_at.strftime('%H:%M'),
+        'name': entry.food_name,
+        'meal_type': None if water else entry.meal_type,
+        'calories': None if water else entry.calories,
+        'protein': None if water else entry.protein,
+        'fats': None if water else entry.fats,
+        'carbs': None if water else entry.carbs,
+        'water_ml': entry.water_ml if water else None,
+        'notes': entry.ai_notes,
+    }
+
+
+def _workout_row(entry: WorkoutEntry) -> dict:
+    created = entry.created_at
+    return {
+        'type': 'workout',
+        'date': entry.local_date or (created.date() if created else None),
+        'time': created.strftime('%H:%M') if created else None,
+        'name': entry.workout_type,
+        'duration': entry.duration,
+        'calories_burned': entry.calories_burned,
+        'intensity': entry.intensity,
+        'distance': entry.distance,
+        'notes': entry.notes,
+    }
+
+
+def _weight_row(entry: WeightLog) -> dict:
+    created = entry.created_at
+    return {
+        'type': 'weight',
+        'date': created.date() if created else None,
+        'time': created.strftime('%H:%M') if created else None,
+        'weight': entry.weight,
+    }
+
+
+_SOURCES = (
+    (CalorieEntry, _calorie_row),
+    (WorkoutEntry, _workout_row),
+    (WeightLog, _weight_row),
+)
+
+
+async def iter_history(user_id: int):
+    """Записи истории по одной, в порядке времени внутри каждого типа"""
+    async with read_session() as session:
+        for model, to_row in _SOURCES:
+            stmt = (
+                select(model)
+                .where(model.user_id == user_id)
+                .order_by(model.created_at, model.id)
+                .execution_options(yield_per=EXPORT_BATCH)
+            )
+            result = await session.stream_scalars(stmt)
+            async for entry in result:
+                row = dict.fromkeys(EXPORT_FIELDS)
+                row.update(to_row(entry))
+                yield row
+            # Прочитанные объекты больше не нужны — не держим их в сессии
+            session.expunge_all()
+
+
+async def write_export(user_id: int, path: str, fmt: str = 'csv') -> int:
+    """Записать историю в gzip-файл path (csv или json — NDJSON), вернуть число строк"""
+    count = 0
+    with gzip.open(path, 'wt', encoding='utf-8', newline='') as f:
+        if fmt == 'csv':
+            writer = csv.DictWriter(f, fieldnames=EXPORT_FIELDS)
+            writer.writeheader()
+            async for row in iter_history(user_id):
+                writer.writerow(row)
+                count += 1
+        else:
+            async for row in iter_history(user_id):
+                f.write(json.dumps(row, ensure_ascii=False, default=str) + '\n')
+                count += 1
+    return count
@@ -0,0 +1,205 @@
+"""
+Кэш анализа еды по тексту.
+
+Одни и те же описания («овсянка с бананом», «кофе с молоком», «два яйца») приходят
+от тысяч пользователей, и каждое стоило запроса к gpt-4o-mini. Результат
+analyze_food_from_text кэшируется по ключу «цель|нормализованный текст»:
+сначала LRU в памяти процесса (FOOD_CACHE_SIZE), затем таблица
+food_analysis_cache в Postgres (FOOD_CACHE_TTL_DAYS). Из профиля в промпт
+попадает только цель, поэтому она и входит в ключ.
+
+meal_type зависит от времени суток у конкретного пользователя, поэтому в кэш
+не попадает: ответ из кэша получает его заново — по явному слову в описании
+(«гречка на ужин»), иначе по часу в поясе пользователя (local_meal_type). Свежий
+ответ AI сохраняет meal_type, выбранный моделью по контексту.
+
+Источник результата (memory / db) пишется в ai_interactions.cache_source;
+ответ, полученный вместе с одинаковым одновременным запросом, помечен 'shared'
+(utils.openai_helper).
+
+Очистка просроченных строк (по cron):
+    python -m database.food_cache purge
+"""
+import argparse
+import asyncio
+import copy
+import logging
+import os
+import re
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, delete
+from sqlalchemy.dialects.postgresql import insert
+
+from database.database import async_session, engine, FoodAnalysisCache, local_meal_type
+from database.queries import LOW_CONFIDENCE, normalize_food_text
+from utils.cache import TTLCache
+from utils.openai_helper import analyze_food_from_text
+
+logger = logging.getLogger(__name__)
+
+FOOD_CACHE_SIZE = int(os.getenv('FOOD_CACHE_SIZE', '20000'))
+FOOD_CACHE_MEMORY_TTL = float(os.getenv('FOOD_CACHE_MEMORY_TTL', '3600'))  # секунды
+FOOD_CACHE_TTL_DAYS = int(os.getenv('FOOD_CACHE_TTL_DAYS', '30'))
+# Длинные описания почти не повторяются — их не кэшируем
+FOOD_CACHE_MAX_TEXT = 200
+# Поля ответа, которые зависят от запроса, а не от текста еды
+_PER_REQUEST_FIELDS = ('meal_type',)
+
+food_cache = TTLCache(maxsize=FOOD_CACHE_SIZE, ttl=FOOD_CACHE_MEMORY_TTL)
+_metrics = {'db_hits': 0, 'ai_calls': 0, 'stored': 0, 'errors': 0}
+
+_NUMBER_WORDS = {
+    'один': '1', 'одна': '1', 'одно': '1', 'одну': '1',
+    'два': '2', 'две': '2', 'пара': '2', 'пару': '2',
+    'три': '3', 'четыре': '4', 'пять': '5', 'шесть': '6',
+    'семь': '7', 'восемь': '8', 'девять': '9', 'десять': '10',
+    'пол': '0.5', 'половина': '0.5', 'половину': '0.5',
+}
+
+
+_MEAL_WORDS = (
+    (re.compile(r'\bзавтрак'), 'breakfast'),
+    (re.compile(r'\b(обед|ланч)'), 'lunch'),
+    (re.compile(r'\bужин'), 'dinner'),
+    (re.compile(r'\b(перекус|полдник)'), 'snack'),
+)
+
+
+def meal_type_for_text(text: str, tz_name: str = None) -> str:
+    """Приём пищи по явному слову в описании, иначе по часу пользователя"""
+    lowered = (text or '').lower()
+    for pattern, meal_type in _MEAL_WORDS:
+        if pattern.search(lowered):
+            return meal_type
+    return local_meal_type(tz_name)
+
+
+def food_cache_text(text: str) -> str:
+    """Нормализация для ключа: регистр, пробелы, «ё», числа словами и «200г» → «200 г»"""
+    text = normalize_food_text(text).replace('ё', 'е')
+    text = re.sub(r'(\d),(\d)', r'\1.\2', text)
+    text = re.sub(r'(\d)([^\W\d_])', r'\1 \2', text)
+    text = re.sub(r'[^\w\s.%]', ' ', text)
+    words = [_NUMBER_WORDS.get(word, word) for word in text.split()]
+    return ' '.join(words).strip(' .')
+
+
+def food_cache_key(text: str, user_context: dict = None):
+    """Ключ кэша или None, если такой текст не кэшируем"""
+    normalized = food_cache_text(text)
+    if not normalized or len(normalized) > FOOD_CACHE_MAX_TEXT:
+        return None
+    goal = (user_context or {}).get('goal') or '-'
+    return f"{goal}|{normalized}"
+
+
+async def _load_from_db(key: str):
+    async with async_session() as session:
+        return (await session.execute(
+            select(FoodAnalysisCache.result)
+            .where(FoodAnalysisCache.cache_key == key, FoodAnalysisCache.expires_at > datetime.now())
+        )).scalar_one_or_none()
+
+
+async def _store_in_db(key: str, result: dict):
+    now = datetime.now()
+    stmt = insert(FoodAnalysisCache).values(
+        cache_key=key, result=result, created_at=now,
+        expires_at=now + timedelta(days=FOOD_CACHE_TTL_DAYS),
+    )
+    async with async_session() as session:
+        await session.execute(stmt.on_conflict_do_update(
+            index_elements=[FoodAnalysisCache.cache_key],
+            set_={'result': stmt.excluded.result, 'created_at': stmt.excluded.created_at,
+                  'expires_at': stmt.excluded.expires_at},
+        ))
+        await session.commit()
+
+
+def _cacheable(result: dict) -> bool:
+    return bool(result.get('calories')) and (result.get('confidence') or 0) >= LOW_CONFIDENCE
+
+
+def _from_cache(result: dict, source: str, text: str, tz_name: str = None) -> dict:
+    """Копия для хэндлера (они дописывают поля) с meal_type этого запроса"""
+    return {**copy.deepcopy(result), '_cache': source, 'meal_type': meal_type_for_text(text, tz_name)}
+
+
+async def get_food_analysis(text: str, user_context: dict = None, tz_name: str = None) -> dict:
+    """Анализ еды из кэша или от AI; в '_cache' — источник (memory / db / None).
+
+    tz_name — часовой пояс пользователя: по нему выставляется meal_type ответа из кэша.
+    """
+    key = food_cache_key(text, user_context)
+    if key is None:
+        _metrics['ai_calls'] += 1
+        return await analyze_food_from_text(text, user_context)
+
+    cached = food_cache.get(key)
+    if cached is not None:
+        return _from_cache(cached, 'memory', text, tz_name)
+
+    try:
+        cached = await _load_from_db(key)
+    except Exception:
+        _metrics['errors'] += 1
+        logger.exception("Ошибка чтения кэша анализа еды")
+    if cached is not None:
+        _metrics['db_hits'] += 1
+        # Строки, записанные до выноса meal_type из кэша, ещё содержат его
+        cached = {k: v for k, v in cached.items() if k not in _PER_REQUEST_FIELDS}
+        food_cache.set(key, cached)
+        return _from_cache(cached, 'db', text, tz_name)
+
+    result = await analyze_food_from_text(text, user_context)
+    if result.get('_cache') == 'shared':
+        # Запрос сделал и сохранил в кэш другой вызов; meal_type модель выбрала по тексту
+        return result
+    _metrics['ai_calls'] += 1
+    if _cacheable(result):
+        stored = {k: v for k, v in result.items()
+                  if not k.startswith('_') and k not in _PER_REQUEST_FIELDS}
+        food_cache.set(key, stored)
+        try:
+            await _store_in_db(key, stored)
+            _metrics['stored'] += 1
+        except Exception:
+            _metrics['errors'] += 1
+            logger.exception("Ошибка записи кэша анализа еды")
+    return {'_cache': None, **result}
+
+
+def food_cache_stats() -> dict:
+    return {**food_cache.stats(), **_metrics}
+
+
+async def purge_expired() -> int:
+    """Удалить просроченные строки food_analysis_cache"""
+    async with async_session() as session:
+        result = await session.execute(
+            delete(FoodAnalysisCache).where(FoodAnalysisCache.expires_at <= datetime.now())
+        )
+        await session.commit()
+        return result.rowcount
+
+
+async def _run_purge() -> int:
+    try:
+        return await purge_expired()
+    finally:
+        await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Кэш анализа еды")
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('purge', help="удалить просроченные записи")
+    parser.parse_args()
+
+    deleted = asyncio.run(_run_purge())
+    print(f"Удалено просроченных записей: {deleted}")
+
+
+if __name__ == '__main__':
+    main()
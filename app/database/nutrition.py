@@ -0,0 +1,222 @@
+"""
+Справочник продуктов (food_nutrition) — быстрый путь перед AI.
+
+Простые описания («2 яйца, кофе с молоком», «200 г гречки») разбираются на части,
+каждая ищется по триграммам (pg_trgm, word_similarity) одним запросом к БД,
+и КБЖУ считается по граммам или стандартной порции. Если хоть одна часть
+совпала хуже NUTRITION_MIN_SCORE, lookup_food() возвращает None и описание
+уходит в AI как раньше. Результат — тот же dict, что у analyze_food_from_text.
+
+Загрузка и обновление справочника из CSV (database/food_nutrition.csv; миграция
+013 создаёт только пустую таблицу, make migrate загружает CSV после upgrade):
+    python -m database.nutrition load [--file PATH]
+"""
+import argparse
+import asyncio
+import csv
+import os
+import re
+
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert
+
+from database.database import async_session, engine, FoodNutrition
+from database.food_cache import food_cache_text, meal_type_for_text
+
+NUTRITION_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'food_nutrition.csv')
+# Не ниже pg_trgm.word_similarity_threshold (0.6): более слабые совпадения отсекает <%
+NUTRITION_MIN_SCORE = float(os.getenv('NUTRITION_MIN_SCORE', '0.6'))
+NUTRITION_MAX_PARTS = 6
+
+# Лучшее совпадение для каждой части; <% использует GIN-индекс по search_text
+MATCH_SQL = text("""
+SELECT q.ord, m.name, m.kcal, m.protein, m.fats, m.carbs, m.portion_g, m.portion_name, m.score
+FROM unnest(CAST(:parts AS text[])) WITH ORDINALITY AS q(part, ord)
+LEFT JOIN LATERAL (
+    SELECT f.*, word_similarity(q.part, f.search_text) AS score
+    FROM food_nutrition f
+    WHERE q.part <% f.search_text
+    ORDER BY score DESC, similarity(f.name, q.part) DESC
+    LIMIT 1
+) m ON true
+ORDER BY q.ord
+""")
+
+# Единицы объёма/тары в граммах; шт, порция и число без единицы — стандартные порции
+_UNIT_GRAMS = (
+    (r'(?:г|гр|грамм\w*)', 1),
+    (r'кг', 1000),
+    (r'мл', 1),
+    (r'(?:л|литр\w*)', 1000),
+    (r'(?:стакан\w*|кружк\w*|чашк\w*)', 250),
+    (r'(?:ложк\w*|ст л)', 15),
+    (r'тарелк\w*', 300),
+)
+_PORTION_UNITS = r'(?:шт\w*|порци\w*|кус\w*)'
+_AMOUNT_RE = re.compile(
+    r'(?:(\d+(?:\.\d+)?)\s*)?\b(' + '|'.join(u for u, _ in _UNIT_GRAMS) + '|' + _PORTION_UNITS + r')\b'
+    r'|(\d+(?:\.\d+)?)'
+)
+_SPLIT_RE = re.compile(r'[,;+\n]|\s+и\s+')
+_WITH_RE = re.compile(r'\s+со?\s+')
+_DECIMAL_COMMA_RE = re.compile(r'(\d),(\d)')
+# Жирность («творог 9%», «молоко 3.2%») — не количество; совпадение должно быть с той же жирностью
+_PERCENT_RE = re.compile(r'(\d+(?:\.\d+)?)\s*%')
+
+
+def _parse_amount(part: str):
+    """(название, граммы или None, число порций) из нормализованной части"""
+    match = _AMOUNT_RE.search(part)
+    if not match:
+        return part, None, 1.0
+    name = ' '.join((part[:match.start()] + ' ' + part[match.end():]).split())
+    if match.group(3):
+        return name, None, float(match.group(3))
+    count = float(match.group(1) or 1)
+    unit = match.group(2)
+    for pattern, grams in _UNIT_GRAMS:
+        if re.fullmatch(pattern, unit):
+            return name, count * grams, 1.0
+    return name, None, count
+
+
+def _split_parts(description: str) -> list:
+    """Части описания: [(название, граммы, порций, [подчасти по «с»], [жирность])]"""
+    parts = []
+    # «1,5 л» — десятичная запятая, а не разделитель блюд
+    for raw in _SPLIT_RE.split(_DECIMAL_COMMA_RE.sub(r'\1.\2', description)):
+        normalized = food_cache_text(raw)
+        if not normalized:
+            continue
+        percents = [f"{float(p):g}%" for p in _PERCENT_RE.findall(normalized)]
+        name, grams, count = _parse_amount(' '.join(_PERCENT_RE.sub(' ', normalized).split()))
+        if not name:
+            return []
+        pieces = [p for p in _WITH_RE.split(name) if p]
+        parts.append((name, grams, count, pieces if len(pieces) > 1 else [], percents))
+    return parts
+
+
+def _pick_items(parts: list, matches: list):
+    """[(строка справочника, граммы, порций)] или None, если хоть одна часть не совпала"""
+    items = []
+    index = 0
+    for name, grams, count, pieces, percents in parts:
+        whole = matches[index]
+        split = matches[index + 1:index + 1 + len(pieces)]
+        index += 1 + len(pieces)
+        if whole is not None and whole.score >= NUTRITION_MIN_SCORE:
+            part_items = [(whole, grams, count)]
+        elif pieces and all(m is not None and m.score >= NUTRITION_MIN_SCORE for m in split):
+            # Количество относится к основному блюду, добавки — стандартной порцией
+            part_items = [(split[0], grams, count)] + [(m, None, 1.0) for m in split[1:]]
+        else:
+            return None
+        # pg_trgm не различает «творог 9%» и «творог 5%» — жирность сверяем сами
+        names = [match.name for match, _, _ in part_items]
+        if any(not any(percent in n for n in names) for percent in percents):
+            return None
+        items.extend(part_items)
+    return items
+
+
+async def lookup_food(description: str, tz_name: str = None):
+    """Анализ еды по справочнику или None, если совпадение неуверенное"""
+    parts = _split_parts(description)
+    if not parts or len(parts) > NUTRITION_MAX_PARTS:
+        return None
+
+    # Ищем и целиком («кофе с молоком»), и по кускам («овсянка», «бананом»)
+    queries = []
+    for name, _, _, pieces, _ in parts:
+        queries.append(name)
+        queries.extend(pieces)
+    async with async_session() as session:
+        rows = (await session.execute(MATCH_SQL, {'parts': queries})).all()
+    items = _pick_items(parts, [row if row.name is not None else None for row in rows])
+    if items is None:
+        return None
+
+    result = {'calories': 0, 'protein': 0.0, 'fats': 0.0, 'carbs': 0.0}
+    names, lines = [], []
+    for match, grams, count in items:
+        weight = grams if grams is not None else match.portion_g * count
+        factor = weight / 100
+        calories = round(match.kcal * factor)
+        result['calories'] += calories
+        result['protein'] += match.protein * factor
+        result['fats'] += match.fats * factor
+        result['carbs'] += match.carbs * factor
+        names.append(match.name)
+        if grams is None and match.portion_name:
+            amount = f"{count:g} × {match.portion_name} ({weight:g} г)"
+        else:
+            amount = f"{weight:g} г"
+        lines.append(f"{match.name}, {amount} — {calories} ккал")
+
+    return {
+        'food_name': ', '.join(names),
+        **{k: round(v, 1) if isinstance(v, float) else v for k, v in result.items()},
+        'meal_type': meal_type_for_text(description, tz_name),
+        'confidence': round(min(match.score for match, _, _ in items), 2),
+        'items': lines,
+        'notes': "Посчитано по справочнику продуктов, без AI",
+        '_cache': 'local',
+    }
+
+
+# --- Загрузка справочника ---
+
+def read_nutrition_csv(path: str = NUTRITION_CSV) -> list:
+    """Строки food_nutrition из CSV (разделитель ;, aliases через |)"""
+    rows = []
+    with open(path, encoding='utf-8') as f:
+        for row in csv.DictReader(f, delimiter=';'):
+            names = [row['name']] + [a for a in (row['aliases'] or '').split('|') if a]
+            rows.append({
+                'name': row['name'],
+                'aliases': row['aliases'] or None,
+                'search_text': ' | '.join(n.lower().replace('ё', 'е') for n in names),
+                'kcal': float(row['kcal']),
+                'protein': float(row['protein']),
+                'fats': float(row['fats']),
+                'carbs': float(row['carbs']),
+                'portion_g': int(row['portion_g']),
+                'portion_name': row['portion_name'] or None,
+            })
+    return rows
+
+
+async def load_nutrition(path: str = NUTRITION_CSV) -> int:
+    """Добавить/обновить записи справочника по name"""
+    rows = read_nutrition_csv(path)
+    stmt = insert(FoodNutrition).values(rows)
+    async with async_session() as session:
+        await session.execute(stmt.on_conflict_do_update(
+            index_elements=[FoodNutrition.name],
+            set_={col: stmt.excluded[col] for col in rows[0] if col != 'name'},
+        ))
+        await session.commit()
+    return len(rows)
+
+
+async def _run_load(path: str) -> int:
+    try:
+        return await load_nutrition(path)
+    finally:
+        await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Справочник продуктов")
+    sub = parser.add_subparsers(dest='command', required=True)
+    load = sub.add_parser('load', help="загрузить/обновить справочник из CSV")
+    load.add_argument('--file', default=NUTRITION_CSV)
+    args = parser.parse_args()
+
+    count = asyncio.run(_run_load(args.file))
+    print(f"Записей в справочнике обновлено: {count}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+"""
+Обслуживание помесячных секций calorie_entries и ai_interactions.
+
+Запускать по cron (например, раз в сутки):
+    python -m database.partitions maintain [--ahead 3] [--detach-older-than 12 [--drop]]
+    python -m database.partitions list
+
+maintain заранее создаёт секции на ближайшие месяцы, а с --detach-older-than
+отсоединяет секции старше указанного числа месяцев (по умолчанию ничего не отсоединяется:
+история калорий нужна пользователям).
+
+Если за месяц без секции строки уже попали в DEFAULT (cron не запускался), секцию
+нельзя просто создать — PostgreSQL откажет проверкой диапазона. Тогда DEFAULT
+отсоединяется, строки месяца переносятся в новую секцию и DEFAULT подключается
+обратно (в одной транзакции, под ACCESS EXCLUSIVE на таблицу). Если и это не
+удалось, месяц пропускается с ошибкой в логе, остальные секции создаются.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import re
+from datetime import date
+
+from sqlalchemy import text
+
+from database.database import engine
+
+logger = logging.getLogger(__name__)
+
+PARTITIONED_TABLES = ('calorie_entries', 'ai_interactions')
+PARTITION_MONTHS_AHEAD = int(os.getenv('PARTITION_MONTHS_AHEAD', '3'))
+
+_PARTITION_RE = re.compile(r'_y(\d{4})m(\d{2})$')
+
+
+def add_months(day: date, months: int) -> date:
+    """Первое число месяца, отстоящего от day на months"""
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_y{month.year}m{month.month:02d}"
+
+
+async def list_partitions(conn, table: str) -> list:
+    """Помесячные секции таблицы: [(имя, первое число месяца), ...] по возрастанию"""
+    result = await conn.execute(text("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        WHERE p.relname = :table
+    """), {'table': table})
+    partitions = []
+    for (name,) in result.all():
+        m = _PARTITION_RE.search(name)
+        if m:
+            partitions.append((name, date(int(m.group(1)), int(m.group(2)), 1)))
+    return sorted(partitions, key=lambda p: p[1])
+
+
+async def _rows_in_default(conn, table: str, month: date) -> int:
+    """Сколько строк месяца month лежит в DEFAULT-секции (0, если её нет)"""
+    default = f"{table}_default"
+    if (await conn.execute(text("SELECT to_regclass(:name)"), {'name': default})).scalar() is None:
+        return 0
+    return (await conn.execute(
+        text(f"SELECT count(*) FROM {default} WHERE created_at >= :start AND created_at < :end"),
+        {'start': month, 'end': add_months(month, 1)},
+    )).scalar()
+
+
+async def _create_partition(conn, table: str, month: date):
+    name = partition_name(table, month)
+    bounds = f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+    moved = await _rows_in_default(conn, table, month)
+    if not moved:
+        await conn.execute(text(f"CREATE TABLE {name} PARTITION OF {table} {bounds}"))
+        return
+
+    default = f"{table}_default"
+    logger.warning(f"{table}: {moved} строк за {month:%Y-%m} в {default}, переносим в {name}")
+    await conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {default}"))
+    await conn.execute(text(f"CREATE TABLE {name} PARTITION OF {table} {bounds}"))
+    rows = {'start': month, 'end': add_months(month, 1)}
+    await conn.execute(text(
+        f"INSERT INTO {table} SELECT * FROM {default} WHERE created_at >= :start AND created_at < :end"
+    ), rows)
+    await conn.execute(text(
+        f"DELETE FROM {default} WHERE created_at >= :start AND created_at < :end"
+    ), rows)
+    await conn.execute(text(f"ALTER TABLE {table} ATTACH PARTITION {default} DEFAULT"))
+
+
+async def create_future_partitions(conn, table: str, months_ahead: int) -> list:
+    """Создать недостающие секции с текущего месяца на months_ahead вперёд"""
+    existing = {name for name, _ in await list_partitions(conn, table)}
+    current = date.today().replace(day=1)
+    created = []
+    for i in range(months_ahead + 1):
+        month = add_months(current, i)
+        name = partition_name(table, month)
+        if name in existing:
+            continue
+        # Каждый месяц — в SAVEPOINT: сбой одного не отменяет остальные
+        try:
+            async with conn.begin_nested():
+                await _create_partition(conn, table, month)
+        except Exception:
+            logger.exception(f"Не удалось создать секцию {name}, месяц пропущен")
+            continue
+        created.append(name)
+    return created
+
+
+async def detach_old_partitions(conn, table: str, keep_months: int, drop: bool = False) -> list:
+    """Отсоединить (и при drop=True удалить) секции целиком старше keep_months месяцев"""
+    cutoff = add_months(date.today().replace(day=1), -keep_months)
+    detached = []
+    for name, month in await list_partitions(conn, table):
+        if add_months(month, 1) > cutoff:
+            break
+        await conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+        if drop:
+            await conn.execute(text(f"DROP TABLE {name}"))
+        detached.append(name)
+    return detached
+
+
+async def maintain_partitions(months_ahead: int = PARTITION_MONTHS_AHEAD,
+                              detach_older_than: int = None, drop: bool = False,
+                              tables: tuple = PARTITIONED_TABLES) -> dict:
+    """Создать будущие секции и (опционально) отсоединить старые"""
+    report = {}
+    for table in tables:
+        # Каждая таблица — отдельная транзакция, чтобы не держать блокировки на обеих
+        async with engine.begin() as conn:
+            created = await create_future_partitions(conn, table, months_ahead)
+            detached = []
+            if detach_older_than is not None:
+                detached = await detach_old_partitions(conn, table, detach_older_than, drop)
+        report[table] = {'created': created, 'detached': detached}
+    return report
+
+
+async def _run(args) -> None:
+    try:
+        tables = (args.table,) if args.table else PARTITIONED_TABLES
+        if args.command == 'list':
+            async with engine.connect() as conn:
+                for table in tables:
+                    names = [name for name, _ in await list_partitions(conn, table)]
+                    print(f"{table}: {', '.join(names) or 'нет секций'}")
+            return
+
+        report = await maintain_partitions(args.ahead, args.detach_older_than, args.drop, tables)
+        for table, result in report.items():
+            print(f"{table}: создано {result['created'] or '—'}, отсоединено {result['detached'] or '—'}")
+    finally:
+        await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Помесячные секции calorie_entries и ai_interactions")
+    parser.add_argument('command', choices=['maintain', 'list'])
+    parser.add_argument('--table', choices=PARTITIONED_TABLES, help="Только одна таблица")
+    parser.add_argument('--ahead', type=int, default=PARTITION_MONTHS_AHEAD,
+                        help="Сколько будущих месяцев держать созданными")
+    parser.add_argument('--detach-older-than', type=int, metavar='MONTHS',
+                        help="Отсоединить секции старше MONTHS месяцев")
+    parser.add_argument('--drop', action='store_true', help="Удалить отсоединённые секции")
+    asyncio.run(_run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Пул соединений с метриками.
+
+InstrumentedPool замеряет, сколько хэндлер ждёт соединение, и считает таймауты;
+события checkout/checkin пула дают число выдач и время удержания соединения.
+Снимок — pool_stats(engine), показывается в /metrics.
+"""
+import time
+
+from sqlalchemy import event, exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+
+class PoolMetrics:
+    """Накопительные счётчики пула (переживают engine.dispose())"""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.waits = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.hold_total = 0.0
+        self.hold_max = 0.0
+        self.holds = 0
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool с замером ожидания соединения"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            self.metrics.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            self.metrics.waits += 1
+            self.metrics.wait_total += waited
+            self.metrics.wait_max = max(self.metrics.wait_max, waited)
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+
+def instrument_engine(engine):
+    """Подписаться на checkout/checkin пула движка"""
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, 'checkout')
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        connection_record.info['checked_out_at'] = time.perf_counter()
+        sync_engine.pool.metrics.checkouts += 1
+
+    @event.listens_for(sync_engine, 'checkin')
+    def _on_checkin(dbapi_connection, connection_record):
+        started = connection_record.info.pop('checked_out_at', None)
+        if started is None:
+            return
+        held = time.perf_counter() - started
+        metrics = sync_engine.pool.metrics
+        metrics.holds += 1
+        metrics.hold_total += held
+        metrics.hold_max = max(metrics.hold_max, held)
+
+
+def pool_stats(engine) -> dict:
+    pool = engine.sync_engine.pool
+    metrics = pool.metrics
+    return {
+        'size': pool.size(),
+        'checked_out': pool.checkedout(),
+        'overflow': max(pool.overflow(), 0),
+        'checked_in': pool.checkedin(),
+        'checkouts': metrics.checkouts,
+        'timeouts': metrics.timeouts,
+        'avg_wait_ms': metrics.wait_total / metrics.waits * 1000 if metrics.waits else 0.0,
+        'max_wait_ms': metrics.wait_max * 1000,
+        'avg_hold_ms': metrics.hold_total / metrics.holds * 1000 if metrics.holds else 0.0,
+        'max_hold_ms': metrics.hold_max * 1000,
+    }
@@ -0,0 +1,200 @@
+"""
+Общие запросы к БД.
+
+Горячие выборки (профиль, итоги за день и за период) собраны через lambda_stmt:
+SQLAlchemy строит и компилирует такой запрос один раз, а при следующих вызовах
+только подставляет параметры. Одинаковый SQL-текст к тому же попадает
+в кэш подготовленных выражений asyncpg (DB_PREPARED_STATEMENT_CACHE_SIZE).
+
+Экран статистики собирается одним запросом STATS_SQL: дневные итоги за 30 дней
+сворачиваются условными агрегатами (FILTER), сырые записи после /new_day и два
+последних веса — в соседних CTE, всё приходит одной строкой за один round trip.
+
+Выборки по JSONB рассчитаны на индексы миграции 008_jsonb: выражения в WHERE
+должны совпадать с выражениями индексов буквально, поэтому ключи JSON и порог
+уверенности подставляются литералами, а не параметрами.
+"""
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import select, func, lambda_stmt, literal_column, text
+
+from database.database import User, CalorieEntry, WorkoutEntry, DailyUserTotal, AIInteraction
+
+# Порог совпадает с условием частичного индекса idx_ai_interactions_low_confidence
+LOW_CONFIDENCE = 0.5
+
+_normalized_text = literal_column("calorie_entries.source_data ->> 'normalized_text'")
+
+
+# --- Горячие запросы ---
+
+async def get_user_by_telegram_id(session, telegram_id: int):
+    """Профиль пользователя, привязанный к session (None — не зарегистрирован)"""
+    stmt = lambda_stmt(lambda: select(User).where(User.telegram_id == telegram_id))
+    return (await session.execute(stmt)).scalar_one_or_none()
+
+
+async def get_day_rollup(session, user_id: int, day: date):
+    """(calories, water_ml, meal_count) из daily_user_totals или None"""
+    stmt = lambda_stmt(
+        lambda: select(DailyUserTotal.calories, DailyUserTotal.water_ml, DailyUserTotal.meal_count)
+        .where(DailyUserTotal.user_id == user_id, DailyUserTotal.day == day)
+    )
+    return (await session.execute(stmt)).one_or_none()
+
+
+async def get_raw_day_totals(session, user_id: int, day: date, since: datetime):
+    """(calories, water_ml, meal_count) по сырым записям дня day начиная с since"""
+    stmt = lambda_stmt(
+        lambda: select(
+            func.coalesce(func.sum(CalorieEntry.calories), 0),
+            func.coalesce(func.sum(CalorieEntry.water_ml).filter(CalorieEntry.meal_type == 'water'), 0),
+            func.count(CalorieEntry.id).filter(CalorieEntry.meal_type != 'water'),
+        )
+        .where(
+            CalorieEntry.user_id == user_id,
+            CalorieEntry.local_date == day,
+            CalorieEntry.created_at >= since,
+        )
+    )
+    return (await session.execute(stmt)).one()
+
+
+async def get_period_rollup(session, user_id: int, since: date):
+    """(meal_count, avg_calories, workout_count, workout_minutes, burned_calories) с since"""
+    stmt = lambda_stmt(
+        lambda: select(
+            func.coalesce(func.sum(DailyUserTotal.meal_count), 0),
+            func.avg(DailyUserTotal.calories).filter(DailyUserTotal.meal_count > 0),
+            func.coalesce(func.sum(DailyUserTotal.workout_count), 0),
+            func.coalesce(func.sum(DailyUserTotal.workout_minutes), 0),
+            func.coalesce(func.sum(DailyUserTotal.burned_calories), 0),
+        )
+        .where(DailyUserTotal.user_id == user_id, DailyUserTotal.day >= since)
+    )
+    return (await session.execute(stmt)).one()
+
+
+STATS_SQL = text("""
+WITH days AS (
+    SELECT day, calories, water_ml, meal_count,
+           workout_count, workout_minutes, burned_calories
+    FROM daily_user_totals
+    WHERE user_id = :user_id AND day BETWEEN :month_start AND :today
+),
+raw_today AS (
+    SELECT COALESCE(SUM(calories), 0) AS calories,
+           COALESCE(SUM(water_ml) FILTER (WHERE meal_type = 'water'), 0) AS water_ml
+    FROM calorie_entries
+    WHERE CAST(:since AS timestamp) IS NOT NULL
+      AND user_id = :user_id AND local_date = :today AND created_at >= :since
+),
+weights AS (
+    SELECT array_agg(weight ORDER BY created_at DESC) AS last_weights
+    FROM (
+        SELECT weight, created_at FROM weight_logs
+        WHERE user_id = :user_id
+        ORDER BY created_at DESC
+        LIMIT 2
+    ) w
+)
+SELECT
+    COALESCE(SUM(d.calories) FILTER (WHERE d.day = :today), 0) AS today_calories,
+    COALESCE(SUM(d.water_ml) FILTER (WHERE d.day = :today), 0) AS today_water_ml,
+    (SELECT calories FROM raw_today) AS raw_calories,
+    (SELECT water_ml FROM raw_today) AS raw_water_ml,
+    COALESCE(SUM(d.meal_count) FILTER (WHERE d.day >= :week_start), 0) AS week_meals,
+    AVG(d.calories) FILTER (WHERE d.day >= :week_start AND d.meal_count > 0) AS week_avg_calories,
+    COALESCE(SUM(d.workout_count) FILTER (WHERE d.day >= :week_start), 0) AS week_workouts,
+    COALESCE(SUM(d.workout_minutes) FILTER (WHERE d.day >= :week_start), 0) AS week_workout_minutes,
+    COALESCE(SUM(d.burned_calories) FILTER (WHERE d.day >= :week_start), 0) AS week_burned_calories,
+    COALESCE(SUM(d.workout_count), 0) AS month_workouts,
+    COALESCE(SUM(d.workout_minutes), 0) AS month_workout_minutes,
+    (SELECT last_weights FROM weights) AS last_weights
+FROM days d
+""")
+
+
+async def get_stats_row(session, user_id: int, today: date, since: datetime = None):
+    """Строка экрана статистики (STATS_SQL); since — начало дня после /new_day"""
+    return (await session.execute(STATS_SQL, {
+        'user_id': user_id,
+        'today': today,
+        'week_start': today - timedelta(days=6),
+        'month_start': today - timedelta(days=29),
+        'since': since,
+    })).one()
+
+
+# --- Поиск по JSONB ---
+
+def normalize_food_text(text: str) -> str:
+    """Ключ для поиска одинаковых описаний: нижний регистр, одиночные пробелы"""
+    return ' '.join((text or '').lower().split())
+
+
+async def find_entries_by_text(session, text: str, user_id: int = None,
+                               limit: int = 20) -> list:
+    """Прошлые записи еды с тем же нормализованным описанием (новые первыми)"""
+    stmt = (
+        select(CalorieEntry)
+        .where(_normalized_text == normalize_food_text(text))
+        .order_by(CalorieEntry.created_at.desc())
+        .limit(limit)
+    )
+    if user_id is not None:
+        stmt = stmt.where(CalorieEntry.user_id == user_id)
+    return list((await session.execute(stmt)).scalars())
+
+
+async def get_recent_entries(session, user_id: int, limit: int = 10) -> tuple:
+    """Последние блюда и тренировки строками для контекста AI (новые первыми)"""
+    meals = (await session.execute(
+        select(CalorieEntry.food_name, CalorieEntry.calories)
+        .where(CalorieEntry.user_id == user_id, CalorieEntry.meal_type != 'water')
+        .order_by(CalorieEntry.created_at.desc())
+        .limit(limit)
+    )).all()
+    workouts = (await session.execute(
+        select(WorkoutEntry.workout_type, WorkoutEntry.duration)
+        .where(WorkoutEntry.user_id == user_id)
+        .order_by(WorkoutEntry.created_at.desc())
+        .limit(limit)
+    )).all()
+    return (
+        [f"{name} — {calories} ккал" for name, calories in meals],
+        [f"{workout_type} — {duration} мин" for workout_type, duration in workouts],
+    )
+
+
+async def find_interactions_by_response(session, fragment: dict, since: datetime = None,
+                                        limit: int = 50) -> list:
+    """Взаимодействия, ответ AI которых содержит fragment (ai_response @> fragment)"""
+    stmt = (
+        select(AIInteraction)
+        .where(AIInteraction.ai_response.contains(fragment))
+        .order_by(AIInteraction.created_at.desc())
+        .limit(limit)
+    )
+    if since is not None:
+        stmt = stmt.where(AIInteraction.created_at >= since)
+    return list((await session.execute(stmt)).scalars())
+
+
+async def get_low_confidence_analyses(session, since: datetime = None,
+                                      interaction_type: str = None, limit: int = 100) -> list:
+    """Анализы с уверенностью ниже LOW_CONFIDENCE (по умолчанию — за последние 7 дней)"""
+    if since is None:
+        since = datetime.combine(date.today() - timedelta(days=6), datetime.min.time())
+    stmt = (
+        select(AIInteraction)
+        .where(
+            AIInteraction.ai_confidence < literal_column(str(LOW_CONFIDENCE)),
+            AIInteraction.created_at >= since,
+        )
+        .order_by(AIInteraction.created_at.desc())
+        .limit(limit)
+    )
+    if interaction_type is not None:
+        stmt = stmt.where(AIInteraction.interaction_type == interaction_type)
+    return list((await session.execute(stmt)).scalars())
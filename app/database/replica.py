@@ -0,0 +1,112 @@
+"""
+Чтение отчётов с реплики.
+
+Если задан DB_REPLICA_HOST, тяжёлые выборки (статистика, /balance, /users)
+открывают сессию через read_session() и идут на реплику. Основная БД остаётся
+для записи. Если реплика недоступна или отстаёт больше чем на DB_REPLICA_MAX_LAG
+секунд, read_session() отдаёт сессию основной БД.
+"""
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+
+from database.database import (
+    async_session, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE,
+    DB_POOL_PRE_PING, DB_PREPARED_STATEMENT_CACHE_SIZE,
+)
+from database.pool import InstrumentedPool, instrument_engine
+
+logger = logging.getLogger(__name__)
+
+DB_REPLICA_HOST = os.getenv('DB_REPLICA_HOST')
+DB_REPLICA_MAX_LAG = float(os.getenv('DB_REPLICA_MAX_LAG', '10'))  # секунды
+DB_REPLICA_CHECK_INTERVAL = float(os.getenv('DB_REPLICA_CHECK_INTERVAL', '15'))  # секунды
+
+# Отставание реплики; если всё полученное уже применено — реплика догнала основную БД
+LAG_SQL = """
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() THEN 0
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+END
+"""
+
+replica_engine = None
+replica_session = None
+if DB_REPLICA_HOST:
+    REPLICA_URL = (
+        f"postgresql+asyncpg://{os.getenv('DB_REPLICA_USER', os.getenv('DB_USER'))}:"
+        f"{os.getenv('DB_REPLICA_PASSWORD', os.getenv('DB_PASSWORD'))}@{DB_REPLICA_HOST}:"
+        f"{os.getenv('DB_REPLICA_PORT', os.getenv('DB_PORT'))}/{os.getenv('DB_NAME')}"
+    )
+    replica_engine = create_async_engine(
+        REPLICA_URL,
+        echo=False,
+        poolclass=InstrumentedPool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+        connect_args={'prepared_statement_cache_size': DB_PREPARED_STATEMENT_CACHE_SIZE},
+    )
+    instrument_engine(replica_engine)
+    replica_session = async_sessionmaker(replica_engine, class_=AsyncSession, expire_on_commit=False)
+
+_state = {'checked_at': None, 'lag': None, 'healthy': False}
+_metrics = {'replica_reads': 0, 'primary_reads': 0, 'fallbacks': 0}
+
+
+async def _check_replica() -> bool:
+    """Доступна ли реплика (результат кэшируется на DB_REPLICA_CHECK_INTERVAL)"""
+    now = time.monotonic()
+    if _state['checked_at'] is not None and now - _state['checked_at'] < DB_REPLICA_CHECK_INTERVAL:
+        return _state['healthy']
+    _state['checked_at'] = now
+    try:
+        async with replica_engine.connect() as conn:
+            _state['lag'] = float((await conn.execute(text(LAG_SQL))).scalar())
+        _state['healthy'] = True
+    except Exception:
+        logger.warning("Реплика недоступна, чтение идёт с основной БД", exc_info=True)
+        _state['lag'] = None
+        _state['healthy'] = False
+    return _state['healthy']
+
+
+@asynccontextmanager
+async def read_session(max_lag: float = DB_REPLICA_MAX_LAG):
+    """Сессия для отчётов: реплика, если она доступна и отстаёт не больше max_lag секунд"""
+    if replica_session is not None:
+        if await _check_replica() and _state['lag'] <= max_lag:
+            session = replica_session()
+            try:
+                # Соединение берём сразу, чтобы при отказе реплики успеть переключиться
+                await session.connection()
+            except Exception:
+                await session.close()
+                _state['healthy'] = False
+                logger.warning("Не удалось подключиться к реплике", exc_info=True)
+            else:
+                _metrics['replica_reads'] += 1
+                async with session:
+                    yield session
+                return
+        _metrics['fallbacks'] += 1
+
+    _metrics['primary_reads'] += 1
+    async with async_session() as session:
+        yield session
+
+
+def replica_stats() -> dict:
+    return {
+        'configured': replica_engine is not None,
+        'healthy': _state['healthy'],
+        'lag': _state['lag'],
+        **_metrics,
+    }
@@ -0,0 +1,137 @@
+"""
+Сводки для админских отчётов /balance и /users.
+
+ai_usage_daily пополняется журналом AI в той же транзакции, что и сами записи
+ai_interactions (add_usage), поэтому /balance читает десятки строк вместо
+GROUP BY по всему журналу. user_daily_stats — материализованное представление
+по users, обновляется фоновой задачей раз в REPORTS_REFRESH_INTERVAL секунд.
+"""
+import asyncio
+import logging
+import os
+from datetime import date, timedelta
+
+from sqlalchemy import select, func, text
+from sqlalchemy.dialects.postgresql import insert
+
+from database.database import engine, AIUsageDaily
+
+logger = logging.getLogger(__name__)
+
+REPORTS_REFRESH_INTERVAL = float(os.getenv('REPORTS_REFRESH_INTERVAL', '600'))  # секунды
+
+_USAGE_COLUMNS = ('requests', 'prompt_tokens', 'completion_tokens', 'total_tokens')
+
+_task: asyncio.Task = None
+
+
+def _usage_rows(records: list) -> list:
+    """Свернуть записи ai_interactions в строки ai_usage_daily"""
+    totals = {}
+    for record in records:
+        if record.get('cache_source'):
+            # Ответ из кэша анализа еды — запроса к AI не было
+            continue
+        key = (record['created_at'].date(), record.get('ai_model') or '?', record['interaction_type'])
+        row = totals.setdefault(key, dict.fromkeys(_USAGE_COLUMNS, 0))
+        row['requests'] += 1
+        for column in _USAGE_COLUMNS[1:]:
+            row[column] += record.get(column) or 0
+    return [
+        {'day': day, 'ai_model': model, 'interaction_type': kind, **row}
+        for (day, model, kind), row in totals.items()
+    ]
+
+
+async def add_usage(session, records: list):
+    """Прибавить пачку записей журнала AI к ai_usage_daily (без commit)"""
+    rows = _usage_rows(records)
+    if not rows:
+        return
+    stmt = insert(AIUsageDaily).values(rows)
+    await session.execute(stmt.on_conflict_do_update(
+        index_elements=[AIUsageDaily.day, AIUsageDaily.ai_model, AIUsageDaily.interaction_type],
+        set_={column: getattr(AIUsageDaily, column) + stmt.excluded[column] for column in _USAGE_COLUMNS},
+    ))
+
+
+async def get_usage_report(session, days: int = 7) -> dict:
+    """Расход AI: итоги по моделям, по типам за days дней и по дням"""
+    today = date.today()
+    since = today - timedelta(days=days - 1)
+    sums = [func.sum(getattr(AIUsageDaily, column)) for column in _USAGE_COLUMNS]
+
+    by_model = (await session.execute(
+        select(AIUsageDaily.ai_model, *sums).group_by(AIUsageDaily.ai_model)
+    )).all()
+    by_type = (await session.execute(
+        select(AIUsageDaily.interaction_type, *sums)
+        .where(AIUsageDaily.day >= since)
+        .group_by(AIUsageDaily.interaction_type)
+    )).all()
+    by_day = (await session.execute(
+        select(AIUsageDaily.day, *sums)
+        .where(AIUsageDaily.day >= since)
+        .group_by(AIUsageDaily.day)
+        .order_by(AIUsageDaily.day)
+    )).all()
+
+    return {
+        'by_model': by_model,
+        'by_type': by_type,
+        'by_day': by_day,
+        'today': sum(row[1] for row in by_day if row[0] == today),
+        'period': sum(row[1] for row in by_day),
+        'all': sum(row[1] or 0 for row in by_model),
+    }
+
+
+async def get_user_report(session, days: int = 7) -> dict:
+    """Пользователи: итоги и регистрации/активность по дням за days дней"""
+    since = date.today() - timedelta(days=days - 1)
+    total, with_profile = (await session.execute(text(
+        "SELECT COALESCE(SUM(new_users), 0), COALESCE(SUM(with_profile), 0) FROM user_daily_stats"
+    ))).one()
+    by_day = (await session.execute(text(
+        "SELECT day, new_users, last_active FROM user_daily_stats WHERE day >= :since ORDER BY day"
+    ), {'since': since})).all()
+    return {
+        'total': int(total),
+        'with_profile': int(with_profile),
+        'new': sum(row.new_users for row in by_day),
+        'active': sum(row.last_active for row in by_day),
+        'by_day': by_day,
+    }
+
+
+async def refresh_user_stats():
+    """Пересчитать user_daily_stats, не блокируя чтение"""
+    async with engine.begin() as conn:
+        await conn.execute(text("REFRESH MATERIALIZED VIEW CONCURRENTLY user_daily_stats"))
+
+
+async def _refresh_loop():
+    while True:
+        try:
+            await refresh_user_stats()
+        except Exception:
+            logger.exception("Ошибка обновления user_daily_stats")
+        await asyncio.sleep(REPORTS_REFRESH_INTERVAL)
+
+
+def start_reports_refresher():
+    """Запустить периодическое обновление сводок"""
+    global _task
+    if _task is None:
+        _task = asyncio.create_task(_refresh_loop())
+
+
+async def stop_reports_refresher():
+    global _task
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
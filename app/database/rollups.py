@@ -0,0 +1,187 @@
+"""
+Дневные итоги пользователя (daily_user_totals) — свёртка записей еды, воды
+и тренировок по дням. Обновляется в той же транзакции, что и сама запись,
+поэтому статистика читает O(дней) строк вместо SUM/COUNT по сырым записям.
+
+Пересборка из сырых записей (для истории до появления таблицы или после ручных правок):
+    python -m database.rollups rebuild [--user-id TELEGRAM_ID]
+"""
+import argparse
+import asyncio
+from datetime import date, timedelta
+
+from sqlalchemy import func, delete, text
+from sqlalchemy.dialects.postgresql import insert
+
+from database.database import (
+    engine, async_session, CalorieEntry, DailyUserTotal, local_today, calc_today_start,
+)
+from database.queries import get_day_rollup, get_raw_day_totals, get_period_rollup, get_stats_row
+
+ROLLUP_COLUMNS = (
+    'calories', 'protein', 'fats', 'carbs', 'water_ml',
+    'meal_count', 'workout_count', 'workout_minutes', 'burned_calories',
+)
+
+REBUILD_SQL = """
+INSERT INTO daily_user_totals (
+    user_id, day, calories, protein, fats, carbs, water_ml,
+    meal_count, workout_count, workout_minutes, burned_calories
+)
+SELECT user_id, day,
+       SUM(calories), SUM(protein), SUM(fats), SUM(carbs), SUM(water_ml),
+       SUM(meal_count), SUM(workout_count), SUM(workout_minutes), SUM(burned_calories)
+FROM (
+    SELECT user_id, COALESCE(local_date, created_at::date) AS day,
+           calories,
+           COALESCE(protein, 0) AS protein,
+           COALESCE(fats, 0) AS fats,
+           COALESCE(carbs, 0) AS carbs,
+           CASE WHEN meal_type = 'water' THEN COALESCE(water_ml, 0) ELSE 0 END AS water_ml,
+           CASE WHEN meal_type = 'water' THEN 0 ELSE 1 END AS meal_count,
+           0 AS workout_count, 0 AS workout_minutes, 0 AS burned_calories
+    FROM calorie_entries
+    WHERE created_at IS NOT NULL
+      AND (CAST(:user_id AS BIGINT) IS NULL OR user_id = :user_id)
+    UNION ALL
+    SELECT user_id, COALESCE(local_date, created_at::date),
+           0, 0, 0, 0, 0, 0,
+           1, duration, COALESCE(calories_burned, 0)
+    FROM workout_entries
+    WHERE created_at IS NOT NULL
+      AND (CAST(:user_id AS BIGINT) IS NULL OR user_id = :user_id)
+) src
+GROUP BY user_id, day
+"""
+
+
+def calorie_entry_deltas(entry: CalorieEntry) -> dict:
+    """Приращения итогов дня для записи о еде или воде"""
+    if entry.meal_type == 'water':
+        return {'water_ml': entry.water_ml or 0}
+    return {
+        'calories': entry.calories or 0,
+        'protein': entry.protein or 0,
+        'fats': entry.fats or 0,
+        'carbs': entry.carbs or 0,
+        'meal_count': 1,
+    }
+
+
+def workout_entry_deltas(entry) -> dict:
+    """Приращения итогов дня для записи о тренировке"""
+    return {
+        'workout_count': 1,
+        'workout_minutes': entry.duration or 0,
+        'burned_calories': entry.calories_burned or 0,
+    }
+
+
+async def add_to_daily_totals(session, user_id: int, day: date, **deltas):
+    """Прибавить значения к итогам дня day (в транзакции вызывающего кода, без commit)"""
+    values = {col: deltas.get(col, 0) for col in ROLLUP_COLUMNS}
+    stmt = insert(DailyUserTotal).values(user_id=user_id, day=day, **values)
+    update = {col: getattr(DailyUserTotal, col) + getattr(stmt.excluded, col) for col in deltas}
+    update['updated_at'] = func.now()
+    await session.execute(stmt.on_conflict_do_update(
+        index_elements=[DailyUserTotal.user_id, DailyUserTotal.day],
+        set_=update,
+    ))
+
+
+async def get_today_totals(session, user_id: int, user=None) -> dict:
+    """Калории, вода и приёмы пищи за текущий день пользователя (user — профиль из кэша).
+
+    Обычный день читается одной строкой свёртки по local_date. Если пользователь
+    начал день заново через /new_day, считаем по сырым записям с этого момента.
+    """
+    tz_name = user.timezone if user else None
+    day_start = user.current_day_start if user else None
+    today = local_today(tz_name)
+    since = calc_today_start(day_start, tz_name)
+    if day_start is not None and since == day_start:
+        row = await get_raw_day_totals(session, user_id, today, since)
+    else:
+        row = await get_day_rollup(session, user_id, today)
+    calories, water_ml, meal_count = row if row else (0, 0, 0)
+    return {'calories': int(calories), 'water_ml': int(water_ml), 'meal_count': int(meal_count)}
+
+
+async def get_period_totals(session, user_id: int, days: int, user=None) -> dict:
+    """Суммы за последние days дней (включая сегодня в часовом поясе пользователя)
+    и средняя калорийность по дням с приёмами пищи"""
+    since = local_today(user.timezone if user else None) - timedelta(days=days - 1)
+    meal_count, avg_calories, workout_count, workout_minutes, burned = \
+        await get_period_rollup(session, user_id, since)
+    return {
+        'meal_count': int(meal_count),
+        'avg_calories': int(avg_calories or 0),
+        'workout_count': int(workout_count),
+        'workout_minutes': int(workout_minutes),
+        'burned_calories': int(burned),
+    }
+
+
+async def get_stats_snapshot(session, user_id: int, user=None) -> dict:
+    """Всё для экрана статистики одним запросом: сегодня, неделя, месяц, два последних веса"""
+    tz_name = user.timezone if user else None
+    day_start = user.current_day_start if user else None
+    since = calc_today_start(day_start, tz_name)
+    raw = day_start is not None and since == day_start
+    row = await get_stats_row(session, user_id, local_today(tz_name), since if raw else None)
+    return {
+        'today_calories': int(row.raw_calories if raw else row.today_calories),
+        'today_water_ml': int(row.raw_water_ml if raw else row.today_water_ml),
+        'week_meals': int(row.week_meals),
+        'week_avg_calories': int(row.week_avg_calories or 0),
+        'week_workouts': int(row.week_workouts),
+        'week_workout_minutes': int(row.week_workout_minutes),
+        'week_burned_calories': int(row.week_burned_calories),
+        'month_workouts': int(row.month_workouts),
+        'month_workout_minutes': int(row.month_workout_minutes),
+        'last_weights': list(row.last_weights or []),
+    }
+
+
+async def rebuild_daily_totals(user_id: int = None) -> int:
+    """Пересобрать итоги из сырых записей (всех пользователей или одного).
+
+    Бот в это время продолжает писать: add_to_daily_totals, попавший между DELETE
+    и INSERT, дал бы нарушение уникальности или посчитал запись дважды. Поэтому
+    транзакция сначала берёт SHARE ROW EXCLUSIVE на daily_user_totals — upsert'ы
+    (ROW EXCLUSIVE) ждут конца пересборки, чтение статистики не блокируется.
+    Записи, закоммиченные до блокировки, попадут в пересборку; ожидающие добавят
+    свою дельту уже к пересобранным строкам.
+    """
+    async with async_session() as session:
+        await session.execute(text("LOCK TABLE daily_user_totals IN SHARE ROW EXCLUSIVE MODE"))
+        stmt = delete(DailyUserTotal)
+        if user_id is not None:
+            stmt = stmt.where(DailyUserTotal.user_id == user_id)
+        await session.execute(stmt)
+        result = await session.execute(text(REBUILD_SQL), {'user_id': user_id})
+        await session.commit()
+        return result.rowcount
+
+
+async def _run_rebuild(user_id: int = None) -> int:
+    try:
+        return await rebuild_daily_totals(user_id)
+    finally:
+        await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Дневные итоги пользователей (daily_user_totals)")
+    commands = parser.add_subparsers(dest='command', required=True)
+    rebuild = commands.add_parser('rebuild', help="Пересобрать итоги из сырых записей")
+    rebuild.add_argument('--user-id', type=int, help="telegram_id пользователя (по умолчанию — все)")
+    args = parser.parse_args()
+
+    if args.command == 'rebuild':
+        rows = asyncio.run(_run_rebuild(args.user_id))
+        print(f"✅ Пересобрано дней: {rows}")
+
+
+if __name__ == '__main__':
+    main()
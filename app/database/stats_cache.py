@@ -0,0 +1,59 @@
+"""
+Кэш экрана статистики по telegram_id.
+
+Пользователи открывают «📈 Моя статистика» по несколько раз подряд, ничего
+не записывая между нажатиями, — готовый снимок отдаётся без запроса к БД.
+Снимок живёт до местной полуночи пользователя (но не дольше STATS_CACHE_TTL).
+Все места, которые пишут еду, воду, тренировки, вес или меняют начало дня
+(/new_day, /timezone), обязаны вызвать invalidate_stats().
+
+После записи (STATS_PRIMARY_AFTER_WRITE секунд) снимок читается только с
+основной БД, без read_session(): нулевое отставание реплики не гарантирует,
+что она уже получила эту запись (LAG_SQL видит только полученный WAL),
+а устаревший снимок остался бы в кэше до полуночи.
+"""
+import os
+from datetime import datetime, timedelta
+
+from database.database import async_session, user_zone
+from database.replica import read_session, DB_REPLICA_MAX_LAG
+from database.rollups import get_stats_snapshot
+from utils.cache import TTLCache
+
+STATS_CACHE_TTL = float(os.getenv('STATS_CACHE_TTL', '900'))  # секунды
+STATS_CACHE_SIZE = int(os.getenv('STATS_CACHE_SIZE', '5000'))
+STATS_PRIMARY_AFTER_WRITE = float(os.getenv(
+    'STATS_PRIMARY_AFTER_WRITE', str(max(60.0, DB_REPLICA_MAX_LAG))
+))  # секунды
+
+stats_cache = TTLCache(maxsize=STATS_CACHE_SIZE, ttl=STATS_CACHE_TTL)
+# Кто недавно писал: такие снимки читаем только с основной БД
+_recent_writes = TTLCache(maxsize=STATS_CACHE_SIZE, ttl=STATS_PRIMARY_AFTER_WRITE)
+
+
+def _seconds_to_midnight(tz_name: str = None) -> float:
+    now = datetime.now(user_zone(tz_name))
+    midnight = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return (midnight - now).total_seconds()
+
+
+async def _load_stats(telegram_id: int, user) -> dict:
+    if _recent_writes.get(telegram_id):
+        async with async_session() as session:
+            return await get_stats_snapshot(session, telegram_id, user)
+    async with read_session() as session:
+        return await get_stats_snapshot(session, telegram_id, user)
+
+
+async def get_cached_stats(telegram_id: int, user=None) -> dict:
+    """Снимок статистики пользователя (user — профиль из кэша)"""
+    ttl = min(STATS_CACHE_TTL, _seconds_to_midnight(user.timezone if user else None))
+    return await stats_cache.get_or_load(
+        telegram_id, lambda: _load_stats(telegram_id, user), ttl=ttl
+    )
+
+
+def invalidate_stats(telegram_id: int):
+    """Сбросить снимок после записи пользователя"""
+    stats_cache.invalidate(telegram_id)
+    _recent_writes.set(telegram_id, True)
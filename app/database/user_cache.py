@@ -0,0 +1,40 @@
+"""
+Кэш профилей пользователей по telegram_id.
+
+Один AI-запрос читает User несколько раз (проверка регистрации, контекст для AI,
+цель калорий при подтверждении) — кэш убирает повторные SELECT.
+Все места, которые меняют профиль, обязаны вызвать invalidate_user().
+"""
+import os
+from datetime import date
+from typing import Optional
+
+from database.database import async_session, User, local_today
+from database.queries import get_user_by_telegram_id
+from utils.cache import TTLCache
+
+USER_CACHE_TTL = float(os.getenv('USER_CACHE_TTL', '300'))  # секунды
+USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', '10000'))
+
+user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+
+async def _load_user(telegram_id: int) -> Optional[User]:
+    async with async_session() as session:
+        return await get_user_by_telegram_id(session, telegram_id)
+
+
+async def get_cached_user(telegram_id: int) -> Optional[User]:
+    """Профиль пользователя (отсоединённый от сессии объект, только для чтения)"""
+    return await user_cache.get_or_load(telegram_id, lambda: _load_user(telegram_id))
+
+
+def invalidate_user(telegram_id: int):
+    """Сбросить профиль из кэша после изменения в БД"""
+    user_cache.invalidate(telegram_id)
+
+
+async def get_user_local_date(telegram_id: int) -> date:
+    """Сегодняшняя дата в часовом поясе пользователя (для local_date новых записей)"""
+    user = await get_cached_user(telegram_id)
+    return local_today(user.timezone if user else None)
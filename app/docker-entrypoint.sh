@@ -1,35 +1,64 @@
 #!/bin/bash
 
 # Entrypoint скрипт для контейнера бота
-# Применяет миграции перед запуском
+#
+#   docker-entrypoint.sh           — запуск бота (миграции — только при RUN_MIGRATIONS=1)
+#   docker-entrypoint.sh migrate   — применить миграции и выйти (make migrate)
+#
+# По умолчанию миграции при старте НЕ применяются: часть ревизий копирует или
+# перезаписывает большие таблицы под блокировкой (006 — секционирование calorie_entries
+# и ai_interactions, 008 — перевод в JSONB, 011 — заполнение local_date), и рестарт
+# контейнера не должен запускать их сам. Миграции применяются вручную в окно обслуживания:
+#   make backup && make migrate && make up
+# Бот сам проверит ревизию схемы и упадёт при несовпадении.
+# RUN_MIGRATIONS=1 — автоприменение при старте (локальная разработка, пустая БД).
 
 set -e
 
-echo "🔍 Проверка подключения к базе данных..."
+wait_for_db() {
+  echo "🔍 Проверка подключения к базе данных..."
 
-# Ждем, пока PostgreSQL будет готов
-max_tries=30
-count=0
-until PGPASSWORD=$DB_PASSWORD psql -h "$DB_HOST" -U "$DB_USER" -d "$DB_NAME" -c '\q' 2>/dev/null; do
-  count=$((count + 1))
-  if [ $count -ge $max_tries ]; then
-    echo "❌ Не удалось подключиться к БД после $max_tries попыток"
-    exit 1
+  # Ждем, пока PostgreSQL будет готов
+  max_tries=30
+  count=0
+  until PGPASSWORD=$DB_PASSWORD psql -h "$DB_HOST" -U "$DB_USER" -d "$DB_NAME" -c '\q' 2>/dev/null; do
+    count=$((count + 1))
+    if [ $count -ge $max_tries ]; then
+      echo "❌ Не удалось подключиться к БД после $max_tries попыток"
+      exit 1
+    fi
+    echo "⏳ Ожидание PostgreSQL... (попытка $count/$max_tries)"
+    sleep 2
+  done
+
+  echo "✅ База данных доступна"
+}
+
+run_migrations() {
+  echo "🔄 Применение миграций Alembic..."
+  if alembic upgrade head; then
+      echo "✅ Миграции применены успешно"
+  else
+      echo "❌ Ошибка применения миграций"
+      exit 1
   fi
-  echo "⏳ Ожидание PostgreSQL... (попытка $count/$max_tries)"
-  sleep 2
-done
 
-echo "✅ База данных доступна"
+  # Справочник продуктов — данные, а не схема: миграции его не заполняют
+  echo "📚 Обновление справочника продуктов..."
+  python -m database.nutrition load
+}
 
-echo "🔄 Применение миграций Alembic..."
-alembic upgrade head
+if [ "$1" = "migrate" ]; then
+  wait_for_db
+  run_migrations
+  exit 0
+fi
 
-if [ $? -eq 0 ]; then
-    echo "✅ Миграции применены успешно"
+if [ "${RUN_MIGRATIONS:-0}" = "1" ]; then
+  wait_for_db
+  run_migrations
 else
-    echo "❌ Ошибка применения миграций"
-    exit 1
+  echo "⏭  Миграции при старте пропущены (RUN_MIGRATIONS=0), применяются через make migrate"
 fi
 
 echo "🚀 Запуск бота..."
@@ -3,28 +3,42 @@ AI Hub - Единый обработчик всех типов сообщени
 с подтверждением перед сохранением
 """
 from aiogram import Router, F
+from aiogram.filters import Command, CommandObject
 from aiogram.types import Message, Voice, PhotoSize, CallbackQuery
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from sqlalchemy import select, func
-from datetime import datetime, timedelta
+from datetime import datetime
 import os
 import logging
 
 logger = logging.getLogger(__name__)
 
 from database.database import (
-    async_session, User, CalorieEntry, WorkoutEntry, AIInteraction, calc_today_start
+    async_session, CalorieEntry, WorkoutEntry, local_today
 )
+from database.activity import mark_active
+from database.ai_log import log_interaction
+from database.rollups import (
+    add_to_daily_totals, calorie_entry_deltas, workout_entry_deltas,
+    get_today_totals, get_period_totals,
+)
+from database.food_cache import get_food_analysis
+from database.nutrition import lookup_food
+from database.queries import normalize_food_text, find_entries_by_text, get_recent_entries
+from database.replica import read_session
+from database.stats_cache import invalidate_stats
+from database.user_cache import get_cached_user, get_user_local_date
 from keyboards.reply import (
     get_main_menu, MENU_BUTTONS, not_menu_button,
     get_ai_food_confirm_keyboard, get_ai_workout_confirm_keyboard
 )
+from utils.ai_resilience import AIUnavailable, ai_deadline
+from utils.live_message import LiveMessage
 from utils.openai_helper import (
     transcribe_voice,
-    analyze_food_from_text,
     analyze_food_from_photo,
     analyze_workout_from_text,
+    get_smart_recommendation,
 )
 
 router = Router()
@@ -34,6 +48,16 @@ MEDIA_DIR = "/app/media"
 os.makedirs(f"{MEDIA_DIR}/voice", exist_ok=True)
 os.makedirs(f"{MEDIA_DIR}/photos", exist_ok=True)
 
+# Сколько пользователь готов ждать ответа AI (секунды, включая повторы)
+AI_TEXT_DEADLINE = 20
+AI_MEDIA_DEADLINE = 45
+AI_ADVICE_DEADLINE = 90  # gpt-4o, до 800 токенов, фоновый приоритет
+
+AI_UNAVAILABLE_TEXT = (
+    "⏳ AI сейчас перегружен и не отвечает.\n\n"
+    "Попробуй через пару минут. Воду можно записывать как обычно."
+)
+
 
 class AIInput(StatesGroup):
     """Состояния для AI-ввода"""
@@ -353,41 +377,67 @@ def validate_workout_data(workout_data: dict) -> str | None:
 
 async def get_user_context(user_id: int) -> dict:
     """Получение контекста пользователя для AI + обновление last_active_at"""
-    async with async_session() as session:
-        result = await session.execute(
-            select(User).where(User.telegram_id == user_id)
-        )
-        user = result.scalar_one_or_none()
-        if user:
-            user.last_active_at = datetime.now()
-            await session.commit()
-            return {
-                'age': user.age,
-                'gender': user.gender,
-                'weight': user.weight,
-                'height': user.height,
-                'goal': user.goal,
-                'activity_level': user.activity_level,
-                'daily_target': user.daily_calorie_target
-            }
+    user = await get_cached_user(user_id)
+    if not user:
         return {}
 
+    mark_active(user_id)
+    return {
+        'age': user.age,
+        'gender': user.gender,
+        'weight': user.weight,
+        'height': user.height,
+        'goal': user.goal,
+        'activity_level': user.activity_level,
+        'daily_target': user.daily_calorie_target
+    }
+
+
+async def lookup_local_food(user_id: int, text: str):
+    """Простое описание — по справочнику продуктов; None — нужен AI"""
+    user = await get_cached_user(user_id)
+    try:
+        return await lookup_food(text, user.timezone if user else None)
+    except Exception:
+        logger.exception("Ошибка поиска по справочнику продуктов")
+        return None
+
+
+async def find_previous_food(user_id: int, text: str):
+    """КБЖУ из прошлой записи пользователя с тем же описанием (когда AI недоступен)"""
+    try:
+        async with read_session() as session:
+            entries = await find_entries_by_text(session, text, user_id=user_id, limit=1)
+    except Exception:
+        logger.exception("Ошибка поиска прошлых записей еды")
+        return None
+    if not entries:
+        return None
+    entry = entries[0]
+    return {
+        'food_name': entry.food_name,
+        'calories': entry.calories,
+        'protein': entry.protein or 0,
+        'fats': entry.fats or 0,
+        'carbs': entry.carbs or 0,
+        'meal_type': entry.meal_type or 'snack',
+        'confidence': entry.ai_confidence or 0,
+        'notes': "AI недоступен — взял значения из твоей прошлой записи",
+        '_cache': 'history',
+    }
+
 
 async def check_user_registered(message: Message) -> bool:
     """Проверка, что пользователь зарегистрирован и настроил профиль"""
-    async with async_session() as session:
-        result = await session.execute(
-            select(User).where(User.telegram_id == message.from_user.id)
+    user = await get_cached_user(message.from_user.id)
+    if not user or not user.daily_calorie_target:
+        await message.answer(
+            "Сначала настрой профиль командой /start, "
+            "чтобы использовать AI-функции.",
+            reply_markup=get_main_menu()
         )
-        user = result.scalar_one_or_none()
-        if not user or not user.daily_calorie_target:
-            await message.answer(
-                "Сначала настрой профиль командой /start, "
-                "чтобы использовать AI-функции.",
-                reply_markup=get_main_menu()
-            )
-            return False
-        return True
+        return False
+    return True
 
 
 async def show_food_confirmation(message: Message, state: FSMContext,
@@ -412,9 +462,13 @@ async def show_food_confirmation(message: Message, state: FSMContext,
     await state.set_state(AIInput.pending_food_confirmation)
 
     confidence_emoji = "✅" if food_data.get('confidence', 0) > 0.8 else "⚠️"
+    source = {
+        'local': "Нашёл в справочнике",
+        'history': "Как в прошлый раз",
+    }.get(food_data.get('_cache'), "AI распознал")
 
     response = (
-        f"{confidence_emoji} <b>AI распознал:</b>\n\n"
+        f"{confidence_emoji} <b>{source}:</b>\n\n"
         f"🍽 <b>{food_data['food_name']}</b>\n"
         f"📊 Калории: <b>{food_data['calories']} ккал</b>\n"
         f"Б/Ж/У: {food_data.get('protein', 0):.1f} / "
@@ -479,7 +533,18 @@ async def analyze_and_show_food(message: Message, state: FSMContext,
     """Анализ еды через AI и показ подтверждения"""
     try:
         user_context = await get_user_context(message.from_user.id)
-        food_data = await analyze_food_from_text(text, user_context)
+        food_data = await lookup_local_food(message.from_user.id, text)
+        if food_data is None:
+            user = await get_cached_user(message.from_user.id)
+            with ai_deadline(AI_TEXT_DEADLINE):
+                food_data = await get_food_analysis(text, user_context, user.timezone if user else None)
+        await show_food_confirmation(message, state, food_data, source_type, file_path, text)
+    except AIUnavailable:
+        logger.warning("AI недоступен, анализ еды из прошлых записей")
+        food_data = await find_previous_food(message.from_user.id, text)
+        if food_data is None:
+            await message.answer(AI_UNAVAILABLE_TEXT, reply_markup=get_main_menu())
+            return
         await show_food_confirmation(message, state, food_data, source_type, file_path, text)
     except Exception as e:
         logger.exception("Ошибка анализа еды")
@@ -490,7 +555,8 @@ async def analyze_and_show_workout(message: Message, state: FSMContext,
                                     text: str, source_type: str):
     """Анализ тренировки через AI и показ подтверждения (или запрос длительности)"""
     try:
-        workout_data = await analyze_workout_from_text(text)
+        with ai_deadline(AI_TEXT_DEADLINE):
+            workout_data = await analyze_workout_from_text(text)
 
         if not workout_data.get('duration') or workout_data['duration'] == 0:
             # Нужно уточнить длительность
@@ -507,6 +573,9 @@ async def analyze_and_show_workout(message: Message, state: FSMContext,
             await state.set_state(AIInput.waiting_for_workout_duration)
         else:
             await show_workout_confirmation(message, state, workout_data, source_type, text)
+    except AIUnavailable:
+        logger.warning("AI недоступен, анализ тренировки отложен")
+        await message.answer(AI_UNAVAILABLE_TEXT, reply_markup=get_main_menu())
     except Exception as e:
         logger.exception("Ошибка анализа тренировки")
         await message.answer("❌ Не удалось проанализировать. Попробуй ещё раз или опиши иначе.")
@@ -515,6 +584,7 @@ async def analyze_and_show_workout(message: Message, state: FSMContext,
 async def save_food_to_db(user_id: int, food_data: dict, source_type: str,
                            file_path: str = None, original_text: str = None) -> int:
     """Сохранение еды в БД"""
+    local_date = await get_user_local_date(user_id)
     async with async_session() as session:
         entry = CalorieEntry(
             user_id=user_id,
@@ -525,37 +595,46 @@ async def save_food_to_db(user_id: int, food_data: dict, source_type: str,
             fats=food_data.get('fats', 0),
             meal_type=food_data.get('meal_type', 'snack'),
             source_type=source_type,
-            source_data={'original_text': original_text, 'file_path': file_path},
+            source_data={
+                'original_text': original_text,
+                'normalized_text': normalize_food_text(original_text) or None,
+                'file_path': file_path,
+            },
             ai_confidence=food_data.get('confidence', 0),
-            ai_notes=food_data.get('notes', '')
+            ai_notes=food_data.get('notes', ''),
+            local_date=local_date
         )
         session.add(entry)
         await session.flush()
-
-        usage = food_data.get('_usage', {})
-        ai_log = AIInteraction(
-            user_id=user_id,
-            interaction_type='food_analysis',
-            input_type=source_type,
-            input_data=original_text,
-            input_file_path=file_path,
-            ai_response=food_data,
-            ai_model='gpt-4o-mini',
-            ai_confidence=food_data.get('confidence', 0),
-            prompt_tokens=usage.get('prompt_tokens'),
-            completion_tokens=usage.get('completion_tokens'),
-            total_tokens=usage.get('total_tokens'),
-            created_entry_type='calorie_entry',
-            created_entry_id=entry.id
-        )
-        session.add(ai_log)
+        await add_to_daily_totals(session, user_id, local_date, **calorie_entry_deltas(entry))
         await session.commit()
-        return entry.id
+    invalidate_stats(user_id)
+
+    # Журнал AI пишется в фоне, подтверждение ждёт только саму запись
+    usage = food_data.get('_usage', {})
+    await log_interaction(
+        user_id=user_id,
+        interaction_type='food_analysis',
+        input_type=source_type,
+        input_data=original_text,
+        input_file_path=file_path,
+        ai_response=food_data,
+        ai_model='gpt-4o-mini',
+        ai_confidence=food_data.get('confidence', 0),
+        prompt_tokens=usage.get('prompt_tokens'),
+        completion_tokens=usage.get('completion_tokens'),
+        total_tokens=usage.get('total_tokens'),
+        created_entry_type='calorie_entry',
+        created_entry_id=entry.id,
+        cache_source=food_data.get('_cache')
+    )
+    return entry.id
 
 
 async def save_workout_to_db(user_id: int, workout_data: dict,
                               source_type: str, original_text: str = None) -> int:
     """Сохранение тренировки в БД"""
+    local_date = await get_user_local_date(user_id)
     async with async_session() as session:
         entry = WorkoutEntry(
             user_id=user_id,
@@ -567,29 +646,32 @@ async def save_workout_to_db(user_id: int, workout_data: dict,
             intensity=workout_data.get('intensity'),
             distance=workout_data.get('distance'),
             pace=workout_data.get('pace'),
-            ai_confidence=workout_data.get('confidence', 0)
+            ai_confidence=workout_data.get('confidence', 0),
+            local_date=local_date
         )
         session.add(entry)
         await session.flush()
-
-        usage = workout_data.get('_usage', {})
-        ai_log = AIInteraction(
-            user_id=user_id,
-            interaction_type='workout_analysis',
-            input_type=source_type,
-            input_data=original_text,
-            ai_response=workout_data,
-            ai_model='gpt-4o-mini',
-            ai_confidence=workout_data.get('confidence', 0),
-            prompt_tokens=usage.get('prompt_tokens'),
-            completion_tokens=usage.get('completion_tokens'),
-            total_tokens=usage.get('total_tokens'),
-            created_entry_type='workout_entry',
-            created_entry_id=entry.id
-        )
-        session.add(ai_log)
+        await add_to_daily_totals(session, user_id, local_date, **workout_entry_deltas(entry))
         await session.commit()
-        return entry.id
+    invalidate_stats(user_id)
+
+    usage = workout_data.get('_usage', {})
+    await log_interaction(
+        user_id=user_id,
+        interaction_type='workout_analysis',
+        input_type=source_type,
+        input_data=original_text,
+        ai_response=workout_data,
+        ai_model='gpt-4o-mini',
+        ai_confidence=workout_data.get('confidence', 0),
+        prompt_tokens=usage.get('prompt_tokens'),
+        completion_tokens=usage.get('completion_tokens'),
+        total_tokens=usage.get('total_tokens'),
+        created_entry_type='workout_entry',
+        created_entry_id=entry.id,
+        cache_source=workout_data.get('_cache')
+    )
+    return entry.id
 
 
 async def record_water(message: Message, state: FSMContext, glasses: int = None, ml: int = None):
@@ -612,6 +694,8 @@ async def record_water(message: Message, state: FSMContext, glasses: int = None,
     else:
         label = f"💧 Вода ({ml} мл)"
 
+    user = await get_cached_user(user_id)
+    local_date = local_today(user.timezone if user else None)
     async with async_session() as session:
         entry = CalorieEntry(
             user_id=user_id,
@@ -621,36 +705,20 @@ async def record_water(message: Message, state: FSMContext, glasses: int = None,
             carbs=0,
             fats=0,
             meal_type='water',
+            water_ml=ml,
             source_type='text_ai',
+            local_date=local_date,
         )
         session.add(entry)
+        await add_to_daily_totals(session, user_id, local_date, **calorie_entry_deltas(entry))
 
-        # Считаем общий объём воды за сегодня
-        user_result = await session.execute(
-            select(User).where(User.telegram_id == user_id)
-        )
-        user = user_result.scalar_one_or_none()
-        today_start = calc_today_start(user.current_day_start if user else None)
-
-        # Суммируем мл по food_name (парсим из записей)
-        water_entries = await session.execute(
-            select(CalorieEntry.food_name)
-            .where(CalorieEntry.user_id == user_id)
-            .where(CalorieEntry.meal_type == 'water')
-            .where(CalorieEntry.created_at >= today_start)
-        )
-        existing_entries = water_entries.scalars().all()
+        # Общий объём воды за сегодня (вместе с текущей записью)
+        today = await get_today_totals(session, user_id, user)
 
         await session.commit()
+    invalidate_stats(user_id)
 
-    # Считаем мл из уже записанных + текущая
-    total_ml = ml
-    for fname in existing_entries:
-        m = re.search(r'(\d+)\s*мл', fname)
-        if m:
-            total_ml += int(m.group(1))
-        else:
-            total_ml += 250  # старые записи без мл — считаем стакан
+    total_ml = today['water_ml']
 
     target_ml = 2000
     progress_glasses = min(8, total_ml // 250)
@@ -715,6 +783,69 @@ async def water_button(message: Message, state: FSMContext):
     await record_water(message, state, glasses=1)
 
 
+# ==================== Рекомендации ====================
+
+async def _stream_recommendation(user_data: dict, query: str, live: LiveMessage):
+    """Ответ стримится в live; если стрим упал до первого куска — обычный запрос"""
+    try:
+        return await get_smart_recommendation(user_data, query, on_delta=live.append)
+    except AIUnavailable:
+        raise
+    except Exception:
+        if live.text:
+            raise
+        logger.warning("Стрим рекомендации не удался, повторяем без стрима", exc_info=True)
+        return await get_smart_recommendation(user_data, query)
+
+
+@router.message(Command("advice"))
+async def cmd_advice(message: Message, command: CommandObject, state: FSMContext):
+    """Персональная рекомендация от AI; ответ появляется по мере генерации"""
+    await state.clear()
+    if not await check_user_registered(message):
+        return
+    query = (command.args or '').strip()
+    if not query:
+        await message.answer(
+            "💡 Задай вопрос после команды, например:\n"
+            "<code>/advice как добрать белок без лишних калорий?</code>",
+            reply_markup=get_main_menu()
+        )
+        return
+
+    user_id = message.from_user.id
+    user_data = await get_user_context(user_id)
+    async with read_session() as session:
+        user_data['recent_meals'], user_data['recent_workouts'] = await get_recent_entries(session, user_id)
+
+    live = LiveMessage(await message.answer("🤖 Думаю над ответом..."))
+    try:
+        with ai_deadline(AI_ADVICE_DEADLINE):
+            content, usage = await _stream_recommendation(user_data, query, live)
+    except AIUnavailable:
+        logger.warning("AI недоступен, рекомендация не получена")
+        await live.finish(AI_UNAVAILABLE_TEXT)
+        return
+    except Exception:
+        logger.exception("Ошибка получения рекомендации")
+        await live.finish("❌ Не удалось получить рекомендацию. Попробуй ещё раз позже.")
+        return
+
+    # Ответ модели — обычный текст, не HTML
+    await live.finish(content, parse_mode=None)
+    await log_interaction(
+        user_id=user_id,
+        interaction_type='recommendation',
+        input_type='text',
+        input_data=query,
+        ai_response={'text': content},
+        ai_model='gpt-4o',
+        prompt_tokens=usage.get('prompt_tokens'),
+        completion_tokens=usage.get('completion_tokens'),
+        total_tokens=usage.get('total_tokens'),
+    )
+
+
 # ==================== Голосовые сообщения ====================
 
 @router.message(F.voice)
@@ -733,7 +864,8 @@ async def handle_voice_message(message: Message, state: FSMContext):
         file_path = f"{MEDIA_DIR}/voice/{message.from_user.id}_{datetime.now().timestamp()}.ogg"
         await message.bot.download_file(file.file_path, file_path)
 
-        transcribed_text = await transcribe_voice(file_path)
+        with ai_deadline(AI_MEDIA_DEADLINE):
+            transcribed_text = await transcribe_voice(file_path, voice.file_unique_id)
 
         if is_water_input(transcribed_text):
             await record_water(message, state, ml=parse_water_amount(transcribed_text))
@@ -744,6 +876,13 @@ async def handle_voice_message(message: Message, state: FSMContext):
         else:
             await message.answer(NOT_RECOGNIZED_TEXT, reply_markup=get_main_menu())
 
+    except AIUnavailable:
+        logger.warning("AI недоступен, голосовое не распознано")
+        await message.answer(
+            AI_UNAVAILABLE_TEXT + "\nИли напиши то же самое текстом — простые блюда "
+            "я посчитаю по справочнику.",
+            reply_markup=get_main_menu()
+        )
     except Exception as e:
         logger.exception("Ошибка обработки голосового сообщения")
         await message.answer(
@@ -774,10 +913,18 @@ async def handle_photo_message(message: Message, state: FSMContext):
         await message.bot.download_file(file.file_path, file_path)
 
         user_context = await get_user_context(message.from_user.id)
-        food_data = await analyze_food_from_photo(file_path, user_context)
+        with ai_deadline(AI_MEDIA_DEADLINE):
+            food_data = await analyze_food_from_photo(file_path, user_context)
 
         await show_food_confirmation(message, state, food_data, 'photo', file_path)
 
+    except AIUnavailable:
+        logger.warning("AI недоступен, фото не проанализировано")
+        await message.answer(
+            AI_UNAVAILABLE_TEXT + "\nИли опиши еду текстом — простые блюда "
+            "я посчитаю по справочнику.",
+            reply_markup=get_main_menu()
+        )
     except Exception as e:
         logger.exception("Ошибка анализа фото")
         await message.answer(
@@ -887,35 +1034,18 @@ async def confirm_food(callback: CallbackQuery, state: FSMContext):
     )
 
     # Статистика за сегодня
+    user = await get_cached_user(callback.from_user.id)
+    target = user.daily_calorie_target or 2000 if user else 2000
     async with async_session() as session:
-        user_result = await session.execute(
-            select(User).where(User.telegram_id == callback.from_user.id)
-        )
-        user = user_result.scalar_one_or_none()
-        target = user.daily_calorie_target or 2000 if user else 2000
-        today_start = calc_today_start(user.current_day_start if user else None)
-
-        result = await session.execute(
-            select(func.sum(CalorieEntry.calories))
-            .where(CalorieEntry.user_id == callback.from_user.id)
-            .where(CalorieEntry.created_at >= today_start)
-        )
-        total_today = result.scalar() or 0
-
-        # Стаканы воды за сегодня
-        water_result = await session.execute(
-            select(func.count(CalorieEntry.id))
-            .where(CalorieEntry.user_id == callback.from_user.id)
-            .where(CalorieEntry.meal_type == 'water')
-            .where(CalorieEntry.created_at >= today_start)
-        )
-        water_today = water_result.scalar() or 0
+        today = await get_today_totals(session, callback.from_user.id, user)
+        total_today = today['calories']
+        water_today = today['water_ml']
 
     remaining = target - total_today
     progress_percent = min(100, int((total_today / target) * 100))
     progress_bar = "█" * (progress_percent // 10) + "░" * (10 - progress_percent // 10)
 
-    water_info = f"\n💧 Вода: <b>{water_today}</b> / 8 стаканов" if water_today else ""
+    water_info = f"\n💧 Вода: <b>{water_today}</b> / 2000 мл" if water_today else ""
 
     await callback.message.edit_text(
         f"✅ <b>Добавлено!</b>\n\n"
@@ -955,19 +1085,13 @@ async def confirm_workout(callback: CallbackQuery, state: FSMContext):
         data.get('pending_workout_text')
     )
 
-    # Статистика за неделю
-    week_ago = datetime.now() - timedelta(days=7)
+    # Статистика за последние 7 дней
+    user = await get_cached_user(callback.from_user.id)
     async with async_session() as session:
-        result = await session.execute(
-            select(
-                func.count(WorkoutEntry.id),
-                func.sum(WorkoutEntry.duration),
-                func.sum(WorkoutEntry.calories_burned)
-            )
-            .where(WorkoutEntry.user_id == callback.from_user.id)
-            .where(WorkoutEntry.created_at >= week_ago)
-        )
-        week_count, week_duration, week_calories = result.one()
+        week = await get_period_totals(session, callback.from_user.id, 7, user)
+    week_count = week['workout_count']
+    week_duration = week['workout_minutes']
+    week_calories = week['burned_calories']
 
     await callback.message.edit_text(
         f"✅ <b>Тренировка добавлена!</b>\n\n"
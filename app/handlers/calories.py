@@ -2,10 +2,10 @@ from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from sqlalchemy import select, func
-from datetime import datetime, timedelta
-
-from database.database import async_session, CalorieEntry, User, calc_today_start
+from database.database import async_session, CalorieEntry, local_today
+from database.rollups import add_to_daily_totals, calorie_entry_deltas, get_today_totals
+from database.stats_cache import invalidate_stats
+from database.user_cache import get_cached_user
 from keyboards.reply import get_meal_type_keyboard, get_main_menu, not_menu_button
 
 router = Router()
@@ -61,32 +61,28 @@ async def process_meal_type(callback: CallbackQuery, state: FSMContext):
     meal_type = callback.data.split("_")[1]
     data = await state.get_data()
 
+    # Данные пользователя: часовой пояс, /new_day и целевая калорийность
+    user = await get_cached_user(callback.from_user.id)
+    target = user.daily_calorie_target if user and user.daily_calorie_target else 2000
+
     # Сохраняем в БД
     async with async_session() as session:
         entry = CalorieEntry(
             user_id=callback.from_user.id,
             food_name=data['food_name'],
             calories=data['calories'],
-            meal_type=meal_type
+            meal_type=meal_type,
+            local_date=local_today(user.timezone if user else None)
         )
         session.add(entry)
+        await add_to_daily_totals(session, callback.from_user.id, entry.local_date,
+                                  **calorie_entry_deltas(entry))
         await session.commit()
-
-        # Получаем данные пользователя для /new_day и целевой калорийности
-        user_result = await session.execute(
-            select(User).where(User.telegram_id == callback.from_user.id)
-        )
-        user = user_result.scalar_one_or_none()
-        today_start = calc_today_start(user.current_day_start if user else None)
-        target = user.daily_calorie_target if user and user.daily_calorie_target else 2000
+        invalidate_stats(callback.from_user.id)
 
         # Получаем статистику за сегодня
-        result = await session.execute(
-            select(func.sum(CalorieEntry.calories))
-            .where(CalorieEntry.user_id == callback.from_user.id)
-            .where(CalorieEntry.created_at >= today_start)
-        )
-        total_today = result.scalar() or 0
+        today = await get_today_totals(session, callback.from_user.id, user)
+        total_today = today['calories']
 
     meal_emoji = {
         'breakfast': '🌅',
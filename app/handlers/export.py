@@ -0,0 +1,65 @@
+import logging
+import os
+import tempfile
+from datetime import datetime
+
+from aiogram import Router
+from aiogram.types import Message, FSInputFile
+from aiogram.filters import Command, CommandObject
+from aiogram.fsm.context import FSMContext
+from database.export import write_export, EXPORT_FORMATS
+from database.user_cache import get_cached_user
+from keyboards.reply import get_main_menu
+
+logger = logging.getLogger(__name__)
+
+router = Router()
+
+# Пользователи, у которых выгрузка уже идёт
+_exporting = set()
+
+
+@router.message(Command("export"))
+async def cmd_export(message: Message, command: CommandObject, state: FSMContext):
+    """Выгрузить историю еды, тренировок и веса файлом"""
+    await state.clear()
+    user_id = message.from_user.id
+    user = await get_cached_user(user_id)
+    if not user:
+        await message.answer("Сначала настрой профиль командой /start")
+        return
+
+    fmt = (command.args or 'csv').strip().lower()
+    if fmt not in EXPORT_FORMATS:
+        await message.answer(
+            "Формат выгрузки: <code>/export</code> (CSV) или <code>/export json</code> (NDJSON)"
+        )
+        return
+
+    if user_id in _exporting:
+        await message.answer("⏳ Выгрузка уже готовится, подожди немного")
+        return
+
+    _exporting.add(user_id)
+    status = await message.answer("⏳ Готовлю выгрузку...")
+    extension = 'csv' if fmt == 'csv' else 'ndjson'
+    filename = f"fitbud_{datetime.now().strftime('%Y%m%d')}.{extension}.gz"
+    fd, path = tempfile.mkstemp(suffix=f".{extension}.gz")
+    os.close(fd)
+    try:
+        rows = await write_export(user_id, path, fmt)
+        if not rows:
+            await status.edit_text("Пока нечего выгружать — записей ещё нет")
+            return
+        await message.answer_document(
+            FSInputFile(path, filename=filename),
+            caption=f"📦 Твоя история: {rows} записей",
+            reply_markup=get_main_menu()
+        )
+        await status.delete()
+    except Exception:
+        logger.exception(f"Ошибка выгрузки истории {user_id}")
+        await status.edit_text("❌ Не удалось подготовить выгрузку, попробуй позже")
+    finally:
+        _exporting.discard(user_id)
+        os.remove(path)
@@ -2,10 +2,11 @@ from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from sqlalchemy import select, func
-from datetime import datetime, timedelta
 
-from database.database import async_session, WorkoutEntry
+from database.database import async_session, WorkoutEntry, local_today
+from database.rollups import add_to_daily_totals, workout_entry_deltas, get_period_totals
+from database.stats_cache import invalidate_stats
+from database.user_cache import get_cached_user
 from keyboards.reply import get_workout_type_keyboard, get_main_menu, not_menu_button
 
 router = Router()
@@ -97,6 +98,8 @@ async def process_notes(message: Message, state: FSMContext):
     data = await state.get_data()
     notes = None if message.text.strip() == "-" else message.text.strip()
 
+    user = await get_cached_user(message.from_user.id)
+
     # Сохраняем в БД
     async with async_session() as session:
         entry = WorkoutEntry(
@@ -104,26 +107,20 @@ async def process_notes(message: Message, state: FSMContext):
             workout_type=data['workout_name'],
             duration=data['duration'],
             calories_burned=data['calories_burned'],
-            notes=notes
+            notes=notes,
+            local_date=local_today(user.timezone if user else None)
         )
         session.add(entry)
+        await add_to_daily_totals(session, message.from_user.id, entry.local_date,
+                                  **workout_entry_deltas(entry))
         await session.commit()
+        invalidate_stats(message.from_user.id)
 
-        # Получаем статистику за неделю
-        week_ago = datetime.now() - timedelta(days=7)
-        result = await session.execute(
-            select(
-                func.count(WorkoutEntry.id),
-                func.sum(WorkoutEntry.duration),
-                func.sum(WorkoutEntry.calories_burned)
-            )
-            .where(WorkoutEntry.user_id == message.from_user.id)
-            .where(WorkoutEntry.created_at >= week_ago)
-        )
-        week_count, week_duration, week_calories = result.one()
-        week_count = week_count or 0
-        week_duration = week_duration or 0
-        week_calories = week_calories or 0
+        # Получаем статистику за последние 7 дней
+        week = await get_period_totals(session, message.from_user.id, 7, user)
+        week_count = week['workout_count']
+        week_duration = week['workout_minutes']
+        week_calories = week['burned_calories']
 
     response = (
         f"✅ Тренировка добавлена!\n\n"
@@ -30,6 +30,7 @@ router = Router()
 #     get_main_menu, get_meal_plan_day_keyboard,
 #     get_workout_plan_day_keyboard, DAY_NAMES,
 # )
+# from utils.live_message import LiveMessage
 # from utils.openai_helper import generate_meal_plan, generate_workout_plan
 #
 # MEAL_TYPE_NAMES = {
@@ -42,6 +43,35 @@ router = Router()
 #
 # # ==================== Вспомогательные ====================
 #
+# def plan_progress_text(title: str, days: list, describe) -> str:
+#     """Прогресс генерации плана: готовые дни приходят из стрима по одному"""
+#     lines = [f"🤖 Составляю {title} на неделю... готово дней: {len(days)} из 7", ""]
+#     for day_data in sorted(days, key=lambda d: d.get('day', 0)):
+#         day_num = day_data.get('day', 0)
+#         name = DAY_NAMES[day_num] if 0 <= day_num < 7 else '?'
+#         lines.append(f"✓ {name} — {describe(day_data)}")
+#     return "\n".join(lines)
+#
+#
+# async def generate_plan_streamed(generate, user_ctx: dict, recent_stats: dict,
+#                                  progress: LiveMessage, title: str, describe) -> dict:
+#     """План со стримингом дней в progress; если стрим упал до первого дня — обычный запрос"""
+#     days = {}
+#
+#     def on_day(day_data: dict):
+#         # При повторе запроса дни приходят заново — храним по номеру дня
+#         days[day_data.get('day', len(days))] = day_data
+#         progress.set(plan_progress_text(title, list(days.values()), describe))
+#
+#     try:
+#         return await generate(user_ctx, recent_stats, on_day=on_day)
+#     except Exception:
+#         if days:
+#             raise
+#         logger.warning("Стрим плана не удался, повторяем без стрима", exc_info=True)
+#         return await generate(user_ctx, recent_stats)
+#
+#
 # def get_current_week_start():
 #     """Понедельник текущей недели"""
 #     now = datetime.now()
@@ -229,11 +259,14 @@ router = Router()
 #
 # async def generate_and_show_meal_plan(message: Message, user_ctx: dict):
 #     """Генерация и сохранение нового плана питания"""
-#     await message.answer("🤖 Составляю персональный план питания на неделю...\nЭто может занять до 30 секунд.")
+#     progress = LiveMessage(await message.answer("🤖 Составляю персональный план питания на неделю..."))
 #
 #     try:
 #         recent_stats = await get_recent_food_stats(message.from_user.id)
-#         ai_plan = await generate_meal_plan(user_ctx, recent_stats)
+#         ai_plan = await generate_plan_streamed(
+#             generate_meal_plan, user_ctx, recent_stats, progress, "план питания",
+#             lambda d: f"{sum(m.get('calories', 0) for m in d.get('meals', []))} ккал",
+#         )
 #
 #         week_start = get_current_week_start()
 #
@@ -274,6 +307,7 @@ router = Router()
 #
 #             await session.commit()
 #
+#             await progress.finish("✅ План питания на неделю готов!")
 #             today = datetime.now().weekday()
 #             await show_meal_plan_day(
 #                 message, plan.id, today,
@@ -282,7 +316,7 @@ router = Router()
 #
 #     except Exception as e:
 #         logger.exception("Ошибка генерации плана питания")
-#         await message.answer(
+#         await progress.finish(
 #             "❌ Не удалось сгенерировать план питания.\n\nПопробуй ещё раз позже."
 #         )
 #
@@ -347,11 +381,14 @@ router = Router()
 #
 # async def generate_and_show_workout_plan(message: Message, user_ctx: dict):
 #     """Генерация и сохранение нового плана тренировок"""
-#     await message.answer("🤖 Составляю персональный план тренировок на неделю...\nЭто может занять до 30 секунд.")
+#     progress = LiveMessage(await message.answer("🤖 Составляю персональный план тренировок на неделю..."))
 #
 #     try:
 #         recent_stats = await get_recent_workout_stats(message.from_user.id)
-#         ai_plan = await generate_workout_plan(user_ctx, recent_stats)
+#         ai_plan = await generate_plan_streamed(
+#             generate_workout_plan, user_ctx, recent_stats, progress, "план тренировок",
+#             lambda d: "отдых" if d.get('is_rest_day') else d.get('workout_type', 'Тренировка'),
+#         )
 #
 #         week_start = get_current_week_start()
 #
@@ -389,12 +426,13 @@ router = Router()
 #
 #             await session.commit()
 #
+#             await progress.finish("✅ План тренировок на неделю готов!")
 #             today = datetime.now().weekday()
 #             await show_workout_plan_day(message, plan.id, today)
 #
 #     except Exception as e:
 #         logger.exception("Ошибка генерации плана тренировок")
-#         await message.answer(
+#         await progress.finish(
 #             "❌ Не удалось сгенерировать план тренировок.\n\nПопробуй ещё раз позже."
 #         )
 #
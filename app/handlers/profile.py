@@ -1,10 +1,15 @@
+import re
+from datetime import datetime
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
 from aiogram import Router, F
 from aiogram.types import Message
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
 from aiogram.fsm.context import FSMContext
-from sqlalchemy import select
-
-from database.database import async_session, User
+from database.database import async_session, User, DEFAULT_TIMEZONE
+from database.queries import get_user_by_telegram_id
+from database.stats_cache import invalidate_stats
+from database.user_cache import get_cached_user, invalidate_user
 from keyboards.reply import get_main_menu
 
 router = Router()
@@ -15,66 +20,127 @@ router = Router()
 async def show_profile(message: Message, state: FSMContext):
     """Показать профиль пользователя"""
     await state.clear()
-    async with async_session() as session:
-        result = await session.execute(
-            select(User).where(User.telegram_id == message.from_user.id)
+    user = await get_cached_user(message.from_user.id)
+    if not user or not user.age:
+        await message.answer(
+            "У тебя еще не настроен профиль.\n"
+            "Используй команду /start для настройки!",
+            reply_markup=get_main_menu()
+        )
+        return
+
+    # Рассчитываем ИМТ
+    height_m = user.height / 100
+    bmi = user.weight / (height_m ** 2)
+
+    # Определяем категорию ИМТ
+    if bmi < 18.5:
+        bmi_category = "Недостаточный вес"
+        bmi_emoji = "⚠️"
+    elif 18.5 <= bmi < 25:
+        bmi_category = "Нормальный вес"
+        bmi_emoji = "✅"
+    elif 25 <= bmi < 30:
+        bmi_category = "Избыточный вес"
+        bmi_emoji = "⚠️"
+    else:
+        bmi_category = "Ожирение"
+        bmi_emoji = "❗"
+
+    gender_text = "Мужской" if user.gender == "male" else "Женский"
+
+    activity_text = {
+        'sedentary': 'Минимальный',
+        'light': 'Легкий',
+        'moderate': 'Средний',
+        'active': 'Высокий',
+        'very_active': 'Экстремальный'
+    }
+
+    goal_text = {
+        'lose_weight': 'Похудение 📉',
+        'maintain': 'Поддержание веса ➡️',
+        'gain_weight': 'Набор массы 📈'
+    }
+
+    profile_text = (
+        f"👤 <b>Твой профиль</b>\n\n"
+        f"Имя: <b>{user.full_name or 'Не указано'}</b>\n"
+        f"Возраст: <b>{user.age}</b> лет\n"
+        f"Пол: <b>{gender_text}</b>\n"
+        f"Рост: <b>{user.height}</b> см\n"
+        f"Вес: <b>{user.weight}</b> кг\n\n"
+        f"{bmi_emoji} ИМТ: <b>{bmi:.1f}</b> ({bmi_category})\n\n"
+        f"Активность: <b>{activity_text.get(user.activity_level, 'Не указано')}</b>\n"
+        f"Цель: <b>{goal_text.get(user.goal, 'Не указана')}</b>\n\n"
+        f"🎯 Целевая калорийность: <b>{user.daily_calorie_target}</b> ккал/день\n\n"
+        f"<i>Для изменения профиля используй /start</i>"
+    )
+
+    await message.answer(profile_text, reply_markup=get_main_menu())
+
+
+def parse_timezone(value: str):
+    """IANA-имя (Europe/Moscow) или смещение UTC+3; None — не распознано"""
+    value = value.strip()
+    offset = re.fullmatch(r'(?:UTC|GMT)?\s*([+-])\s*(\d{1,2})', value, re.IGNORECASE)
+    if offset:
+        hours = int(offset.group(2))
+        if hours > 14:
+            return None
+        # В базе IANA знак Etc/GMT обратный: UTC+3 — это Etc/GMT-3
+        sign = '-' if offset.group(1) == '+' else '+'
+        value = f"Etc/GMT{sign}{hours}" if hours else 'UTC'
+    if not value or len(value) > User.timezone.type.length:
+        return None
+    try:
+        ZoneInfo(value)
+    except (ZoneInfoNotFoundError, ValueError, OSError):
+        # OSError: «Europe» — каталог в базе tzdata, слишком длинное имя — ENAMETOOLONG
+        return None
+    return value
+
+
+@router.message(Command("timezone"))
+async def cmd_timezone(message: Message, command: CommandObject, state: FSMContext):
+    """Показать или сменить часовой пояс"""
+    await state.clear()
+    user = await get_cached_user(message.from_user.id)
+    if not user:
+        await message.answer("Сначала настрой профиль командой /start")
+        return
+
+    if not command.args:
+        tz_name = user.timezone or DEFAULT_TIMEZONE
+        now = datetime.now(ZoneInfo(tz_name))
+        await message.answer(
+            f"🕒 Часовой пояс: <b>{tz_name}</b>\n"
+            f"Сейчас у тебя: <b>{now.strftime('%d.%m.%Y %H:%M')}</b>\n\n"
+            f"Чтобы сменить: <code>/timezone Europe/Moscow</code> или <code>/timezone UTC+3</code>",
+            reply_markup=get_main_menu()
         )
-        user = result.scalar_one_or_none()
-
-        if not user or not user.age:
-            await message.answer(
-                "У тебя еще не настроен профиль.\n"
-                "Используй команду /start для настройки!",
-                reply_markup=get_main_menu()
-            )
-            return
-
-        # Рассчитываем ИМТ
-        height_m = user.height / 100
-        bmi = user.weight / (height_m ** 2)
-
-        # Определяем категорию ИМТ
-        if bmi < 18.5:
-            bmi_category = "Недостаточный вес"
-            bmi_emoji = "⚠️"
-        elif 18.5 <= bmi < 25:
-            bmi_category = "Нормальный вес"
-            bmi_emoji = "✅"
-        elif 25 <= bmi < 30:
-            bmi_category = "Избыточный вес"
-            bmi_emoji = "⚠️"
-        else:
-            bmi_category = "Ожирение"
-            bmi_emoji = "❗"
-
-        gender_text = "Мужской" if user.gender == "male" else "Женский"
-
-        activity_text = {
-            'sedentary': 'Минимальный',
-            'light': 'Легкий',
-            'moderate': 'Средний',
-            'active': 'Высокий',
-            'very_active': 'Экстремальный'
-        }
-
-        goal_text = {
-            'lose_weight': 'Похудение 📉',
-            'maintain': 'Поддержание веса ➡️',
-            'gain_weight': 'Набор массы 📈'
-        }
-
-        profile_text = (
-            f"👤 <b>Твой профиль</b>\n\n"
-            f"Имя: <b>{user.full_name or 'Не указано'}</b>\n"
-            f"Возраст: <b>{user.age}</b> лет\n"
-            f"Пол: <b>{gender_text}</b>\n"
-            f"Рост: <b>{user.height}</b> см\n"
-            f"Вес: <b>{user.weight}</b> кг\n\n"
-            f"{bmi_emoji} ИМТ: <b>{bmi:.1f}</b> ({bmi_category})\n\n"
-            f"Активность: <b>{activity_text.get(user.activity_level, 'Не указано')}</b>\n"
-            f"Цель: <b>{goal_text.get(user.goal, 'Не указана')}</b>\n\n"
-            f"🎯 Целевая калорийность: <b>{user.daily_calorie_target}</b> ккал/день\n\n"
-            f"<i>Для изменения профиля используй /start</i>"
+        return
+
+    tz_name = parse_timezone(command.args)
+    if not tz_name:
+        await message.answer(
+            "Не знаю такой часовой пояс 🤔\n"
+            "Примеры: <code>/timezone Europe/Moscow</code>, <code>/timezone Asia/Almaty</code>, "
+            "<code>/timezone UTC+5</code>"
         )
+        return
+
+    async with async_session() as session:
+        db_user = await get_user_by_telegram_id(session, message.from_user.id)
+        db_user.timezone = tz_name
+        await session.commit()
+    invalidate_user(message.from_user.id)
+    invalidate_stats(message.from_user.id)
 
-        await message.answer(profile_text, reply_markup=get_main_menu())
+    now = datetime.now(ZoneInfo(tz_name))
+    await message.answer(
+        f"✅ Часовой пояс: <b>{tz_name}</b>\n"
+        f"Сейчас у тебя: <b>{now.strftime('%d.%m.%Y %H:%M')}</b>\n\n"
+        f"Новые записи попадут в день по этому времени.",
+        reply_markup=get_main_menu()
+    )
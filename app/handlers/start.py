@@ -3,18 +3,23 @@ from aiogram.filters import CommandStart, Command
 from aiogram.types import Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from sqlalchemy import select, delete
-from datetime import datetime, timedelta
+from sqlalchemy import select
+from datetime import datetime
 import asyncio
 import os
 import logging
 
-from sqlalchemy import func as sa_func
-from database.database import (
-    async_session, User, CalorieEntry, WorkoutEntry, WeightLog,
-    HealthData, AIInteraction, MealPlan, MealPlanItem,
-    WorkoutPlan, WorkoutPlanItem, calc_today_start,
-)
+from database.database import async_session, engine, User, calc_today_start
+from database.pool import pool_stats
+from database.queries import get_user_by_telegram_id
+from database.replica import read_session, replica_stats
+from database.reports import get_usage_report, get_user_report, REPORTS_REFRESH_INTERVAL
+from database.food_cache import food_cache_stats
+from database.stats_cache import stats_cache, invalidate_stats
+from database.user_cache import user_cache, invalidate_user
+from database.activity import activity_stats
+from database.ai_log import ai_log_stats
+from database.account_deletion import schedule_account_deletion, is_deletion_pending
 from keyboards.reply import (
     get_main_menu,
     get_agreement_keyboard,
@@ -24,6 +29,9 @@ from keyboards.reply import (
     get_delete_confirm_keyboard,
     not_menu_button,
 )
+from utils.ai_resilience import resilience_stats
+from utils.ai_scheduler import scheduler_stats
+from utils.openai_helper import coalesce_stats
 
 router = Router()
 
@@ -67,10 +75,7 @@ async def cmd_start(message: Message, state: FSMContext):
     await state.clear()
 
     async with async_session() as session:
-        result = await session.execute(
-            select(User).where(User.telegram_id == message.from_user.id)
-        )
-        user = result.scalar_one_or_none()
+        user = await get_user_by_telegram_id(session, message.from_user.id)
 
         if user and user.daily_calorie_target:
             # Профиль уже настроен
@@ -91,6 +96,7 @@ async def cmd_start(message: Message, state: FSMContext):
                 user.activity_level, user.goal
             )
             await session.commit()
+            invalidate_user(message.from_user.id)
 
             name = user.full_name or message.from_user.first_name
             await message.answer(
@@ -110,6 +116,7 @@ async def cmd_start(message: Message, state: FSMContext):
                 )
                 session.add(new_user)
                 await session.commit()
+                invalidate_user(message.from_user.id)
 
             await message.answer(
                 f"Привет, {message.from_user.first_name}! 👋\n\n"
@@ -286,10 +293,7 @@ async def process_goal(callback: CallbackQuery, state: FSMContext):
 
     # Сохраняем в БД
     async with async_session() as session:
-        result = await session.execute(
-            select(User).where(User.telegram_id == callback.from_user.id)
-        )
-        user = result.scalar_one()
+        user = await get_user_by_telegram_id(session, callback.from_user.id)
 
         user.full_name = data.get('name', user.full_name)
         user.age = data['age']
@@ -301,6 +305,7 @@ async def process_goal(callback: CallbackQuery, state: FSMContext):
         user.daily_calorie_target = daily_calories
 
         await session.commit()
+    invalidate_user(callback.from_user.id)
 
     goal_text = {
         'lose_weight': 'Похудение',
@@ -364,6 +369,9 @@ async def cmd_help(message: Message, state: FSMContext):
         "/start — начать работу / перенастроить профиль\n"
         "/help — показать эту справку\n"
         "/new_day — начать новый день с нуля\n"
+        "/timezone — часовой пояс (когда начинается новый день)\n"
+        "/export — выгрузить историю (CSV, или /export json)\n"
+        "/advice вопрос — персональная рекомендация от AI\n"
         "/delete_account — удалить аккаунт и все данные\n\n"
         "<b>Документы:</b>\n"
         "📋 <a href=\"https://telegra.ph/Polzovatelskoe-soglashenie-dlya-Telegram-bota-FitBud-02-09\">Пользовательское соглашение</a>\n"
@@ -381,10 +389,7 @@ async def cmd_new_day(message: Message, state: FSMContext):
     await state.clear()
 
     async with async_session() as session:
-        result = await session.execute(
-            select(User).where(User.telegram_id == message.from_user.id)
-        )
-        user = result.scalar_one_or_none()
+        user = await get_user_by_telegram_id(session, message.from_user.id)
 
         if not user:
             await message.answer("Сначала настрой профиль командой /start")
@@ -392,6 +397,8 @@ async def cmd_new_day(message: Message, state: FSMContext):
 
         user.current_day_start = datetime.now()
         await session.commit()
+        invalidate_user(message.from_user.id)
+        invalidate_stats(message.from_user.id)
 
         target = user.daily_calorie_target or 2000
 
@@ -424,28 +431,41 @@ async def cmd_delete_account(message: Message, state: FSMContext):
     )
 
 
+async def notify_account_deleted(bot, telegram_id: int):
+    """Сообщение по завершении фонового удаления аккаунта"""
+    await bot.send_message(
+        telegram_id,
+        "✅ <b>Аккаунт удалён</b>\n\n"
+        "Все твои данные были удалены.\n"
+        "Чтобы начать заново, используй /start"
+    )
+
+
+async def deletion_guard(handler, event, data):
+    """Outer-middleware: пока аккаунт удаляется, хэндлеры пользователю не отвечают"""
+    user = data.get('event_from_user')
+    if user is None or not is_deletion_pending(user.id):
+        return await handler(event, data)
+    text = "⏳ Аккаунт ещё удаляется. Пришлю сообщение, когда можно будет начать заново."
+    if isinstance(event, CallbackQuery):
+        await event.answer(text, show_alert=True)
+    elif isinstance(event, Message):
+        await event.answer(text)
+
+
 @router.callback_query(F.data == "confirm_delete_account")
 async def process_delete_account(callback: CallbackQuery, state: FSMContext):
-    """Подтверждение удаления аккаунта"""
+    """Подтверждение удаления аккаунта (данные удаляются в фоне)"""
     user_id = callback.from_user.id
+    bot = callback.bot
 
-    async with async_session() as session:
-        await session.execute(delete(MealPlanItem).where(MealPlanItem.user_id == user_id))
-        await session.execute(delete(MealPlan).where(MealPlan.user_id == user_id))
-        await session.execute(delete(WorkoutPlanItem).where(WorkoutPlanItem.user_id == user_id))
-        await session.execute(delete(WorkoutPlan).where(WorkoutPlan.user_id == user_id))
-        await session.execute(delete(CalorieEntry).where(CalorieEntry.user_id == user_id))
-        await session.execute(delete(WorkoutEntry).where(WorkoutEntry.user_id == user_id))
-        await session.execute(delete(WeightLog).where(WeightLog.user_id == user_id))
-        await session.execute(delete(HealthData).where(HealthData.user_id == user_id))
-        await session.execute(delete(AIInteraction).where(AIInteraction.user_id == user_id))
-        await session.execute(delete(User).where(User.telegram_id == user_id))
-        await session.commit()
+    await schedule_account_deletion(
+        user_id, on_done=lambda telegram_id: notify_account_deleted(bot, telegram_id)
+    )
 
     await callback.message.edit_text(
-        "✅ <b>Аккаунт удалён</b>\n\n"
-        "Все твои данные были удалены.\n"
-        "Чтобы начать заново, используй /start"
+        "⏳ <b>Удаляем аккаунт...</b>\n\n"
+        "Пришлю сообщение, как только все данные будут удалены."
     )
     await state.clear()
     await callback.answer()
@@ -517,42 +537,8 @@ async def cmd_balance(message: Message, state: FSMContext):
     if message.from_user.id != ADMIN_ID:
         return
 
-    today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-    week_ago = datetime.now() - timedelta(days=7)
-
-    async with async_session() as session:
-        # Общая статистика по токенам, сгруппированная по модели
-        model_stats = await session.execute(
-            select(
-                AIInteraction.ai_model,
-                sa_func.count(AIInteraction.id),
-                sa_func.sum(AIInteraction.prompt_tokens),
-                sa_func.sum(AIInteraction.completion_tokens),
-                sa_func.sum(AIInteraction.total_tokens),
-            )
-            .group_by(AIInteraction.ai_model)
-        )
-        models = model_stats.all()
-
-        # Запросов за сегодня
-        today_count = await session.execute(
-            select(sa_func.count(AIInteraction.id))
-            .where(AIInteraction.created_at >= today_start)
-        )
-        today_total = today_count.scalar() or 0
-
-        # Запросов за неделю
-        week_count = await session.execute(
-            select(sa_func.count(AIInteraction.id))
-            .where(AIInteraction.created_at >= week_ago)
-        )
-        week_total = week_count.scalar() or 0
-
-        # Всего запросов
-        all_count = await session.execute(
-            select(sa_func.count(AIInteraction.id))
-        )
-        all_total = all_count.scalar() or 0
+    async with read_session() as session:
+        report = await get_usage_report(session, days=7)
 
     # Приблизительные цены за 1M токенов
     PRICES = {
@@ -563,14 +549,14 @@ async def cmd_balance(message: Message, state: FSMContext):
 
     text = (
         "💰 <b>Расход токенов OpenAI</b>\n\n"
-        f"📊 Запросов: сегодня <b>{today_total}</b> | "
-        f"за неделю <b>{week_total}</b> | всего <b>{all_total}</b>\n\n"
+        f"📊 Запросов: сегодня <b>{report['today']}</b> | "
+        f"за неделю <b>{report['period']}</b> | всего <b>{report['all']}</b>\n\n"
     )
 
     grand_prompt = grand_completion = grand_total = 0
     estimated_cost = 0.0
 
-    for model, count, prompt_tk, compl_tk, total_tk in models:
+    for model, count, prompt_tk, compl_tk, total_tk in report['by_model']:
         prompt_tk = prompt_tk or 0
         compl_tk = compl_tk or 0
         total_tk = total_tk or 0
@@ -589,6 +575,18 @@ async def cmd_balance(message: Message, state: FSMContext):
             f"  ~${cost:.4f}\n\n"
         )
 
+    if report['by_type']:
+        text += "<b>По типам за неделю:</b>\n"
+        for kind, count, _, _, total_tk in report['by_type']:
+            text += f"  {kind}: {count} запросов, {total_tk or 0:,} токенов\n"
+        text += "\n"
+
+    if report['by_day']:
+        text += "<b>По дням:</b>\n"
+        for day, count, _, _, total_tk in report['by_day']:
+            text += f"  {day.strftime('%d.%m')}: {count} запросов, {total_tk or 0:,} токенов\n"
+        text += "\n"
+
     text += (
         f"<b>Итого токенов:</b> {grand_total:,}\n"
         f"<b>Примерная стоимость:</b> ~${estimated_cost:.4f}\n\n"
@@ -606,43 +604,113 @@ async def cmd_users(message: Message, state: FSMContext):
     if message.from_user.id != ADMIN_ID:
         return
 
-    week_ago = datetime.now() - timedelta(days=7)
+    async with read_session() as session:
+        report = await get_user_report(session, days=7)
 
-    async with async_session() as session:
-        # Всего зарегистрированных
-        total_result = await session.execute(
-            select(sa_func.count(User.id))
-        )
-        total_users = total_result.scalar() or 0
+    text = (
+        "👥 <b>Статистика пользователей</b>\n\n"
+        f"Всего зарегистрировано: <b>{report['total']}</b>\n"
+        f"С заполненным профилем: <b>{report['with_profile']}</b>\n"
+        f"Активных за неделю: <b>{report['active']}</b>\n"
+        f"Новых за неделю: <b>{report['new']}</b>\n\n"
+    )
 
-        # Активных за неделю (есть last_active_at >= week_ago)
-        active_result = await session.execute(
-            select(sa_func.count(User.id))
-            .where(User.last_active_at >= week_ago)
-        )
-        active_users = active_result.scalar() or 0
+    if report['by_day']:
+        text += "<b>По дням</b> (новые / последняя активность):\n"
+        for row in report['by_day']:
+            text += f"  {row.day.strftime('%d.%m')}: {row.new_users} / {row.last_active}\n"
+        text += "\n"
 
-        # С заполненным профилем
-        profile_result = await session.execute(
-            select(sa_func.count(User.id))
-            .where(User.daily_calorie_target.isnot(None))
-        )
-        profile_users = profile_result.scalar() or 0
+    text += (
+        "<i>Активность определяется по последнему взаимодействию с ботом. "
+        f"Данные обновляются раз в {int(REPORTS_REFRESH_INTERVAL // 60)} мин.</i>"
+    )
 
-        # Новых за неделю
-        new_result = await session.execute(
-            select(sa_func.count(User.id))
-            .where(User.created_at >= week_ago)
-        )
-        new_users = new_result.scalar() or 0
+    await message.answer(text)
 
-    text = (
-        "👥 <b>Статистика пользователей</b>\n\n"
-        f"Всего зарегистрировано: <b>{total_users}</b>\n"
-        f"С заполненным профилем: <b>{profile_users}</b>\n"
-        f"Активных за неделю: <b>{active_users}</b>\n"
-        f"Новых за неделю: <b>{new_users}</b>\n\n"
-        "<i>Активность определяется по последнему взаимодействию с ботом</i>"
+
+# --- Метрики процесса (только для админа) ---
+
+def _format_cache_stats(title: str, stats: dict) -> str:
+    return (
+        f"<b>{title}</b>: {stats['size']} / {stats['maxsize']}\n"
+        f"  попаданий: {stats['hits']} | промахов: {stats['misses']} | "
+        f"hit rate: {stats['hit_rate']:.0%} | вытеснено: {stats['evictions']}\n"
+    )
+
+
+@router.message(Command("metrics"))
+async def cmd_metrics(message: Message, state: FSMContext):
+    """Показать внутренние метрики бота"""
+    if message.from_user.id != ADMIN_ID:
+        return
+
+    text = "📟 <b>Метрики процесса</b>\n\n"
+    text += _format_cache_stats("Кэш профилей", user_cache.stats())
+    text += _format_cache_stats("Кэш статистики", stats_cache.stats())
+    food = food_cache_stats()
+    text += _format_cache_stats("Кэш анализа еды", food)
+    text += (
+        f"  из БД: {food['db_hits']} | запросов к AI: {food['ai_calls']} | "
+        f"сохранено: {food['stored']} | ошибок: {food['errors']}\n"
+    )
+
+    coalesce = coalesce_stats()
+    text += (
+        f"<b>Склейка запросов AI</b>: вызовов {coalesce['calls']} | "
+        f"сэкономлено запросов {coalesce['saved']} | в полёте {coalesce['inflight']}\n"
     )
 
+    ai = scheduler_stats()
+    text += (
+        f"<b>Планировщик OpenAI</b>: выполняется {ai['inflight']} / {ai['max_inflight']} | "
+        f"в очереди {ai['queued']['interactive']} интерактивных, {ai['queued']['background']} фоновых\n"
+        f"  запущено: {ai['started']} | ожидание: ср. {ai['avg_wait_ms']:.0f} мс, "
+        f"макс. {ai['max_wait_ms']:.0f} мс | упёрлись в RPM/TPM: {ai['throttled']}\n"
+        f"  токены: оценка {ai['estimated_tokens']} / факт {ai['actual_tokens']} | "
+        f"запас RPM {ai['rpm_left']:.0f}, TPM {ai['tpm_left']:.0f}\n"
+    )
+
+    resilience = resilience_stats()
+    text += (
+        f"<b>Устойчивость OpenAI</b>: breaker {resilience['breaker']} "
+        f"(открывался {resilience['breaker_opened']}) | вызовов {resilience['calls']} | "
+        f"повторов {resilience['retries']}\n"
+        f"  отказов {resilience['failures']}, быстрых отказов {resilience['fast_failures']}, "
+        f"по дедлайну {resilience['deadline_exceeded']} | хеджей {resilience['hedged']} "
+        f"(выиграли {resilience['hedge_wins']})\n"
+    )
+
+    activity = activity_stats()
+    text += (
+        f"<b>last_active_at</b>: в очереди {activity['pending']} | "
+        f"записано {activity['flushed']} за {activity['flushes']} сбросов | "
+        f"ошибок {activity['errors']}\n"
+    )
+
+    ai_log = ai_log_stats()
+    text += (
+        f"<b>Журнал AI</b>: в очереди {ai_log['pending']} | записано {ai_log['written']} "
+        f"за {ai_log['batches']} пачек | ожиданий очереди {ai_log['backpressure']} | "
+        f"ошибок {ai_log['errors']} | отброшено {ai_log['dropped']}\n"
+    )
+
+    pool = pool_stats(engine)
+    text += (
+        f"<b>Пул БД</b>: занято {pool['checked_out']} / {pool['size']} "
+        f"(+{pool['overflow']} overflow), свободно {pool['checked_in']}\n"
+        f"  выдач: {pool['checkouts']} | таймаутов: {pool['timeouts']}\n"
+        f"  ожидание: ср. {pool['avg_wait_ms']:.1f} мс, макс. {pool['max_wait_ms']:.1f} мс\n"
+        f"  удержание: ср. {pool['avg_hold_ms']:.1f} мс, макс. {pool['max_hold_ms']:.1f} мс\n"
+    )
+
+    replica = replica_stats()
+    if replica['configured']:
+        lag = f"{replica['lag']:.1f} с" if replica['lag'] is not None else "—"
+        text += (
+            f"<b>Реплика</b>: {'доступна' if replica['healthy'] else 'недоступна'}, отставание {lag}\n"
+            f"  чтений: реплика {replica['replica_reads']} | основная {replica['primary_reads']} | "
+            f"переключений {replica['fallbacks']}\n"
+        )
+
     await message.answer(text)
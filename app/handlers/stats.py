@@ -2,10 +2,12 @@ from aiogram import Router, F
 from aiogram.types import Message
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from sqlalchemy import select, func, cast, Date
-from datetime import datetime, timedelta
+from sqlalchemy import select
 
-from database.database import async_session, CalorieEntry, WorkoutEntry, WeightLog, User, calc_today_start
+from database.database import async_session, WeightLog
+from database.queries import get_user_by_telegram_id
+from database.stats_cache import get_cached_stats, invalidate_stats
+from database.user_cache import get_cached_user, invalidate_user
 from keyboards.reply import get_main_menu, not_menu_button
 
 router = Router()
@@ -20,139 +22,65 @@ class AddWeight(StatesGroup):
 async def show_statistics(message: Message, state: FSMContext):
     """Показать статистику пользователя"""
     await state.clear()
-    async with async_session() as session:
-        # Получаем данные пользователя для /new_day и целевой калорийности
-        user_result = await session.execute(
-            select(User).where(User.telegram_id == message.from_user.id)
-        )
-        user = user_result.scalar_one_or_none()
-        today_start = calc_today_start(user.current_day_start if user else None)
-        week_ago = datetime.now() - timedelta(days=7)
-        month_ago = datetime.now() - timedelta(days=30)
-
-        # Статистика по калориям за сегодня
-        cal_today = await session.execute(
-            select(func.sum(CalorieEntry.calories))
-            .where(CalorieEntry.user_id == message.from_user.id)
-            .where(CalorieEntry.created_at >= today_start)
-        )
-        calories_today = cal_today.scalar() or 0
-
-        # Статистика по калориям за неделю (без воды)
-        cal_week_count = await session.execute(
-            select(func.count(CalorieEntry.id))
-            .where(CalorieEntry.user_id == message.from_user.id)
-            .where(CalorieEntry.created_at >= week_ago)
-            .where(CalorieEntry.meal_type != 'water')
-        )
-        meals_week = cal_week_count.scalar() or 0
-
-        # Средняя калорийность за день (только дни с записями, без воды)
-        daily_sums = (
-            select(
-                func.sum(CalorieEntry.calories).label('daily_total')
-            )
-            .where(CalorieEntry.user_id == message.from_user.id)
-            .where(CalorieEntry.created_at >= week_ago)
-            .where(CalorieEntry.meal_type != 'water')
-            .group_by(cast(CalorieEntry.created_at, Date))
-            .subquery()
-        )
-        avg_result = await session.execute(
-            select(func.avg(daily_sums.c.daily_total))
-        )
-        avg_week = int(avg_result.scalar() or 0)
-
-        # Статистика по тренировкам за неделю
-        workout_week = await session.execute(
-            select(
-                func.count(WorkoutEntry.id),
-                func.sum(WorkoutEntry.duration),
-                func.sum(WorkoutEntry.calories_burned)
-            )
-            .where(WorkoutEntry.user_id == message.from_user.id)
-            .where(WorkoutEntry.created_at >= week_ago)
-        )
-        workouts_week, duration_week, burned_week = workout_week.one()
-        workouts_week = workouts_week or 0
-        duration_week = duration_week or 0
-        burned_week = burned_week or 0
-
-        # Статистика по тренировкам за месяц
-        workout_month = await session.execute(
-            select(
-                func.count(WorkoutEntry.id),
-                func.sum(WorkoutEntry.duration)
-            )
-            .where(WorkoutEntry.user_id == message.from_user.id)
-            .where(WorkoutEntry.created_at >= month_ago)
-        )
-        workouts_month, duration_month = workout_month.one()
-        workouts_month = workouts_month or 0
-        duration_month = duration_month or 0
-
-        # Стаканы воды за сегодня
-        water_today_result = await session.execute(
-            select(func.count(CalorieEntry.id))
-            .where(CalorieEntry.user_id == message.from_user.id)
-            .where(CalorieEntry.meal_type == 'water')
-            .where(CalorieEntry.created_at >= today_start)
-        )
-        water_today = water_today_result.scalar() or 0
-
-        # Целевая калорийность (уже получили user выше)
-        target = user.daily_calorie_target if user and user.daily_calorie_target else 2000
-
-        # Прогресс по весу
-        weight_logs = await session.execute(
-            select(WeightLog.weight, WeightLog.created_at)
-            .where(WeightLog.user_id == message.from_user.id)
-            .order_by(WeightLog.created_at.desc())
-            .limit(2)
-        )
-        weight_data = weight_logs.all()
-
-        weight_progress = ""
-        if len(weight_data) >= 2:
-            current_weight = weight_data[0][0]
-            previous_weight = weight_data[1][0]
-            weight_diff = current_weight - previous_weight
-            if weight_diff > 0:
-                weight_progress = f"\n📊 Вес: {current_weight} кг (+{weight_diff:.1f} кг)"
-            elif weight_diff < 0:
-                weight_progress = f"\n📊 Вес: {current_weight} кг ({weight_diff:.1f} кг)"
-            else:
-                weight_progress = f"\n📊 Вес: {current_weight} кг (без изменений)"
-        elif len(weight_data) == 1:
-            weight_progress = f"\n📊 Вес: {weight_data[0][0]} кг"
+    # Получаем данные пользователя для /new_day и целевой калорийности
+    user = await get_cached_user(message.from_user.id)
+    # Сегодня, неделя, месяц и последние веса — из кэша или одним запросом
+    stats = await get_cached_stats(message.from_user.id, user)
+    calories_today = stats['today_calories']
+    water_today = stats['today_water_ml']
+    meals_week = stats['week_meals']
+    avg_week = stats['week_avg_calories']
+    workouts_week = stats['week_workouts']
+    duration_week = stats['week_workout_minutes']
+    burned_week = stats['week_burned_calories']
+    workouts_month = stats['month_workouts']
+    duration_month = stats['month_workout_minutes']
+    weight_data = stats['last_weights']
+
+    # Целевая калорийность (уже получили user выше)
+    target = user.daily_calorie_target if user and user.daily_calorie_target else 2000
+
+    weight_progress = ""
+    if len(weight_data) >= 2:
+        current_weight = weight_data[0]
+        previous_weight = weight_data[1]
+        weight_diff = current_weight - previous_weight
+        if weight_diff > 0:
+            weight_progress = f"\n📊 Вес: {current_weight} кг (+{weight_diff:.1f} кг)"
+        elif weight_diff < 0:
+            weight_progress = f"\n📊 Вес: {current_weight} кг ({weight_diff:.1f} кг)"
+        else:
+            weight_progress = f"\n📊 Вес: {current_weight} кг (без изменений)"
+    elif len(weight_data) == 1:
+        weight_progress = f"\n📊 Вес: {weight_data[0]} кг"
+
+    # Формируем сообщение
+    remaining = target - calories_today
+    progress_percent = min(100, int((calories_today / target) * 100))
+    progress_bar = "█" * (progress_percent // 10) + "░" * (10 - progress_percent // 10)
+
+    stats_text = (
+        f"📊 <b>Твоя статистика</b>\n\n"
+        f"<b>📅 Сегодня:</b>\n"
+        f"{progress_bar} {progress_percent}%\n"
+        f"Калории: <b>{calories_today}</b> / {target} ккал\n"
+        f"Осталось: <b>{remaining}</b> ккал\n"
+        f"💧 Вода: <b>{water_today}</b> / 2000 мл\n\n"
+        f"<b>📆 За неделю:</b>\n"
+        f"Приемов пищи: <b>{meals_week}</b>\n"
+        f"Средняя калорийность: <b>{avg_week}</b> ккал/день\n"
+        f"Тренировок: <b>{workouts_week}</b>\n"
+        f"Время тренировок: <b>{duration_week}</b> мин\n"
+        f"Сожжено калорий: <b>~{burned_week}</b> ккал\n\n"
+        f"<b>📈 За месяц:</b>\n"
+        f"Тренировок: <b>{workouts_month}</b>\n"
+        f"Время тренировок: <b>{duration_month}</b> мин"
+    )
 
-        # Формируем сообщение
-        remaining = target - calories_today
-        progress_percent = min(100, int((calories_today / target) * 100))
-        progress_bar = "█" * (progress_percent // 10) + "░" * (10 - progress_percent // 10)
-
-        stats_text = (
-            f"📊 <b>Твоя статистика</b>\n\n"
-            f"<b>📅 Сегодня:</b>\n"
-            f"{progress_bar} {progress_percent}%\n"
-            f"Калории: <b>{calories_today}</b> / {target} ккал\n"
-            f"Осталось: <b>{remaining}</b> ккал\n"
-            f"💧 Вода: <b>{water_today}</b> / 8 стаканов\n\n"
-            f"<b>📆 За неделю:</b>\n"
-            f"Приемов пищи: <b>{meals_week}</b>\n"
-            f"Средняя калорийность: <b>{avg_week}</b> ккал/день\n"
-            f"Тренировок: <b>{workouts_week}</b>\n"
-            f"Время тренировок: <b>{duration_week}</b> мин\n"
-            f"Сожжено калорий: <b>~{burned_week}</b> ккал\n\n"
-            f"<b>📈 За месяц:</b>\n"
-            f"Тренировок: <b>{workouts_month}</b>\n"
-            f"Время тренировок: <b>{duration_month}</b> мин"
-        )
-
-        if weight_progress:
-            stats_text += f"\n{weight_progress}"
-
-        await message.answer(stats_text, reply_markup=get_main_menu())
+    if weight_progress:
+        stats_text += f"\n{weight_progress}"
+
+    await message.answer(stats_text, reply_markup=get_main_menu())
 
 
 @router.message(F.text == "⚖️ Записать вес")
@@ -184,10 +112,7 @@ async def process_weight(message: Message, state: FSMContext):
             session.add(weight_log)
 
             # Обновляем вес в профиле
-            user_result = await session.execute(
-                select(User).where(User.telegram_id == message.from_user.id)
-            )
-            user = user_result.scalar_one_or_none()
+            user = await get_user_by_telegram_id(session, message.from_user.id)
 
             old_weight = None
             weight_history = []
@@ -205,6 +130,8 @@ async def process_weight(message: Message, state: FSMContext):
                 weight_history = prev_weights.all()
 
             await session.commit()
+        invalidate_user(message.from_user.id)
+        invalidate_stats(message.from_user.id)
 
         # Формируем сообщение
         response = f"✅ Вес записан: <b>{weight} кг</b>\n\n"
@@ -1,3 +1,8 @@
+import time
+
+# Точка отсчёта для измерения холодного старта (до импорта тяжёлых модулей)
+STARTED_AT = time.perf_counter()
+
 import asyncio
 import logging
 from aiogram import Bot, Dispatcher
@@ -7,7 +12,11 @@ from dotenv import load_dotenv
 import os
 
 from database.database import init_db
-from handlers import start, calories, fitness, profile, stats, plans, ai_hub
+from database.activity import start_activity_writer, stop_activity_writer
+from database.account_deletion import resume_account_deletions, wait_account_deletions
+from database.ai_log import start_ai_log_writer, stop_ai_log_writer
+from database.reports import start_reports_refresher, stop_reports_refresher
+from handlers import start, calories, fitness, profile, stats, export, plans, ai_hub
 
 # Загружаем переменные окружения
 load_dotenv()
@@ -30,6 +39,9 @@ async def main():
     
     # Инициализация диспетчера
     dp = Dispatcher()
+    # Пока аккаунт удаляется (в том числе после рестарта), обычные хэндлеры не работают
+    dp.message.outer_middleware(start.deletion_guard)
+    dp.callback_query.outer_middleware(start.deletion_guard)
     
     # Подключаем роутеры из handlers
     # Порядок важен: конкретные хэндлеры (кнопки меню, FSM-состояния) — первыми,
@@ -39,18 +51,37 @@ async def main():
     dp.include_router(fitness.router)
     dp.include_router(profile.router)
     dp.include_router(stats.router)
+    dp.include_router(export.router)
     dp.include_router(plans.router)
     dp.include_router(ai_hub.router)
     
-    # Инициализация базы данных
+    # Проверка схемы базы данных (миграции применяются до запуска бота)
+    db_check_started = time.perf_counter()
     await init_db()
+    db_check_ms = (time.perf_counter() - db_check_started) * 1000
+
+    # Фоновая запись last_active_at и журнала AI
+    start_activity_writer()
+    start_ai_log_writer()
+    # Периодическое обновление сводок для /users
+    start_reports_refresher()
+    # Удаления аккаунтов, прерванные прошлым перезапуском
+    await resume_account_deletions(lambda telegram_id: start.notify_account_deleted(bot, telegram_id))
     
     logger.info("Бот запущен v7 (meal plan, workout plan)")
+    logger.info(
+        f"Холодный старт: {(time.perf_counter() - STARTED_AT) * 1000:.0f} мс "
+        f"(проверка схемы БД: {db_check_ms:.0f} мс)"
+    )
     
     try:
         # Запуск бота
         await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
     finally:
+        await stop_reports_refresher()
+        await wait_account_deletions()
+        await stop_ai_log_writer()
+        await stop_activity_writer()
         await bot.session.close()
 
 
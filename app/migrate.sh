@@ -14,7 +14,8 @@ case "$COMMAND" in
     
     upgrade)
         echo "⬆️  Применение миграций к БД..."
-        docker compose exec bot alembic upgrade head
+        # Отдельный контейнер: бот на старой схеме не запускается, exec в него невозможен
+        docker compose run --rm bot migrate
         echo "✅ Миграции применены"
         ;;
     
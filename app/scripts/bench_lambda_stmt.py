@@ -0,0 +1,63 @@
+"""
+Микробенчмарк построения горячих запросов (без БД).
+
+Сравнивает накладные расходы на вызов для выборки дневной свёртки:
+- select(): построить выражение и вычислить ключ кэша компиляции
+- lambda_stmt(): то же через lambda (database.queries)
+- полная компиляция select() без кэша — то, что было бы без кэша вовсе
+
+    python -m scripts.bench_lambda_stmt [--number 20000]
+"""
+import argparse
+import timeit
+from datetime import date
+
+from sqlalchemy import select, lambda_stmt
+from sqlalchemy.dialects import postgresql
+
+from database.database import DailyUserTotal
+
+DIALECT = postgresql.asyncpg.dialect()
+
+
+def plain_select(user_id: int, day: date):
+    stmt = (
+        select(DailyUserTotal.calories, DailyUserTotal.water_ml, DailyUserTotal.meal_count)
+        .where(DailyUserTotal.user_id == user_id, DailyUserTotal.day == day)
+    )
+    return stmt._generate_cache_key()
+
+
+def lambda_select(user_id: int, day: date):
+    stmt = lambda_stmt(
+        lambda: select(DailyUserTotal.calories, DailyUserTotal.water_ml, DailyUserTotal.meal_count)
+        .where(DailyUserTotal.user_id == user_id, DailyUserTotal.day == day)
+    )
+    return stmt._generate_cache_key()
+
+
+def full_compile(user_id: int, day: date):
+    stmt = (
+        select(DailyUserTotal.calories, DailyUserTotal.water_ml, DailyUserTotal.meal_count)
+        .where(DailyUserTotal.user_id == user_id, DailyUserTotal.day == day)
+    )
+    return stmt.compile(dialect=DIALECT)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Микробенчмарк lambda_stmt")
+    parser.add_argument('--number', type=int, default=20000, help="вызовов на замер")
+    parser.add_argument('--repeat', type=int, default=5, help="замеров (берётся лучший)")
+    args = parser.parse_args()
+
+    today = date.today()
+    for name, fn in (('select + cache key', plain_select),
+                     ('lambda_stmt + cache key', lambda_select),
+                     ('full compile, no cache', full_compile)):
+        fn(1, today)  # прогрев: lambda_stmt анализирует lambda при первом вызове
+        best = min(timeit.repeat(lambda: fn(1, today), number=args.number, repeat=args.repeat))
+        print(f"{name:<26} {best / args.number * 1e6:8.1f} мкс/вызов")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Задержка экрана статистики: один запрос против прежних последовательных.
+
+- snapshot: get_stats_snapshot() — STATS_SQL, один проход к БД
+- sequential: сегодня, неделя, месяц и два последних веса четырьмя запросами
+  подряд (как show_statistics работал до STATS_SQL)
+
+Нужна настоящая БД (DB_* из окружения, схема на head-ревизии Alembic);
+пользователь берётся из users, кэш профилей и снимков не используется.
+
+    python -m scripts.bench_stats --user-id 123456789 [--iterations 200]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from sqlalchemy import select
+
+from database.database import async_session, engine, WeightLog
+from database.queries import get_user_by_telegram_id
+from database.rollups import get_today_totals, get_period_totals, get_stats_snapshot
+
+
+async def _snapshot(session, user_id: int, user):
+    return await get_stats_snapshot(session, user_id, user)
+
+
+async def _sequential(session, user_id: int, user):
+    await get_today_totals(session, user_id, user)
+    await get_period_totals(session, user_id, 7, user)
+    await get_period_totals(session, user_id, 30, user)
+    result = await session.execute(
+        select(WeightLog.weight, WeightLog.created_at)
+        .where(WeightLog.user_id == user_id)
+        .order_by(WeightLog.created_at.desc())
+        .limit(2)
+    )
+    return result.all()
+
+
+def _percentile(samples: list, q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+async def bench(user_id: int, iterations: int, warmup: int = 10) -> dict:
+    """{вариант: список задержек в мс}; варианты чередуются, чтобы кэш БД грелся поровну"""
+    async with async_session() as session:
+        user = await get_user_by_telegram_id(session, user_id)
+        if user is None:
+            raise SystemExit(f"❌ Пользователь {user_id} не найден")
+
+        variants = (('snapshot', _snapshot), ('sequential', _sequential))
+        timings = {name: [] for name, _ in variants}
+        for i in range(warmup + iterations):
+            for name, run in variants:
+                started = time.perf_counter()
+                await run(session, user_id, user)
+                if i >= warmup:
+                    timings[name].append((time.perf_counter() - started) * 1000)
+        return timings
+
+
+async def _run(user_id: int, iterations: int) -> dict:
+    try:
+        return await bench(user_id, iterations)
+    finally:
+        await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Задержка экрана статистики (p50/p99)")
+    parser.add_argument('--user-id', type=int, required=True, help="telegram_id пользователя с историей")
+    parser.add_argument('--iterations', type=int, default=200, help="замеров на вариант")
+    args = parser.parse_args()
+
+    timings = asyncio.run(_run(args.user_id, args.iterations))
+    for name, samples in timings.items():
+        print(f"{name:<11} p50 {statistics.median(samples):7.2f} мс   "
+              f"p99 {_percentile(samples, 0.99):7.2f} мс")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""
+Проверка планов горячих запросов (регрессия индексов).
+
+Каждый запрос из database.queries и чтения хэндлеров (handlers.calories,
+handlers.fitness, handlers.stats) выполняется на настоящей БД (DB_* из окружения,
+схема на head-ревизии Alembic), а перед ним тем же курсором снимается
+EXPLAIN (FORMAT JSON). Seq Scan по большой таблице в плане — регрессия.
+
+На рабочей БД с небольшим объёмом данных планировщик и без регрессии может
+выбрать Seq Scan, поэтому по умолчанию выставляется enable_seqscan = off: тогда
+Seq Scan остаётся только там, где подходящего индекса нет вовсе. На БД с
+реалистичным объёмом (tests/test_query_plans.py засевает её сам) — --default-planner.
+
+    python -m scripts.check_query_plans      # код выхода 1, если нашёлся Seq Scan
+"""
+import argparse
+import asyncio
+import json
+import sys
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+
+from sqlalchemy import event, text
+
+from database.database import async_session, engine
+from database import queries, rollups
+
+# Таблицы, по которым Seq Scan недопустим (секции — с суффиксом _YYYY_MM)
+LARGE_TABLES = (
+    'users', 'calorie_entries', 'workout_entries', 'weight_logs',
+    'daily_user_totals', 'ai_interactions',
+)
+
+
+def _hot_queries(user_id: int):
+    today = date.today()
+    now = datetime.now()
+    # Профиль из кэша: обычный день и день, начатый заново через /new_day
+    user = SimpleNamespace(timezone=None, current_day_start=None)
+    new_day_user = SimpleNamespace(timezone=None, current_day_start=now)
+    return [
+        ('get_user_by_telegram_id', lambda s: queries.get_user_by_telegram_id(s, user_id)),
+        ('get_day_rollup', lambda s: queries.get_day_rollup(s, user_id, today)),
+        ('get_raw_day_totals', lambda s: queries.get_raw_day_totals(s, user_id, today, now)),
+        ('get_period_rollup', lambda s: queries.get_period_rollup(s, user_id, today - timedelta(days=6))),
+        ('get_stats_row', lambda s: queries.get_stats_row(s, user_id, today, since=now)),
+        ('find_entries_by_text', lambda s: queries.find_entries_by_text(s, 'овсянка', user_id=user_id)),
+        ('get_recent_entries', lambda s: queries.get_recent_entries(s, user_id)),
+        ('find_interactions_by_response',
+         lambda s: queries.find_interactions_by_response(s, {'food_name': 'овсянка'})),
+        ('get_low_confidence_analyses', lambda s: queries.get_low_confidence_analyses(s)),
+        # Чтения хэндлеров после записи
+        ('calories: get_today_totals', lambda s: rollups.get_today_totals(s, user_id, user)),
+        ('calories: get_today_totals после /new_day',
+         lambda s: rollups.get_today_totals(s, user_id, new_day_user)),
+        ('fitness: get_period_totals', lambda s: rollups.get_period_totals(s, user_id, 7, user)),
+        ('stats: get_stats_snapshot', lambda s: rollups.get_stats_snapshot(s, user_id, user)),
+    ]
+
+
+def _seq_scans(plan: dict, empty: frozenset = frozenset()) -> list:
+    """Большие таблицы, которые план читает Seq Scan (кроме пустых секций из empty)"""
+    found = []
+    if plan.get('Node Type') == 'Seq Scan':
+        relation = plan.get('Relation Name', '')
+        if relation not in empty and any(relation == t or relation.startswith(t + '_')
+                                         for t in LARGE_TABLES):
+            found.append(relation)
+    for child in plan.get('Plans', []):
+        found.extend(_seq_scans(child, empty))
+    return found
+
+
+# Пустые таблицы (будущие секции): Seq Scan по ним ничего не стоит и не регрессия
+EMPTY_RELATIONS_SQL = text("""
+    SELECT c.relname FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE c.relkind = 'r' AND c.relpages = 0 AND n.nspname = current_schema()
+""")
+
+
+async def check_plans(user_id: int, verbose: bool = False, force_index: bool = True) -> dict:
+    """{имя запроса: [таблицы с Seq Scan]} для всех горячих запросов
+    (force_index=False — обычные настройки планировщика)"""
+    captured = []
+
+    def explain(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+            cursor.execute('EXPLAIN (FORMAT JSON) ' + statement, parameters)
+            plan = cursor.fetchone()[0]
+            captured.append(json.loads(plan) if isinstance(plan, str) else plan)
+
+    problems = {}
+    async with async_session() as session:
+        empty = frozenset((await session.execute(EMPTY_RELATIONS_SQL)).scalars())
+        if force_index:
+            await session.execute(text("SET enable_seqscan = off"))
+        event.listen(engine.sync_engine, 'before_cursor_execute', explain)
+        try:
+            for name, run in _hot_queries(user_id):
+                captured.clear()
+                await run(session)
+                tables = [t for plan in captured for t in _seq_scans(plan[0]['Plan'], empty)]
+                problems[name] = tables
+                if verbose:
+                    print(f"--- {name}\n{json.dumps(captured, indent=2, ensure_ascii=False)}")
+        finally:
+            event.remove(engine.sync_engine, 'before_cursor_execute', explain)
+    return problems
+
+
+async def _run(user_id: int, verbose: bool, force_index: bool) -> dict:
+    try:
+        return await check_plans(user_id, verbose, force_index)
+    finally:
+        await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверка планов горячих запросов")
+    parser.add_argument('--user-id', type=int, default=1, help="telegram_id для параметров запросов")
+    parser.add_argument('--verbose', action='store_true', help="печатать планы целиком")
+    parser.add_argument('--default-planner', action='store_true',
+                        help="не отключать Seq Scan (БД с реалистичным объёмом данных)")
+    args = parser.parse_args()
+
+    problems = asyncio.run(_run(args.user_id, args.verbose, not args.default_planner))
+    failed = False
+    for name, tables in problems.items():
+        if tables:
+            failed = True
+            print(f"❌ {name}: Seq Scan по {', '.join(sorted(set(tables)))}")
+        else:
+            print(f"✅ {name}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
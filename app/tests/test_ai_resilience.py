@@ -0,0 +1,215 @@
+"""
+Повторы, breaker, дедлайны и хеджирование против локального фейкового OpenAI
+(aiohttp-сервер, на который указывает base_url клиента).
+"""
+import asyncio
+import json
+import time
+from collections import deque
+
+import openai
+import pytest
+from aiohttp import web
+
+import utils.ai_resilience as resilience
+import utils.openai_helper as openai_helper
+from utils.ai_scheduler import scheduler, ai_slot, INTERACTIVE
+
+MESSAGES = [{"role": "user", "content": "овсянка"}]
+
+
+def _completion(content: dict) -> dict:
+    return {
+        'id': 'chatcmpl-test', 'object': 'chat.completion', 'created': 0, 'model': 'gpt-4o-mini',
+        'choices': [{'index': 0, 'finish_reason': 'stop',
+                     'message': {'role': 'assistant', 'content': json.dumps(content)}}],
+        'usage': {'prompt_tokens': 10, 'completion_tokens': 5, 'total_tokens': 15},
+    }
+
+
+class FakeOpenAI:
+    """Отвечает по сценарию: список (status, headers, задержка) по очереди, дальше — 200"""
+
+    def __init__(self, script=()):
+        self.script = list(script)
+        self.requests = 0
+
+    async def handle(self, request):
+        self.requests += 1
+        status, headers, delay = self.script.pop(0) if self.script else (200, {}, 0)
+        if delay:
+            await asyncio.sleep(delay)
+        if status == 200:
+            return web.json_response(_completion({'n': self.requests}))
+        return web.json_response({'error': {'message': 'fake', 'type': 'fake'}},
+                                 status=status, headers=headers)
+
+
+async def _with_server(fake: FakeOpenAI, scenario):
+    app = web.Application()
+    app.router.add_post('/v1/chat/completions', fake.handle)
+    # Зависшие обработчики не ждём при остановке сервера
+    runner = web.AppRunner(app, shutdown_timeout=0.1)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    client = openai.AsyncOpenAI(api_key='test', base_url=f'http://127.0.0.1:{port}/v1', max_retries=0)
+    previous = openai_helper.client
+    openai_helper.client = client
+    try:
+        return await scenario()
+    finally:
+        openai_helper.client = previous
+        await client.close()
+        await runner.cleanup()
+
+
+def _run(fake, scenario):
+    return asyncio.run(_with_server(fake, scenario))
+
+
+async def _call():
+    response = await openai_helper._chat_completion(INTERACTIVE, model='gpt-4o-mini', messages=MESSAGES)
+    return json.loads(response.choices[0].message.content)
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(resilience, 'breaker', resilience._Breaker(threshold=5, cooldown=30))
+    monkeypatch.setattr(resilience, 'OPENAI_RETRY_BASE', 0.01)
+    monkeypatch.setattr(resilience, 'OPENAI_MAX_RETRIES', 3)
+    monkeypatch.setattr(resilience, 'OPENAI_HEDGE', False)
+    monkeypatch.setattr(resilience, '_latencies', {})
+
+
+def test_429_waits_retry_after_and_retries():
+    fake = FakeOpenAI([(429, {'retry-after-ms': '200'}, 0)])
+    started = time.monotonic()
+    assert _run(fake, _call) == {'n': 2}
+    assert time.monotonic() - started >= 0.2
+    assert fake.requests == 2
+
+
+def test_5xx_retried_until_exhausted():
+    fake = FakeOpenAI([(500, {}, 0)] * 4)
+    with pytest.raises(resilience.AIUnavailable):
+        _run(fake, _call)
+    assert fake.requests == 4  # первая попытка + OPENAI_MAX_RETRIES
+
+
+def test_5xx_then_success():
+    fake = FakeOpenAI([(503, {}, 0), (502, {}, 0)])
+    assert _run(fake, _call) == {'n': 3}
+
+
+def test_4xx_not_retried():
+    fake = FakeOpenAI([(400, {}, 0)])
+    with pytest.raises(openai.BadRequestError):
+        _run(fake, _call)
+    assert fake.requests == 1
+    assert resilience.breaker.state == 'closed'
+
+
+def test_request_timeout_is_bounded_by_deadline():
+    fake = FakeOpenAI([(200, {}, 5)] * 4)
+
+    async def scenario():
+        started = time.monotonic()
+        with pytest.raises(resilience.AIUnavailable):
+            with resilience.ai_deadline(0.3):
+                await _call()
+        return time.monotonic() - started
+
+    assert _run(fake, scenario) < 1
+
+
+def test_deadline_includes_scheduler_queue_wait(monkeypatch):
+    monkeypatch.setattr(scheduler, 'max_inflight', 1)
+    fake = FakeOpenAI()
+
+    async def scenario():
+        started = time.monotonic()
+        async with ai_slot(INTERACTIVE):  # единственный слот занят
+            with pytest.raises(resilience.AIUnavailable):
+                with resilience.ai_deadline(0.3):
+                    await _call()
+        return time.monotonic() - started
+
+    assert _run(fake, scenario) < 1
+    assert fake.requests == 0
+
+
+def test_breaker_opens_fails_fast_and_closes_after_probe(monkeypatch):
+    monkeypatch.setattr(resilience, 'breaker', resilience._Breaker(threshold=2, cooldown=0.3))
+    monkeypatch.setattr(resilience, 'OPENAI_MAX_RETRIES', 0)
+    fake = FakeOpenAI([(500, {}, 0)] * 2)
+
+    async def scenario():
+        for _ in range(2):
+            with pytest.raises(resilience.AIUnavailable):
+                await _call()
+        assert resilience.breaker.state == 'open'
+        with pytest.raises(resilience.AIUnavailable):
+            await _call()  # быстрый отказ, без запроса
+        assert fake.requests == 2
+
+        await asyncio.sleep(0.35)
+        assert resilience.breaker.state == 'half_open'
+        assert await _call() == {'n': 3}
+        assert resilience.breaker.state == 'closed'
+
+    _run(fake, scenario)
+
+
+def test_failed_probe_reopens_breaker(monkeypatch):
+    monkeypatch.setattr(resilience, 'breaker', resilience._Breaker(threshold=1, cooldown=0.2))
+    monkeypatch.setattr(resilience, 'OPENAI_MAX_RETRIES', 0)
+    fake = FakeOpenAI([(500, {}, 0)] * 2)
+
+    async def scenario():
+        with pytest.raises(resilience.AIUnavailable):
+            await _call()
+        await asyncio.sleep(0.25)
+        with pytest.raises(resilience.AIUnavailable):
+            await _call()  # пробный запрос упал
+        assert resilience.breaker.state == 'open'
+
+    _run(fake, scenario)
+
+
+def test_cancelled_probe_does_not_wedge_breaker(monkeypatch):
+    monkeypatch.setattr(resilience, 'breaker', resilience._Breaker(threshold=1, cooldown=0.1))
+    monkeypatch.setattr(resilience, 'OPENAI_MAX_RETRIES', 0)
+    fake = FakeOpenAI([(500, {}, 0), (200, {}, 5)])
+
+    async def scenario():
+        with pytest.raises(resilience.AIUnavailable):
+            await _call()
+        await asyncio.sleep(0.15)
+        probe = asyncio.ensure_future(_call())
+        await asyncio.sleep(0.1)
+        assert resilience.breaker.probing
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+        assert not resilience.breaker.probing
+        assert await _call() == {'n': 3}
+        assert resilience.breaker.state == 'closed'
+
+    _run(fake, scenario)
+
+
+def test_hedge_returns_faster_backup(monkeypatch):
+    monkeypatch.setattr(resilience, 'OPENAI_HEDGE', True)
+    monkeypatch.setattr(resilience, '_latencies', {'gpt-4o-mini': deque([0.05] * 30)})
+    fake = FakeOpenAI([(200, {}, 2)])  # первая попытка зависла
+
+    async def scenario():
+        started = time.monotonic()
+        assert await _call() == {'n': 2}
+        return time.monotonic() - started
+
+    assert _run(fake, scenario) < 1
+    assert fake.requests == 2
+    assert resilience.resilience_stats()['hedge_wins'] >= 1
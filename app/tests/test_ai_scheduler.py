@@ -0,0 +1,34 @@
+import asyncio
+
+from utils.ai_scheduler import AIScheduler, INTERACTIVE, BACKGROUND
+
+
+async def _order(aging: float) -> list:
+    """Один слот занят; фоновый ждёт, пока каждые 20 мс приходит интерактивный"""
+    scheduler = AIScheduler(max_inflight=1, rpm=100000, tpm=10 ** 9, aging=aging)
+    order = []
+
+    async def call(name, priority):
+        async with scheduler.slot(priority):
+            order.append(name)
+            await asyncio.sleep(0.03)
+
+    tasks = [asyncio.ensure_future(call('i0', INTERACTIVE))]
+    await asyncio.sleep(0)
+    tasks.append(asyncio.ensure_future(call('bg', BACKGROUND)))
+    for n in range(1, 6):
+        await asyncio.sleep(0.02)
+        tasks.append(asyncio.ensure_future(call(f'i{n}', INTERACTIVE)))
+    await asyncio.gather(*tasks)
+    return order
+
+
+def test_strict_priority_lets_background_wait_for_all_interactive():
+    order = asyncio.run(_order(aging=3600))
+    assert order[-1] == 'bg'
+
+
+def test_aged_background_overtakes_newer_interactive():
+    order = asyncio.run(_order(aging=0.05))
+    assert order.index('bg') < order.index('i5')
+    assert order[0] == 'i0'
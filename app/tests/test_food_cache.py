@@ -0,0 +1,62 @@
+import asyncio
+
+import database.food_cache as food_cache
+
+AI_RESULT = {'food_name': 'овсянка', 'calories': 300, 'protein': 10.0, 'carbs': 50.0,
+             'fats': 6.0, 'meal_type': 'breakfast', 'confidence': 0.9}
+
+
+def _fake_storage(monkeypatch, rows: dict):
+    async def analyze(text, user_context=None):
+        return dict(AI_RESULT)
+
+    async def load(key):
+        return rows.get(key)
+
+    async def store(key, result):
+        rows[key] = result
+
+    monkeypatch.setattr(food_cache, 'analyze_food_from_text', analyze)
+    monkeypatch.setattr(food_cache, '_load_from_db', load)
+    monkeypatch.setattr(food_cache, '_store_in_db', store)
+    monkeypatch.setattr(food_cache, 'local_meal_type', lambda tz_name=None: f"meal@{tz_name}")
+    food_cache.food_cache.clear()
+
+
+def test_meal_type_is_not_cached(monkeypatch):
+    rows = {}
+    _fake_storage(monkeypatch, rows)
+    first = asyncio.run(food_cache.get_food_analysis('Овсянка', None, 'Europe/Moscow'))
+    assert first['_cache'] is None
+    assert first['meal_type'] == 'breakfast'  # свежий ответ — выбор модели
+    assert all('meal_type' not in row for row in rows.values())
+
+    second = asyncio.run(food_cache.get_food_analysis('овсянка', None, 'Asia/Tokyo'))
+    assert second['_cache'] == 'memory'
+    assert second['meal_type'] == 'meal@Asia/Tokyo'
+    assert second['calories'] == 300
+
+
+def test_legacy_db_row_gets_fresh_meal_type(monkeypatch):
+    key = food_cache.food_cache_key('овсянка')
+    rows = {key: dict(AI_RESULT)}  # строка из старой версии, с meal_type
+    _fake_storage(monkeypatch, rows)
+    result = asyncio.run(food_cache.get_food_analysis('овсянка', None, 'America/New_York'))
+    assert result['_cache'] == 'db'
+    assert result['meal_type'] == 'meal@America/New_York'
+    assert 'meal_type' not in food_cache.food_cache.get(key)
+
+
+def test_explicit_meal_word_wins_over_clock(monkeypatch):
+    rows = {}
+    _fake_storage(monkeypatch, rows)
+    asyncio.run(food_cache.get_food_analysis('гречка на ужин', None, 'Europe/Moscow'))
+    cached = asyncio.run(food_cache.get_food_analysis('Гречка на ужин', None, 'Asia/Tokyo'))
+    assert cached['_cache'] == 'memory'
+    assert cached['meal_type'] == 'dinner'
+
+
+def test_uncacheable_text_keeps_model_meal_type(monkeypatch):
+    _fake_storage(monkeypatch, {})
+    result = asyncio.run(food_cache.get_food_analysis('x' * 500, None, 'Asia/Tokyo'))
+    assert result['meal_type'] == 'breakfast'
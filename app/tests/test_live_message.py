@@ -0,0 +1,94 @@
+import asyncio
+import gc
+import logging
+
+from aiogram.exceptions import TelegramRetryAfter
+
+from utils.live_message import LiveMessage, CURSOR
+
+
+class FakeMessage:
+    def __init__(self, retry_after_on: int = None):
+        self.edits = []
+        self.retry_after_on = retry_after_on
+
+    async def edit_text(self, text, **kwargs):
+        if len(self.edits) + 1 == self.retry_after_on:
+            self.retry_after_on = None
+            raise TelegramRetryAfter(method=None, message='Too Many Requests', retry_after=0.05)
+        self.edits.append((text, kwargs))
+
+
+async def _stream(live: LiveMessage, chunks: int, pause: float):
+    for i in range(chunks):
+        live.append(f"{i} ")
+        await asyncio.sleep(pause)
+
+
+def test_edits_are_throttled_and_final_text_is_sent():
+    message = FakeMessage()
+
+    async def run():
+        live = LiveMessage(message, interval=0.05)
+        await _stream(live, 20, 0.01)
+        await live.finish("<b>готово</b>")
+
+    asyncio.run(run())
+    # 20 кусков за ~0.2 с при интервале 0.05 с — не больше 5-6 промежуточных правок
+    assert 2 <= len(message.edits) <= 7
+    assert all(text.endswith(CURSOR) and kwargs == {'parse_mode': None}
+               for text, kwargs in message.edits[:-1])
+    assert message.edits[-1] == ("<b>готово</b>", {})
+
+
+def test_retry_after_postpones_edit():
+    message = FakeMessage(retry_after_on=2)
+
+    async def run():
+        live = LiveMessage(message, interval=0.01)
+        await _stream(live, 10, 0.01)
+        await live.finish()
+
+    asyncio.run(run())
+    assert message.edits[-1] == ("".join(f"{i} " for i in range(10)), {'parse_mode': None})
+
+
+def test_empty_delta_restarts_text():
+    live = LiveMessage(FakeMessage())
+
+    async def run():
+        live.append("старый ответ")
+        live.append("")
+        live.append("новый")
+        await live.finish()
+
+    asyncio.run(run())
+    assert live.text == "новый"
+
+
+class FlakyMessage(FakeMessage):
+    """Первая правка падает не телеграмной ошибкой (сеть)"""
+
+    async def edit_text(self, text, **kwargs):
+        if not self.edits and not getattr(self, 'failed', False):
+            self.failed = True
+            raise RuntimeError('connection reset')
+        await super().edit_text(text, **kwargs)
+
+
+def test_failed_flush_is_logged_and_not_left_unretrieved(caplog):
+    message = FlakyMessage()
+    unhandled = []
+
+    async def run():
+        asyncio.get_running_loop().set_exception_handler(lambda loop, ctx: unhandled.append(ctx))
+        live = LiveMessage(message, interval=0.01)
+        await _stream(live, 5, 0.02)
+        await live.finish("готово")
+        gc.collect()  # «Task exception was never retrieved» пишется при сборке задачи
+
+    with caplog.at_level(logging.WARNING, logger='utils.live_message'):
+        asyncio.run(run())
+    assert unhandled == []
+    assert 'connection reset' in caplog.text
+    assert message.edits[-1] == ("готово", {})
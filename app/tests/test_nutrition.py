@@ -0,0 +1,41 @@
+from collections import namedtuple
+
+from database.nutrition import _pick_items, _split_parts
+
+Row = namedtuple('Row', 'name score')
+
+
+def test_fat_percentage_is_not_a_portion_count():
+    assert _split_parts("творог 9%") == [('творог', None, 1.0, [], ['9%'])]
+    assert _split_parts("молоко 3.2%") == [('молоко', None, 1.0, [], ['3.2%'])]
+    assert _split_parts("йогурт 2%") == [('йогурт', None, 1.0, [], ['2%'])]
+
+
+def test_fat_percentage_with_amount():
+    assert _split_parts("творог 9% 200 г") == [('творог', 200.0, 1.0, [], ['9%'])]
+    assert _split_parts("молоко 3,2% 2 стакана") == [('молоко', 500.0, 1.0, [], ['3.2%'])]
+
+
+def test_decimal_comma_does_not_split_parts():
+    assert _split_parts("1,5 л молока") == [('молока', 1500.0, 1.0, [], [])]
+    assert _split_parts("2 яйца, кофе с молоком") == [
+        ('яйца', None, 2.0, [], []),
+        ('кофе с молоком', None, 1.0, ['кофе', 'молоком'], []),
+    ]
+
+
+def test_other_fat_percentage_goes_to_ai():
+    parts = _split_parts("творог 9%")
+    assert _pick_items(parts, [Row('творог 5%', 1.0)]) is None
+
+
+def test_same_fat_percentage_matches():
+    parts = _split_parts("молоко 2.5%")
+    items = _pick_items(parts, [Row('молоко 2.5%', 1.0)])
+    assert items == [(Row('молоко 2.5%', 1.0), None, 1.0)]
+
+
+def test_weak_match_goes_to_ai():
+    parts = _split_parts("2 яйца, кофе с молоком")
+    matches = [Row('яйцо куриное', 0.9), None, Row('кофе', 0.9), Row('молоко 2.5%', 0.4)]
+    assert _pick_items(parts, matches) is None
@@ -0,0 +1,50 @@
+import asyncio
+from datetime import date, datetime
+
+from sqlalchemy import text
+
+from database.partitions import add_months, create_future_partitions, list_partitions, partition_name
+
+USER_ID = 990001
+AHEAD = 6
+
+
+async def _scenario():
+    from database.database import engine
+
+    month = add_months(date.today().replace(day=1), AHEAD)
+    name = partition_name('calorie_entries', month)
+    try:
+        async with engine.begin() as conn:
+            await conn.execute(text(f"DROP TABLE IF EXISTS {name}"))
+            await conn.execute(text(
+                "INSERT INTO users (telegram_id) VALUES (:id) ON CONFLICT DO NOTHING"
+            ), {'id': USER_ID})
+            # cron не запускался: запись за месяц без секции легла в DEFAULT
+            await conn.execute(text(
+                "INSERT INTO calorie_entries (user_id, food_name, calories, created_at) "
+                "VALUES (:id, 'овсянка', 300, :at)"
+            ), {'id': USER_ID, 'at': datetime.combine(month, datetime.min.time())})
+
+        async with engine.begin() as conn:
+            created = await create_future_partitions(conn, 'calorie_entries', AHEAD)
+
+        async with engine.connect() as conn:
+            in_partition = (await conn.execute(text(
+                f"SELECT count(*) FROM {name} WHERE user_id = :id"), {'id': USER_ID})).scalar()
+            in_default = (await conn.execute(text(
+                "SELECT count(*) FROM calorie_entries_default WHERE user_id = :id"), {'id': USER_ID})).scalar()
+            partitions = [p for p, _ in await list_partitions(conn, 'calorie_entries')]
+        return name, created, in_partition, in_default, partitions
+    finally:
+        async with engine.begin() as conn:
+            await conn.execute(text("DELETE FROM users WHERE telegram_id = :id"), {'id': USER_ID})
+            await conn.execute(text(f"DROP TABLE IF EXISTS {name}"))
+        await engine.dispose()
+
+
+def test_rows_in_default_are_moved_into_new_partition(migrated_db):
+    name, created, in_partition, in_default, partitions = asyncio.run(_scenario())
+    assert name in created
+    assert name in partitions
+    assert (in_partition, in_default) == (1, 0)
@@ -0,0 +1,61 @@
+import json
+
+from utils.openai_helper import _DaysStream
+
+DAYS = [
+    {"day": "Понедельник", "meals": [{"name": "Омлет", "calories": 350}], "tip": "пейте воду"},
+    # Скобки, закрывающие массив, и экранированные кавычки внутри строк — не структура JSON
+    {"day": "Вторник", "meals": [], "tip": "порция ]} не больше {ладони}, \"без\" соуса \\"},
+    {"day": "Среда", "meals": [{"name": "Суп [с] {фрикадельками}", "calories": 280}]},
+]
+PLAN = json.dumps({"plan_name": "План \"days\" [неделя]", "days": DAYS,
+                   "notes": [{"day": "лишний"}]}, ensure_ascii=False)
+
+
+def _parse(chunks) -> list:
+    days = []
+    stream = _DaysStream(days.append)
+    for chunk in chunks:
+        stream.feed(chunk)
+    return days
+
+
+def _chunked(text: str, size: int) -> list:
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def test_days_are_parsed_with_any_chunk_size():
+    for size in range(1, len(PLAN) + 1):
+        assert _parse(_chunked(PLAN, size)) == DAYS, size
+
+
+def test_parsing_stops_at_end_of_days_array():
+    days = []
+    stream = _DaysStream(days.append)
+    stream.feed('{"days": [{"day": 1}], "extra": [{"day": 2}]')
+    stream.feed(', "more": [{"day": 3}]}')
+    assert days == [{"day": 1}]
+
+
+def test_empty_delta_resets_on_retry():
+    head = PLAN[:PLAN.index('"Вторник"') + 20]  # первая попытка оборвалась посреди второго дня
+    days = []
+    stream = _DaysStream(days.append)
+    for chunk in _chunked(head, 7):
+        stream.feed(chunk)
+    assert days == DAYS[:1]
+
+    days.clear()
+    stream.feed('')  # _chat_completion_stream: повтор запроса, ответ начинается заново
+    for chunk in _chunked(PLAN, 5):
+        stream.feed(chunk)
+    assert days == DAYS
+
+
+def test_reset_after_finished_stream_parses_again():
+    days = []
+    stream = _DaysStream(days.append)
+    stream.feed(PLAN)
+    stream.feed('')
+    stream.feed(PLAN)
+    assert days == DAYS + DAYS
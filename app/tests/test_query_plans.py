@@ -0,0 +1,136 @@
+import asyncio
+from datetime import date
+
+from sqlalchemy import text
+
+from scripts.check_query_plans import _seq_scans
+
+SEED_USERS = 20000  # users — не крошечная таблица, иначе Seq Scan по ней честно дешевле
+SEED_ACTIVE_USERS = 200  # у кого есть записи
+SEED_DAYS = 150  # больше четырёх месяцев: несколько помесячных секций и DEFAULT
+PLAN_USER = 7
+
+
+def test_seq_scan_on_large_table_and_partition_is_reported():
+    plan = {
+        'Node Type': 'Append',
+        'Plans': [
+            {'Node Type': 'Index Scan', 'Relation Name': 'calorie_entries_2026_09'},
+            {'Node Type': 'Seq Scan', 'Relation Name': 'calorie_entries_2026_10'},
+            {'Node Type': 'Seq Scan', 'Relation Name': 'food_nutrition'},
+        ],
+    }
+    assert _seq_scans(plan) == ['calorie_entries_2026_10']
+
+
+def test_seq_scan_on_empty_partition_is_ignored():
+    plan = {'Node Type': 'Seq Scan', 'Relation Name': 'calorie_entries_y2027m01'}
+    assert _seq_scans(plan, frozenset({'calorie_entries_y2027m01'})) == []
+
+
+def test_index_only_plan_is_clean():
+    plan = {'Node Type': 'Aggregate', 'Plans': [
+        {'Node Type': 'Index Only Scan', 'Relation Name': 'daily_user_totals'},
+    ]}
+    assert _seq_scans(plan) == []
+
+
+# --- Планы на настоящей БД (TEST_DATABASE_URL) ---
+
+SEED_SQL = [
+    """
+    INSERT INTO users (telegram_id, full_name, goal, daily_calorie_target)
+    SELECT u, 'user ' || u, 'maintain', 2000 FROM generate_series(1, :users) u
+    """,
+    # Три приёма пищи и вода в день у каждого пользователя
+    """
+    INSERT INTO calorie_entries (user_id, food_name, calories, protein, carbs, fats,
+                                 meal_type, water_ml, local_date, source_type, source_data,
+                                 ai_confidence, created_at)
+    SELECT u, f.name,
+           CASE WHEN m.meal = 'water' THEN 0 ELSE 150 + (u * 7 + d * 13) % 500 END,
+           10, 30, 8, m.meal,
+           CASE WHEN m.meal = 'water' THEN 250 END,
+           ts::date, 'text_ai',
+           jsonb_build_object('original_text', f.name, 'normalized_text', f.name),
+           0.9, ts
+    FROM generate_series(1, :active) u,
+         generate_series(0, :days - 1) d,
+         (VALUES ('breakfast', 8), ('lunch', 13), ('dinner', 19), ('water', 15)) m(meal, hour),
+         LATERAL (SELECT (date_trunc('day', now()) - make_interval(days => d)
+                          + make_interval(hours => m.hour))::timestamp AS ts) t,
+         LATERAL (SELECT 'блюдо ' || ((u * 31 + d * 17 + m.hour) % 400) AS name) f
+    """,
+    """
+    INSERT INTO workout_entries (user_id, workout_type, duration, calories_burned,
+                                 local_date, created_at)
+    SELECT u, 'running', 30 + d % 40, 300, ts::date, ts
+    FROM generate_series(1, :active) u,
+         generate_series(0, :days - 1, 2) d,
+         LATERAL (SELECT (date_trunc('day', now()) - make_interval(days => d)
+                          + interval '7 hours')::timestamp AS ts) t
+    """,
+    """
+    INSERT INTO weight_logs (user_id, weight, created_at)
+    SELECT u, 70 + (u % 30) + d / 100.0,
+           (date_trunc('day', now()) - make_interval(days => d))::timestamp
+    FROM generate_series(1, :active) u, generate_series(0, :days - 1, 5) d
+    """,
+    # Уверенность ниже LOW_CONFIDENCE — у редких анализов, как в жизни
+    """
+    INSERT INTO ai_interactions (user_id, interaction_type, input_type, input_data,
+                                 ai_response, ai_model, ai_confidence, total_tokens, created_at)
+    SELECT u, 'food_analysis', 'text', 'блюдо ' || d,
+           jsonb_build_object('food_name', 'блюдо ' || ((u * 31 + d * 17) % 400), 'calories', 300),
+           'gpt-4o-mini', CASE WHEN (u + d) % 50 = 0 THEN 0.3 ELSE 0.9 END, 500,
+           (date_trunc('day', now()) - make_interval(days => d) + interval '12 hours')::timestamp
+    FROM generate_series(1, :active) u, generate_series(0, :days - 1) d
+    """,
+]
+
+LARGE_TABLES_TO_RESET = (
+    'users', 'calorie_entries', 'workout_entries', 'weight_logs',
+    'daily_user_totals', 'ai_interactions', 'ai_usage_daily',
+)
+
+
+async def _seed():
+    from database.database import engine
+    from database.partitions import PARTITIONED_TABLES, add_months, partition_name
+    from database.rollups import rebuild_daily_totals
+
+    async with engine.begin() as conn:
+        await conn.execute(text(f"TRUNCATE {', '.join(LARGE_TABLES_TO_RESET)} CASCADE"))
+        # Прошлые месяцы — отдельными секциями, самые старые строки уйдут в DEFAULT
+        current = date.today().replace(day=1)
+        for table in PARTITIONED_TABLES:
+            for back in (1, 2, 3):
+                month = add_months(current, -back)
+                await conn.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {partition_name(table, month)} PARTITION OF {table} "
+                    f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+                ))
+        for sql in SEED_SQL:
+            await conn.execute(text(sql), {'users': SEED_USERS, 'active': SEED_ACTIVE_USERS,
+                                           'days': SEED_DAYS})
+    await rebuild_daily_totals()
+    async with engine.connect() as conn:
+        await conn.execution_options(isolation_level='AUTOCOMMIT')
+        await conn.execute(text("ANALYZE"))
+
+
+async def _plans() -> dict:
+    from database.database import engine
+    from scripts.check_query_plans import check_plans
+
+    try:
+        await _seed()
+        return await check_plans(PLAN_USER, force_index=False)
+    finally:
+        await engine.dispose()
+
+
+def test_hot_queries_use_indexes_on_seeded_database(migrated_db):
+    problems = asyncio.run(_plans())
+    assert {name: tables for name, tables in problems.items() if tables} == {}
+    assert len(problems) >= 13
@@ -0,0 +1,119 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+
+import database.replica as replica
+
+
+class FakeSession:
+    def __init__(self, name, fail_connect=False):
+        self.name = name
+        self.fail_connect = fail_connect
+        self.closed = False
+
+    async def connection(self):
+        if self.fail_connect:
+            raise ConnectionRefusedError("replica is down")
+
+    async def close(self):
+        self.closed = True
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+
+class FakeResult:
+    def __init__(self, value):
+        self.value = value
+
+    def scalar(self):
+        return self.value
+
+
+class FakeReplicaEngine:
+    def __init__(self, lag=0.0, down=False):
+        self.lag = lag
+        self.down = down
+        self.checks = 0
+
+    @asynccontextmanager
+    async def connect(self):
+        self.checks += 1
+        if self.down:
+            raise ConnectionRefusedError("replica is down")
+        yield self
+
+    async def execute(self, statement):
+        return FakeResult(self.lag)
+
+
+@pytest.fixture
+def fake_replica(monkeypatch):
+    def setup(lag=0.0, down=False, fail_connect=False):
+        engine = FakeReplicaEngine(lag, down)
+        sessions = []
+
+        def replica_session():
+            session = FakeSession('replica', fail_connect)
+            sessions.append(session)
+            return session
+
+        monkeypatch.setattr(replica, 'replica_engine', engine)
+        monkeypatch.setattr(replica, 'replica_session', replica_session)
+        monkeypatch.setattr(replica, 'async_session', lambda: FakeSession('primary'))
+        monkeypatch.setattr(replica, '_state', {'checked_at': None, 'lag': None, 'healthy': False})
+        monkeypatch.setattr(replica, '_metrics', {'replica_reads': 0, 'primary_reads': 0, 'fallbacks': 0})
+        return engine, sessions
+    return setup
+
+
+async def _read(max_lag=replica.DB_REPLICA_MAX_LAG):
+    async with replica.read_session(max_lag) as session:
+        return session.name
+
+
+def test_healthy_replica_is_used(fake_replica):
+    fake_replica(lag=1.0)
+    assert asyncio.run(_read()) == 'replica'
+    assert replica.replica_stats()['replica_reads'] == 1
+
+
+def test_unhealthy_replica_falls_back_to_primary(fake_replica):
+    fake_replica(down=True)
+    assert asyncio.run(_read()) == 'primary'
+    stats = replica.replica_stats()
+    assert not stats['healthy'] and stats['fallbacks'] == 1
+
+
+def test_lag_above_max_goes_to_primary(fake_replica):
+    fake_replica(lag=30.0)
+    assert asyncio.run(_read(max_lag=10)) == 'primary'
+    assert replica.replica_stats()['fallbacks'] == 1
+
+
+def test_connect_failure_falls_back_and_marks_unhealthy(fake_replica):
+    _, sessions = fake_replica(fail_connect=True)
+    assert asyncio.run(_read()) == 'primary'
+    assert sessions[0].closed
+    assert replica.replica_stats()['healthy'] is False
+
+
+def test_health_check_is_cached(fake_replica):
+    engine, _ = fake_replica(lag=0.0)
+
+    async def run():
+        for _ in range(3):
+            assert await _read() == 'replica'
+
+    asyncio.run(run())
+    assert engine.checks == 1
+
+
+def test_no_replica_configured_reads_primary(monkeypatch):
+    monkeypatch.setattr(replica, 'replica_session', None)
+    monkeypatch.setattr(replica, 'async_session', lambda: FakeSession('primary'))
+    assert asyncio.run(_read()) == 'primary'
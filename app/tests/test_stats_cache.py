@@ -0,0 +1,37 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import database.stats_cache as stats_cache
+
+
+def _fake_sessions(monkeypatch, used: list):
+    def factory(name):
+        @asynccontextmanager
+        async def session(*args, **kwargs):
+            used.append(name)
+            yield name
+        return session
+
+    async def snapshot(session, telegram_id, user):
+        return {'source': session}
+
+    monkeypatch.setattr(stats_cache, 'async_session', factory('primary'))
+    monkeypatch.setattr(stats_cache, 'read_session', factory('replica'))
+    monkeypatch.setattr(stats_cache, 'get_stats_snapshot', snapshot)
+
+
+def test_recent_writer_reads_primary(monkeypatch):
+    used = []
+    _fake_sessions(monkeypatch, used)
+    stats_cache.invalidate_stats(1)
+    assert asyncio.run(stats_cache.get_cached_stats(1)) == {'source': 'primary'}
+    assert used == ['primary']
+
+
+def test_other_users_read_replica_and_hit_cache(monkeypatch):
+    used = []
+    _fake_sessions(monkeypatch, used)
+    stats_cache.stats_cache.invalidate(2)
+    assert asyncio.run(stats_cache.get_cached_stats(2)) == {'source': 'replica'}
+    assert asyncio.run(stats_cache.get_cached_stats(2)) == {'source': 'replica'}
+    assert used == ['replica']
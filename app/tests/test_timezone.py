@@ -0,0 +1,25 @@
+import pytest
+
+from handlers.profile import parse_timezone
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('Europe/Moscow', 'Europe/Moscow'),
+    ('UTC+3', 'Etc/GMT-3'),
+    ('gmt -5', 'Etc/GMT+5'),
+    ('UTC+0', 'UTC'),
+])
+def test_valid_timezones(value, expected):
+    assert parse_timezone(value) == expected
+
+
+@pytest.mark.parametrize('value', [
+    'Europe', 'America', 'Etc',  # каталоги tzdata
+    'A' * 300,
+    'Mars/Olympus',
+    'UTC+15',
+    '../etc/passwd',
+    '',
+])
+def test_invalid_timezones(value):
+    assert parse_timezone(value) is None
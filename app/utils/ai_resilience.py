@@ -0,0 +1,239 @@
+"""
+Устойчивость вызовов OpenAI: повторы, circuit breaker, хеджирование, дедлайны.
+
+- Повторяются только временные ошибки: 429, 5xx, обрыв соединения и таймаут.
+  Пауза — экспоненциальная с полным джиттером, Retry-After сервера в приоритете.
+- Circuit breaker: после OPENAI_BREAKER_THRESHOLD временных ошибок подряд
+  запросы OPENAI_BREAKER_COOLDOWN секунд сразу получают AIUnavailable,
+  хэндлеры переключаются на локальные источники. Затем пропускается один
+  пробный запрос: успех закрывает breaker, ошибка открывает снова.
+- Хеджирование (OPENAI_HEDGE=1, только интерактивные запросы): если ответа нет
+  дольше p95 задержки, отправляется второй такой же запрос, берётся первый ответ.
+- Дедлайн: хэндлер задаёт бюджет времени через ai_deadline(); попытка целиком
+  (вместе с ожиданием слота в очереди планировщика) ограничена оставшимся
+  временем, повторы не выходят за дедлайн.
+
+Ретраи SDK выключены (max_retries=0 у клиента) — повторяет только этот слой.
+"""
+import asyncio
+import contextvars
+import logging
+import os
+import random
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import openai
+
+logger = logging.getLogger(__name__)
+
+OPENAI_MAX_RETRIES = int(os.getenv('OPENAI_MAX_RETRIES', '3'))
+OPENAI_RETRY_BASE = float(os.getenv('OPENAI_RETRY_BASE', '0.5'))  # секунды
+OPENAI_RETRY_CAP = float(os.getenv('OPENAI_RETRY_CAP', '8'))  # секунды
+OPENAI_BREAKER_THRESHOLD = int(os.getenv('OPENAI_BREAKER_THRESHOLD', '5'))
+OPENAI_BREAKER_COOLDOWN = float(os.getenv('OPENAI_BREAKER_COOLDOWN', '30'))  # секунды
+OPENAI_HEDGE = os.getenv('OPENAI_HEDGE', '0').lower() in ('1', 'true', 'yes')
+OPENAI_HEDGE_MIN_SAMPLES = 20
+OPENAI_DEFAULT_TIMEOUT = float(os.getenv('OPENAI_DEFAULT_TIMEOUT', '60'))  # секунды на попытку
+
+_deadline: contextvars.ContextVar = contextvars.ContextVar('ai_deadline', default=None)
+
+_metrics = {
+    'calls': 0, 'retries': 0, 'failures': 0, 'fast_failures': 0,
+    'deadline_exceeded': 0, 'hedged': 0, 'hedge_wins': 0, 'breaker_opened': 0,
+}
+
+
+class AIUnavailable(Exception):
+    """OpenAI сейчас недоступен (breaker открыт, повторы исчерпаны или вышел дедлайн)"""
+
+
+@contextmanager
+def ai_deadline(seconds: float):
+    """Бюджет времени на все вызовы AI внутри блока (вложенный не продлевает внешний)"""
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(deadline if current is None else min(current, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def _remaining() -> float:
+    deadline = _deadline.get()
+    return float('inf') if deadline is None else deadline - time.monotonic()
+
+
+def _is_transient(error: Exception) -> bool:
+    if isinstance(error, (openai.APIConnectionError, openai.RateLimitError)):
+        return True  # APITimeoutError — подкласс APIConnectionError
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code == 408 or error.status_code == 409 or error.status_code >= 500
+    return False
+
+
+def _retry_after(error: Exception):
+    """Пауза из Retry-After / retry-after-ms ответа (секунды) или None"""
+    response = getattr(error, 'response', None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if headers.get('retry-after-ms'):
+            return float(headers['retry-after-ms']) / 1000
+        if headers.get('retry-after'):
+            return float(headers['retry-after'])
+    except ValueError:
+        return None
+    return None
+
+
+class _Breaker:
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at < self.cooldown:
+            return 'open'
+        return 'half_open'
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == 'closed':
+            return True
+        if state == 'half_open' and not self.probing:
+            self.probing = True
+            return True
+        return False
+
+    def cancel_probe(self):
+        """Пробный запрос отменён, не дойдя до ответа: следующий вызов станет пробным"""
+        self.probing = False
+
+    def success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def failure(self):
+        self.failures += 1
+        if self.probing or self.failures >= self.threshold:
+            if self.state != 'open':
+                _metrics['breaker_opened'] += 1
+                logger.warning("OpenAI недоступен, circuit breaker открыт на %.0f с", self.cooldown)
+            self.opened_at = time.monotonic()
+            self.probing = False
+
+
+breaker = _Breaker(OPENAI_BREAKER_THRESHOLD, OPENAI_BREAKER_COOLDOWN)
+_latencies: dict = {}  # kind -> deque последних задержек успешных вызовов
+
+
+def _hedge_delay(kind: str):
+    samples = _latencies.get(kind)
+    if not samples or len(samples) < OPENAI_HEDGE_MIN_SAMPLES:
+        return None
+    ordered = sorted(samples)
+    return ordered[int(len(ordered) * 0.95) - 1]
+
+
+async def _hedged(kind: str, attempt):
+    """Первый ответ из основной и (после p95) запасной попытки"""
+    delay = _hedge_delay(kind)
+    primary = asyncio.ensure_future(attempt())
+    if delay is None or delay >= _remaining():
+        return await primary
+    done, _ = await asyncio.wait({primary}, timeout=delay)
+    if done:
+        return primary.result()
+
+    _metrics['hedged'] += 1
+    backup = asyncio.ensure_future(attempt())
+    pending = {primary, backup}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is backup:
+                        _metrics['hedge_wins'] += 1
+                    return task.result()
+        # Обе попытки упали — отдаём ошибку основной
+        return primary.result()
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def call_with_resilience(kind: str, make_call, hedge: bool = False):
+    """Выполнить make_call(timeout) с повторами, breaker, дедлайном и хеджированием"""
+    _metrics['calls'] += 1
+    if not breaker.allow():
+        _metrics['fast_failures'] += 1
+        raise AIUnavailable("OpenAI временно недоступен")
+    # В half-open allow() пропускает ровно один вызов — этот
+    probe = breaker.probing
+
+    for attempt_no in range(OPENAI_MAX_RETRIES + 1):
+        remaining = _remaining()
+        if remaining <= 0:
+            _metrics['deadline_exceeded'] += 1
+            raise AIUnavailable("Истёк дедлайн запроса к AI")
+        timeout = min(OPENAI_DEFAULT_TIMEOUT, remaining)
+
+        started = time.monotonic()
+        try:
+            # Ожидание в очереди планировщика тоже тратит дедлайн хэндлера
+            async with asyncio.timeout(remaining if remaining != float('inf') else None):
+                if hedge and OPENAI_HEDGE:
+                    result = await _hedged(kind, lambda: make_call(timeout))
+                else:
+                    result = await make_call(timeout)
+        except TimeoutError as error:
+            # Это asyncio.timeout выше: openai оборачивает свои таймауты в APITimeoutError
+            if probe:
+                breaker.cancel_probe()
+            _metrics['deadline_exceeded'] += 1
+            raise AIUnavailable("Истёк дедлайн запроса к AI") from error
+        except Exception as error:
+            if not _is_transient(error):
+                # Ошибка запроса (400, 401...) — повтор не поможет, но сервис ответил
+                breaker.success()
+                raise
+            breaker.failure()
+            if attempt_no == OPENAI_MAX_RETRIES or not breaker.allow():
+                _metrics['failures'] += 1
+                raise AIUnavailable(f"OpenAI не ответил: {error}") from error
+            pause = _retry_after(error)
+            if pause is None:
+                pause = random.uniform(0, min(OPENAI_RETRY_CAP, OPENAI_RETRY_BASE * 2 ** attempt_no))
+            if pause >= _remaining():
+                _metrics['deadline_exceeded'] += 1
+                raise AIUnavailable("Истёк дедлайн запроса к AI") from error
+            _metrics['retries'] += 1
+            logger.warning(f"OpenAI {kind}: {type(error).__name__}, повтор через {pause:.1f} с")
+            await asyncio.sleep(pause)
+            continue
+        except BaseException:
+            # Отмена (пользователь, проигравшая хедж-попытка, остановка бота): ни успеха,
+            # ни отказа — но пробный запрос нужно вернуть, иначе breaker не закроется
+            if probe:
+                breaker.cancel_probe()
+            raise
+
+        breaker.success()
+        _latencies.setdefault(kind, deque(maxlen=200)).append(time.monotonic() - started)
+        return result
+
+
+def resilience_stats() -> dict:
+    return {'breaker': breaker.state, **_metrics}
@@ -0,0 +1,196 @@
+"""
+Планировщик запросов к OpenAI.
+
+Все вызовы client.*.create проходят через ai_slot(): не больше OPENAI_MAX_INFLIGHT
+запросов одновременно, не больше OPENAI_RPM запросов и OPENAI_TPM токенов в минуту
+(token bucket). Расход токенов оценивается заранее по размеру промпта, а после
+ответа уточняется по usage — разница списывается или возвращается в bucket.
+
+Ожидающие запросы обслуживаются по приоритету: сначала интерактивные
+(анализ еды, тренировок, голос, фото), потом фоновые (планы, рекомендации),
+внутри приоритета — по очереди. Рассчитан на один event loop.
+
+Строгий приоритет позволил бы непрерывному потоку интерактивных запросов
+бесконечно откладывать фоновые, поэтому очередь стареет: запрос упорядочен по
+queued_at + priority * OPENAI_PRIORITY_AGING, то есть фоновый, прождавший
+дольше OPENAI_PRIORITY_AGING секунд, обгоняет только что пришедшие
+интерактивные. Цена — под нагрузкой интерактивный запрос может подождать
+одного-двух «состарившихся» фоновых; OPENAI_PRIORITY_AGING=0 — чистый FIFO.
+"""
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from contextlib import asynccontextmanager
+
+OPENAI_MAX_INFLIGHT = int(os.getenv('OPENAI_MAX_INFLIGHT', '16'))
+OPENAI_RPM = float(os.getenv('OPENAI_RPM', '500'))  # запросов в минуту
+OPENAI_TPM = float(os.getenv('OPENAI_TPM', '200000'))  # токенов в минуту
+OPENAI_PRIORITY_AGING = float(os.getenv('OPENAI_PRIORITY_AGING', '30'))  # секунды на уровень приоритета
+
+# Приоритеты (меньше — раньше)
+INTERACTIVE = 0
+BACKGROUND = 1
+PRIORITY_NAMES = {INTERACTIVE: 'interactive', BACKGROUND: 'background'}
+
+
+class _Bucket:
+    """Token bucket на минуту; уровень может уйти в минус, если оценка была занижена"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Сколько секунд ждать, пока в bucket наберётся amount (не больше ёмкости)"""
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+
+class AIScheduler:
+    def __init__(self, max_inflight: int, rpm: float, tpm: float, aging: float = OPENAI_PRIORITY_AGING):
+        self.max_inflight = max_inflight
+        self.aging = aging
+        self.requests = _Bucket(rpm)
+        self.tokens = _Bucket(tpm)
+        self.inflight = 0
+        self._queue = []  # (ранг, seq, priority, tokens, future)
+        self._seq = itertools.count()
+        self._timer = None
+        self.metrics = {
+            'started': 0, 'throttled': 0, 'wait_ms_total': 0.0, 'max_wait_ms': 0.0,
+            'estimated_tokens': 0, 'actual_tokens': 0,
+        }
+        self._started = {name: 0 for name in PRIORITY_NAMES.values()}
+
+    def _dispatch(self):
+        """Запустить всех, кого пускают лимиты, начиная с головы очереди"""
+        self._timer = None
+        now = time.monotonic()
+        self.requests.refill(now)
+        self.tokens.refill(now)
+        while self._queue and self.inflight < self.max_inflight:
+            _, _, _, tokens, future = self._queue[0]
+            if future.done():  # ожидающий отменён
+                heapq.heappop(self._queue)
+                continue
+            wait = max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+            if wait > 0:
+                # Голова очереди ждёт пополнения — остальные за ней (порядок по рангу)
+                self.metrics['throttled'] += 1
+                self._timer = asyncio.get_running_loop().call_later(wait, self._dispatch)
+                return
+            heapq.heappop(self._queue)
+            self.requests.level -= 1
+            self.tokens.level -= tokens
+            self.inflight += 1
+            future.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, priority: int = INTERACTIVE, tokens: int = 0):
+        """Дождаться разрешения на запрос; внутри — сам вызов OpenAI"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        queued_at = time.monotonic()
+        # Старение: ранг не меняется со временем, поэтому хватает обычной кучи
+        rank = queued_at + priority * self.aging
+        heapq.heappush(self._queue, (rank, next(self._seq), priority, tokens, future))
+        if self._timer is None:
+            self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Слот уже выдан, но ожидающий отменён — вернуть слот
+                self.inflight -= 1
+                self._dispatch()
+            raise
+
+        wait_ms = (time.monotonic() - queued_at) * 1000
+        self.metrics['started'] += 1
+        self.metrics['wait_ms_total'] += wait_ms
+        self.metrics['max_wait_ms'] = max(self.metrics['max_wait_ms'], wait_ms)
+        self.metrics['estimated_tokens'] += tokens
+        self._started[PRIORITY_NAMES.get(priority, str(priority))] += 1
+        request = _Request(self, tokens)
+        try:
+            yield request
+        finally:
+            self.inflight -= 1
+            if self._timer is None:
+                self._dispatch()
+
+    def record(self, estimated: int, actual: int):
+        """Уточнить расход токенов по фактическому usage"""
+        self.metrics['actual_tokens'] += actual
+        self.tokens.level -= actual - estimated
+        if actual < estimated and self._timer is not None:
+            # Вернули токены — возможно, голове очереди уже не нужно ждать
+            self._timer.cancel()
+            self._dispatch()
+
+    def stats(self) -> dict:
+        started = self.metrics['started']
+        queued = {name: 0 for name in PRIORITY_NAMES.values()}
+        for _, _, priority, _, future in self._queue:
+            if not future.done():
+                queued[PRIORITY_NAMES.get(priority, str(priority))] += 1
+        return {
+            'inflight': self.inflight,
+            'max_inflight': self.max_inflight,
+            'queued': queued,
+            'started_by_priority': dict(self._started),
+            'avg_wait_ms': self.metrics['wait_ms_total'] / started if started else 0.0,
+            'rpm_left': max(self.requests.level, 0),
+            'tpm_left': max(self.tokens.level, 0),
+            **self.metrics,
+        }
+
+
+class _Request:
+    def __init__(self, scheduler: AIScheduler, estimated: int):
+        self._scheduler = scheduler
+        self._estimated = estimated
+
+    def record_usage(self, usage: dict):
+        """Передать usage ответа ({'total_tokens': ...}) для уточнения bucket"""
+        if usage and usage.get('total_tokens') is not None:
+            self._scheduler.record(self._estimated, usage['total_tokens'])
+
+
+scheduler = AIScheduler(OPENAI_MAX_INFLIGHT, OPENAI_RPM, OPENAI_TPM)
+
+
+def estimate_tokens(messages: list, max_output: int = 500) -> int:
+    """Грубая оценка токенов запроса: ~3 символа на токен плюс ожидаемый ответ"""
+    chars = 0
+    images = 0
+    for message in messages:
+        content = message.get('content')
+        if isinstance(content, str):
+            chars += len(content)
+        elif isinstance(content, list):
+            for part in content:
+                if part.get('type') == 'text':
+                    chars += len(part.get('text', ''))
+                else:
+                    images += 1
+    # Картинка в detail=auto — порядка тысячи токенов
+    return chars // 3 + images * 1000 + max_output
+
+
+def ai_slot(priority: int = INTERACTIVE, tokens: int = 0):
+    return scheduler.slot(priority, tokens)
+
+
+def scheduler_stats() -> dict:
+    return scheduler.stats()
@@ -0,0 +1,90 @@
+"""
+Ограниченный in-process кэш с TTL и LRU-вытеснением
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+
+class TTLCache:
+    """LRU-кэш с временем жизни записей и счётчиками попаданий.
+
+    Рассчитан на один event loop: операции синхронные и не требуют блокировок.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()  # key -> (expires_at, value)
+        self._loading: dict = {}  # key -> токен загрузки (сбрасывается при invalidate)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Значение из кэша или default (просроченные записи удаляются)"""
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return default
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: float = None):
+        """Положить значение, вытесняя самые давно использованные записи
+        (ttl — своё время жизни записи вместо общего)"""
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        """Удалить запись (и отменить запись результата идущей загрузки)"""
+        self._data.pop(key, None)
+        self._loading.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+        self._loading.clear()
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]],
+                          ttl: float = None) -> Optional[Any]:
+        """Значение из кэша или результат loader(); None не кэшируется.
+
+        Если во время загрузки ключ инвалидировали, результат отдаётся
+        вызывающему, но в кэш не попадает — чтобы не вернуть устаревшие данные.
+        """
+        missing = object()
+        value = self.get(key, missing)
+        if value is not missing:
+            return value
+
+        token = object()
+        self._loading[key] = token
+        try:
+            value = await loader()
+        finally:
+            still_valid = self._loading.get(key) is token
+            if still_valid:
+                del self._loading[key]
+        if value is not None and still_valid:
+            self.set(key, value, ttl)
+        return value
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / total if total else 0.0,
+        }
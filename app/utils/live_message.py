@@ -0,0 +1,113 @@
+"""
+Сообщение, которое дописывается по мере ответа AI (стриминг в Telegram).
+
+Telegram ограничивает частоту правок одного чата (около одной в секунду),
+поэтому LiveMessage копит текст и правит сообщение не чаще, чем раз в
+TELEGRAM_EDIT_INTERVAL секунд; промежуточные правки не блокируют стрим.
+При TelegramRetryAfter следующая правка откладывается на указанное время.
+Промежуточный текст отправляется без parse_mode (ответ модели — не HTML),
+итоговый finish(text) — как обычные ответы бота.
+"""
+import asyncio
+import logging
+import os
+import time
+
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from aiogram.types import Message
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_EDIT_INTERVAL = float(os.getenv('TELEGRAM_EDIT_INTERVAL', '1.5'))  # секунды
+TELEGRAM_MESSAGE_LIMIT = 4096
+CURSOR = ' ▌'
+
+
+def _clip(text: str) -> str:
+    if len(text) <= TELEGRAM_MESSAGE_LIMIT:
+        return text
+    return text[:TELEGRAM_MESSAGE_LIMIT - 1] + '…'
+
+
+class LiveMessage:
+    def __init__(self, message: Message, interval: float = TELEGRAM_EDIT_INTERVAL):
+        self.message = message
+        self.interval = interval
+        self._parts = []
+        self._shown = None
+        self._next_edit = 0.0  # monotonic: раньше этого момента не правим
+        self._task = None
+        self.edits = 0
+
+    @property
+    def text(self) -> str:
+        return ''.join(self._parts)
+
+    def append(self, delta: str):
+        """Дописать кусок ответа модели; пустая строка — ответ начат заново"""
+        if delta:
+            self._parts.append(delta)
+        else:
+            self._parts = []
+        self._schedule()
+
+    def set(self, text: str):
+        """Заменить текст целиком (например, план, собранный из готовых дней)"""
+        self._parts = [text]
+        self._schedule()
+
+    def _schedule(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._flush())
+            self._task.add_done_callback(self._flush_done)
+
+    @staticmethod
+    def _flush_done(task: asyncio.Task):
+        # Упавшую правку (например, TelegramNetworkError) заменит следующая — ошибку
+        # забираем здесь, иначе asyncio ругается «Task exception was never retrieved»
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"Не удалось обновить сообщение: {task.exception()!r}")
+
+    async def _flush(self):
+        while True:
+            delay = self._next_edit - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            text = _clip(self.text + CURSOR)
+            if text == self._shown:
+                return
+            await self._edit(text, parse_mode=None)
+
+    async def _edit(self, text: str, **kwargs) -> bool:
+        try:
+            await self.message.edit_text(text, **kwargs)
+        except TelegramRetryAfter as e:
+            self._next_edit = time.monotonic() + e.retry_after
+            return False
+        except TelegramBadRequest as e:
+            if 'message is not modified' not in e.message:
+                logger.warning(f"Не удалось обновить сообщение: {e.message}")
+        self._shown = text
+        self._next_edit = time.monotonic() + self.interval
+        self.edits += 1
+        return True
+
+    async def finish(self, text: str = None, **kwargs):
+        """Итоговая правка (HTML как в обычных ответах бота, без text — накопленный
+        ответ как есть); ждёт лимит, если нужно"""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if text is None:
+            text = self.text
+            kwargs.setdefault('parse_mode', None)
+        final = _clip(text)
+        while True:
+            delay = self._next_edit - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if await self._edit(final, **kwargs):
+                return